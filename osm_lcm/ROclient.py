@@ -29,7 +29,10 @@ import yaml
 import logging
 from urllib.parse import quote
 from uuid import UUID
+from collections import OrderedDict
 from copy import deepcopy
+from time import time
+from osm_lcm.lcm_utils import ReadCoalescer
 
 __author__ = "Alfonso Tierno"
 __date__ = "$09-Jan-2018 09:09:48$"
@@ -116,6 +119,10 @@ class ROClient:
     }
     timeout_large = 120
     timeout_short = 30
+    get_cache_max_size = 1000
+    # name to uuid resolutions, shared by all the clients of the process
+    _uuid_cache = OrderedDict()  # (url of the item list, name): (time, uuid)
+    uuid_cache_max_size = 10000
 
     def __init__(self, loop, uri, **kwargs):
         self.loop = loop
@@ -131,9 +138,114 @@ class ROClient:
         self.logger = logging.getLogger(logger_name)
         if kwargs.get("loglevel"):
             self.logger.setLevel(kwargs["loglevel"])
+        # persistent http session, created at first use. Connections are kept alive and reused
+        self._session = None
+        self.pool_limit = int(kwargs.get("pool_limit") or 100)  # max number of simultaneous connections
+        self.pool_limit_per_host = int(kwargs.get("pool_limit_per_host") or 0)  # 0 means no limit
+        self.keepalive_timeout = int(kwargs.get("keepalive_timeout") or 30)  # time to keep alive an idle connection
+        # identical GET requests in progress are coalesced. Responses can be reused during get_cache_ttl seconds
+        self.get_cache_ttl = float(kwargs.get("get_cache_ttl") or 0)
+        self._get_coalescer = ReadCoalescer(self.get_cache_ttl, self.get_cache_max_size, loop=self.loop)
+        # seconds to reuse a name to uuid resolution. 0 (default) disables the cache. A request that fails with not
+        # found is retried once with a new resolution, as the cached one can be outdated
+        self.uuid_cache_ttl = float(kwargs.get("uuid_cache_ttl") or 0)
         global requests
         requests = kwargs.get("TODO remove")
 
+    def _get_session(self):
+        """
+        Obtain the persistent http session, creating it at first use, or if it has been closed
+        :return: aiohttp.ClientSession
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_limit, limit_per_host=self.pool_limit_per_host,
+                                             keepalive_timeout=self.keepalive_timeout, loop=self.loop)
+            self._session = aiohttp.ClientSession(connector=connector, loop=self.loop)
+        return self._session
+
+    async def close(self):
+        """
+        Close the persistent http session, releasing the connections. It is created again if the client is used
+        :return: None
+        """
+        if self._session is not None:
+            if not self._session.closed:
+                await self._session.close()
+            self._session = None
+
+    async def _http_get_request(self, session, url):
+        self.logger.debug("RO GET %s", url)
+        # timeout = aiohttp.ClientTimeout(total=self.timeout_short)
+        async with session.get(url, headers=self.headers_req) as response:
+            response_text = await response.read()
+            self.logger.debug("GET {} [{}] {}".format(url, response.status, response_text[:100]))
+        return response.status, response_text
+
+    async def _http_get(self, session, url):
+        """
+        Performs an http GET. Identical requests in progress are coalesced into a single one, whose response is shared
+        by all the callers. Successful responses are reused during get_cache_ttl seconds, if set
+        :param session: aiohttp.ClientSession
+        :param url: url to get
+        :return: response status and response text. aiohttp exceptions are raised
+        """
+        return await self._get_coalescer.get(url, lambda: self._http_get_request(session, url),
+                                             cacheable=lambda response: response[0] < 300)
+
+    def _uuid_cache_get(self, key):
+        if not self.uuid_cache_ttl:
+            return None
+        cached = ROClient._uuid_cache.get(key)
+        if not cached:
+            return None
+        if time() - cached[0] >= self.uuid_cache_ttl:
+            del ROClient._uuid_cache[key]
+            return None
+        return cached[1]
+
+    def _uuid_cache_set(self, key, uuid):
+        if not self.uuid_cache_ttl:
+            return
+        ROClient._uuid_cache.pop(key, None)
+        ROClient._uuid_cache[key] = (time(), uuid)
+        while len(ROClient._uuid_cache) > self.uuid_cache_max_size:
+            ROClient._uuid_cache.popitem(last=False)
+
+    @classmethod
+    def uuid_cache_invalidate(cls, uuid):
+        """
+        Removes the name resolutions to an uuid, e.g. because the item has been deleted or is not found
+        :param uuid: RO uuid
+        :return: None
+        """
+        for key in [key for key, cached in cls._uuid_cache.items() if cached[1] == uuid]:
+            del cls._uuid_cache[key]
+
+    async def _retry_outdated_uuid(self, session, item, item_id_name, all_tenants, request):
+        """
+        Resolves item_id_name into an uuid and performs the request with it. If the request fails because the item is
+        not found, the resolution, that can come from an outdated cache, is discarded and the request is retried once
+        if a different uuid is obtained
+        :param session: aiohttp.ClientSession
+        :param item: RO item, as used at _get_item_uuid
+        :param item_id_name: RO id or name of the item
+        :param all_tenants: as used at _get_item_uuid
+        :param request: coroutine function that receives the uuid and performs the request. It must raise
+            ROClientException with http_code 404 if not found
+        :return: the request result
+        """
+        uuid = await self._get_item_uuid(session, item, item_id_name, all_tenants)
+        try:
+            return await request(uuid)
+        except ROClientException as e:
+            if e.http_code != 404 or uuid == item_id_name:
+                raise
+            self.uuid_cache_invalidate(uuid)
+            new_uuid = await self._get_item_uuid(session, item, item_id_name, all_tenants)
+            if new_uuid == uuid:
+                raise
+        return await request(new_uuid)
+
     def __getitem__(self, index):
         if index == 'tenant':
             return self.tenant_id_name
@@ -285,15 +397,23 @@ class ROClient:
                 "Invalid query string '{}'. Index '{}' out of  range".format(k, kitem_old))
 
     @staticmethod
-    def check_ns_status(ns_descriptor):
+    def parse_ns_descriptor(ns_descriptor):
         """
-        Inspect RO instance descriptor and indicates the status
+        Inspect in a single pass the RO instance descriptor, obtaining the status and the lookup maps used to update
+        the ns and vnf records
         :param ns_descriptor: instance descriptor obtained with self.show("ns", )
-        :return: status, message: status can be BUILD,ACTIVE,ERROR, message is a text message
+        :return: dictionary with:
+            status, status_info: as returned by check_ns_status
+            vnfs: {member_vnf_index: vnf}
+            vms: {(member_vnf_index, vdu_osm_id): [vm, ...]}, the vms of each vdu in count-index order
+            ns_nets: {ns_net_osm_id: net}
+            vnf_nets: {vnf_net_osm_id: net}
         """
         error_list = []
         total = {"VMs": 0, "networks": 0, "SDN_networks": 0}
         done = {"VMs": 0, "networks": 0, "SDN_networks": 0}
+        parsed = {"vnfs": {}, "vms": {}, "ns_nets": {}, "vnf_nets": {}}
+        sce_nets = {}
 
         def _get_ref(desc):
             # return an identification for the network or vm. Try vim_id if exist, if not descriptor id for net
@@ -311,13 +431,6 @@ class ROClient:
             else:
                 return ""
 
-        def _get_sdn_ref(sce_net_id):
-            # look for the network associated to the SDN network and obtain the identification
-            net = next((x for x in ns_descriptor["nets"] if x.get("sce_net_id") == sce_net_id), None)
-            if not sce_net_id or not net:
-                return ""
-            return _get_ref(net)
-
         try:
             total["networks"] = len(ns_descriptor["nets"])
             for net in ns_descriptor["nets"]:
@@ -325,33 +438,59 @@ class ROClient:
                     error_list.append("Error at VIM network {}: {}".format(_get_ref(net), net["error_msg"]))
                 elif net["status"] == "ACTIVE":
                     done["networks"] += 1
+                # first network wins, as when looking for them sequentially
+                if net.get("ns_net_osm_id"):
+                    parsed["ns_nets"].setdefault(net["ns_net_osm_id"], net)
+                if net.get("vnf_net_osm_id"):
+                    parsed["vnf_nets"].setdefault(net["vnf_net_osm_id"], net)
+                if net.get("sce_net_id"):
+                    sce_nets.setdefault(net["sce_net_id"], net)
 
             total["SDN_networks"] = len(ns_descriptor["sdn_nets"])
             for sdn_net in ns_descriptor["sdn_nets"]:
                 if sdn_net["status"] in ("ERROR", "VIM_ERROR", "WIM_ERROR"):
-                    error_list.append("Error at SDN network {}: {}".format(_get_sdn_ref(sdn_net.get("sce_net_id")),
+                    # look for the network associated to the SDN network and obtain the identification
+                    net = sce_nets.get(sdn_net.get("sce_net_id"))
+                    error_list.append("Error at SDN network {}: {}".format(_get_ref(net) if net else "",
                                                                            sdn_net["error_msg"]))
                 elif sdn_net["status"] == "ACTIVE":
                     done["SDN_networks"] += 1
 
             for vnf in ns_descriptor["vnfs"]:
+                parsed["vnfs"].setdefault(vnf["member_vnf_index"], vnf)
                 for vm in vnf["vms"]:
                     total["VMs"] += 1
                     if vm["status"] in ("ERROR", "VIM_ERROR"):
                         error_list.append("Error at VIM VM {}: {}".format(_get_ref(vm), vm["error_msg"]))
                     elif vm["status"] == "ACTIVE":
                         done["VMs"] += 1
+                    parsed["vms"].setdefault((vnf["member_vnf_index"], vm.get("vdu_osm_id")), []).append(vm)
             if error_list:
                 # skip errors caused because other dependendent task is on error
-                return "ERROR", "; ".join([el for el in error_list if "because depends on failed  ACTION" not in el])
-            if all(total[x] == done[x] for x in total):  # DONE == TOTAL for all items
-                return "ACTIVE", str({x: total[x] for x in total if total[x]})  # print only those which value is not 0
+                parsed["status"] = "ERROR"
+                parsed["status_info"] = "; ".join([el for el in error_list
+                                                   if "because depends on failed  ACTION" not in el])
+            elif all(total[x] == done[x] for x in total):  # DONE == TOTAL for all items
+                parsed["status"] = "ACTIVE"
+                parsed["status_info"] = str({x: total[x] for x in total if total[x]})  # only those not 0
             else:
-                return "BUILD", str({x: "{}/{}".format(done[x], total[x]) for x in total if total[x]})
                 # print done/total for each item if total is not 0
+                parsed["status"] = "BUILD"
+                parsed["status_info"] = str({x: "{}/{}".format(done[x], total[x]) for x in total if total[x]})
+            return parsed
         except Exception as e:
             raise ROClientException("Unexpected RO ns descriptor. Wrong version? {}".format(e)) from e
 
+    @staticmethod
+    def check_ns_status(ns_descriptor):
+        """
+        Inspect RO instance descriptor and indicates the status
+        :param ns_descriptor: instance descriptor obtained with self.show("ns", )
+        :return: status, message: status can be BUILD,ACTIVE,ERROR, message is a text message
+        """
+        parsed = ROClient.parse_ns_descriptor(ns_descriptor)
+        return parsed["status"], parsed["status_info"]
+
     @staticmethod
     def check_action_status(action_descriptor):
         """
@@ -452,16 +591,17 @@ class ROClient:
             url += "/" + item_id_name
         elif item_id_name and item_id_name.startswith("'") and item_id_name.endswith("'"):
             item_id_name = item_id_name[1:-1]
-        self.logger.debug("RO GET %s", url)
-        # timeout = aiohttp.ClientTimeout(total=self.timeout_short)
-        async with session.get(url, headers=self.headers_req) as response:
-            response_text = await response.read()
-            self.logger.debug("GET {} [{}] {}".format(url, response.status, response_text[:100]))
-            if response.status == 404:  # NOT_FOUND
-                raise ROClientException("No {} found with id '{}'".format(item[:-1], item_id_name),
-                                        http_code=404)
-            if response.status >= 300:
-                raise ROClientException(self._parse_error_yaml(response_text), http_code=response.status)
+        cache_key = (url, item_id_name)
+        if not item_id:
+            uuid = self._uuid_cache_get(cache_key)
+            if uuid:
+                return uuid
+        response_status, response_text = await self._http_get(session, url)
+        if response_status == 404:  # NOT_FOUND
+            raise ROClientException("No {} found with id '{}'".format(item[:-1], item_id_name),
+                                    http_code=404)
+        if response_status >= 300:
+            raise ROClientException(self._parse_error_yaml(response_text), http_code=response_status)
         content = self._parse_yaml(response_text, response=True)
 
         if item_id:
@@ -479,6 +619,7 @@ class ROClient:
             uuid = i["uuid"]
         if not uuid:
             raise ROClientException("No {} found with name '{}'".format(item[:-1], item_id_name), http_code=404)
+        self._uuid_cache_set(cache_key, uuid)
         return uuid
 
     async def _get_item(self, session, item, item_id_name, extra_item=None, extra_item_id=None, all_tenants=False):
@@ -491,26 +632,21 @@ class ROClient:
                 await self._get_tenant(session)
             tenant_text = "/" + self.tenant
 
-        if self.check_if_uuid(item_id_name):
-            uuid = item_id_name
-        else:
-            # check that exist
-            uuid = await self._get_item_uuid(session, item, item_id_name, all_tenants)
-
-        url = "{}{}/{}/{}".format(self.uri, tenant_text, item, uuid)
-        if extra_item:
-            url += "/" + extra_item
-            if extra_item_id:
-                url += "/" + extra_item_id
-        self.logger.debug("GET %s", url)
-        # timeout = aiohttp.ClientTimeout(total=self.timeout_short)
-        async with session.get(url, headers=self.headers_req) as response:
-            response_text = await response.read()
-            self.logger.debug("GET {} [{}] {}".format(url, response.status, response_text[:100]))
-            if response.status >= 300:
-                raise ROClientException(self._parse_error_yaml(response_text), http_code=response.status)
+        async def get_item(uuid):
+            url = "{}{}/{}/{}".format(self.uri, tenant_text, item, uuid)
+            if extra_item:
+                url += "/" + extra_item
+                if extra_item_id:
+                    url += "/" + extra_item_id
+            response_status, response_text = await self._http_get(session, url)
+            if response_status >= 300:
+                raise ROClientException(self._parse_error_yaml(response_text), http_code=response_status)
+            return self._parse_yaml(response_text, response=True)
 
-        return self._parse_yaml(response_text, response=True)
+        if self.check_if_uuid(item_id_name):
+            return await get_item(item_id_name)
+        # check that exist
+        return await self._retry_outdated_uuid(session, item, item_id_name, all_tenants, get_item)
 
     async def _get_tenant(self, session):
         if not self.tenant:
@@ -546,30 +682,29 @@ class ROClient:
             api_version_text = "/v3"
             item = "nsd"
 
-        if not item_id_name:
-            uuid = ""
-        elif self.check_if_uuid(item_id_name):
-            uuid = "/{}".format(item_id_name)
-        else:
-            # check that exist
-            uuid = await self._get_item_uuid(session, item, item_id_name, all_tenants)
-            uuid = "/{}".format(uuid)
         if not action:
             action = ""
         else:
             action = "/{}".format(action)
 
-        url = "{}{apiver}{tenant}/{item}{id}{action}".format(self.uri, apiver=api_version_text,
-                                                             tenant=tenant_text, item=item, id=uuid, action=action)
-        self.logger.debug("RO POST %s %s", url, payload_req)
-        # timeout = aiohttp.ClientTimeout(total=self.timeout_large)
-        async with session.post(url, headers=self.headers_req, data=payload_req) as response:
-            response_text = await response.read()
-            self.logger.debug("POST {} [{}] {}".format(url, response.status, response_text[:100]))
-            if response.status >= 300:
-                raise ROClientException(self._parse_error_yaml(response_text), http_code=response.status)
+        async def post_item(uuid):
+            url = "{}{apiver}{tenant}/{item}{id}{action}".format(self.uri, apiver=api_version_text,
+                                                                 tenant=tenant_text, item=item,
+                                                                 id="/{}".format(uuid) if uuid else "", action=action)
+            self.logger.debug("RO POST %s %s", url, payload_req)
+            with self._get_coalescer.writing():
+                # timeout = aiohttp.ClientTimeout(total=self.timeout_large)
+                async with session.post(url, headers=self.headers_req, data=payload_req) as response:
+                    response_text = await response.read()
+                    self.logger.debug("POST {} [{}] {}".format(url, response.status, response_text[:100]))
+                    if response.status >= 300:
+                        raise ROClientException(self._parse_error_yaml(response_text), http_code=response.status)
+            return self._parse_yaml(response_text, response=True)
 
-        return self._parse_yaml(response_text, response=True)
+        if not item_id_name or self.check_if_uuid(item_id_name):
+            return await post_item(item_id_name)
+        # check that exist
+        return await self._retry_outdated_uuid(session, item, item_id_name, all_tenants, post_item)
 
     async def _del_item(self, session, item, item_id_name, all_tenants=False):
         if all_tenants:
@@ -580,25 +715,28 @@ class ROClient:
             if not self.tenant:
                 await self._get_tenant(session)
             tenant_text = "/" + self.tenant
-        if not self.check_if_uuid(item_id_name):
-            # check that exist
-            _all_tenants = all_tenants
-            if item in ("datacenters", 'wims'):
-                _all_tenants = True
-            uuid = await self._get_item_uuid(session, item, item_id_name, all_tenants=_all_tenants)
-        else:
-            uuid = item_id_name
 
-        url = "{}{}/{}/{}".format(self.uri, tenant_text, item, uuid)
-        self.logger.debug("DELETE %s", url)
-        # timeout = aiohttp.ClientTimeout(total=self.timeout_short)
-        async with session.delete(url, headers=self.headers_req) as response:
-            response_text = await response.read()
-            self.logger.debug("DELETE {} [{}] {}".format(url, response.status, response_text[:100]))
-            if response.status >= 300:
-                raise ROClientException(self._parse_error_yaml(response_text), http_code=response.status)
+        async def delete_item(uuid):
+            url = "{}{}/{}/{}".format(self.uri, tenant_text, item, uuid)
+            self.logger.debug("DELETE %s", url)
+            with self._get_coalescer.writing():
+                # timeout = aiohttp.ClientTimeout(total=self.timeout_short)
+                async with session.delete(url, headers=self.headers_req) as response:
+                    response_text = await response.read()
+                    self.logger.debug("DELETE {} [{}] {}".format(url, response.status, response_text[:100]))
+                    if response.status < 300 or response.status == 404:
+                        self.uuid_cache_invalidate(uuid)
+                    if response.status >= 300:
+                        raise ROClientException(self._parse_error_yaml(response_text), http_code=response.status)
+            return self._parse_yaml(response_text, response=True)
 
-        return self._parse_yaml(response_text, response=True)
+        if self.check_if_uuid(item_id_name):
+            return await delete_item(item_id_name)
+        # check that exist
+        _all_tenants = all_tenants
+        if item in ("datacenters", 'wims'):
+            _all_tenants = True
+        return await self._retry_outdated_uuid(session, item, item_id_name, _all_tenants, delete_item)
 
     async def _list_item(self, session, item, all_tenants=False, filter_dict=None):
         if all_tenants:
@@ -616,13 +754,9 @@ class ROClient:
             for k in filter_dict:
                 url += separator + quote(str(k)) + "=" + quote(str(filter_dict[k]))
                 separator = "&"
-        self.logger.debug("RO GET %s", url)
-        # timeout = aiohttp.ClientTimeout(total=self.timeout_short)
-        async with session.get(url, headers=self.headers_req) as response:
-            response_text = await response.read()
-            self.logger.debug("GET {} [{}] {}".format(url, response.status, response_text[:100]))
-            if response.status >= 300:
-                raise ROClientException(self._parse_error_yaml(response_text), http_code=response.status)
+        response_status, response_text = await self._http_get(session, url)
+        if response_status >= 300:
+            raise ROClientException(self._parse_error_yaml(response_text), http_code=response_status)
 
         return self._parse_yaml(response_text, response=True)
 
@@ -641,12 +775,13 @@ class ROClient:
         # print payload_req
         url = "{}{}/{}/{}".format(self.uri, tenant_text, item, item_id)
         self.logger.debug("RO PUT %s %s", url, payload_req)
-        # timeout = aiohttp.ClientTimeout(total=self.timeout_large)
-        async with session.put(url, headers=self.headers_req, data=payload_req) as response:
-            response_text = await response.read()
-            self.logger.debug("PUT {} [{}] {}".format(url, response.status, response_text[:100]))
-            if response.status >= 300:
-                raise ROClientException(self._parse_error_yaml(response_text), http_code=response.status)
+        with self._get_coalescer.writing():
+            # timeout = aiohttp.ClientTimeout(total=self.timeout_large)
+            async with session.put(url, headers=self.headers_req, data=payload_req) as response:
+                response_text = await response.read()
+                self.logger.debug("PUT {} [{}] {}".format(url, response.status, response_text[:100]))
+                if response.status >= 300:
+                    raise ROClientException(self._parse_error_yaml(response_text), http_code=response.status)
 
         return self._parse_yaml(response_text, response=True)
 
@@ -657,21 +792,17 @@ class ROClient:
         """
         try:
             response_text = ""
-            async with aiohttp.ClientSession(loop=self.loop) as session:
-                url = "{}/version".format(self.uri)
-                self.logger.debug("RO GET %s", url)
-                # timeout = aiohttp.ClientTimeout(total=self.timeout_short)
-                async with session.get(url, headers=self.headers_req) as response:
-                    response_text = await response.read()
-                    self.logger.debug("GET {} [{}] {}".format(url, response.status, response_text[:100]))
-                    if response.status >= 300:
-                        raise ROClientException(self._parse_error_yaml(response_text), http_code=response.status)
-
-                for word in str(response_text).split(" "):
-                    if "." in word:
-                        version_text, _, _ = word.partition("-")
-                        return version_text
-                raise ROClientException("Got invalid version text: '{}'".format(response_text), http_code=500)
+            session = self._get_session()
+            url = "{}/version".format(self.uri)
+            response_status, response_text = await self._http_get(session, url)
+            if response_status >= 300:
+                raise ROClientException(self._parse_error_yaml(response_text), http_code=response_status)
+
+            for word in str(response_text).split(" "):
+                if "." in word:
+                    version_text, _, _ = word.partition("-")
+                    return version_text
+            raise ROClientException("Got invalid version text: '{}'".format(response_text), http_code=500)
         except (aiohttp.ClientOSError, aiohttp.ClientError) as e:
             raise ROClientException(e, http_code=504)
         except asyncio.TimeoutError:
@@ -693,9 +824,9 @@ class ROClient:
                 raise ROClientException("Invalid item {}".format(item))
             if item == 'tenant':
                 all_tenants = None
-            async with aiohttp.ClientSession(loop=self.loop) as session:
-                content = await self._list_item(session, self.client_to_RO[item], all_tenants=all_tenants,
-                                                filter_dict=filter_by)
+            session = self._get_session()
+            content = await self._list_item(session, self.client_to_RO[item], all_tenants=all_tenants,
+                                            filter_dict=filter_by)
             if isinstance(content, dict):
                 if len(content) == 1:
                     for _, v in content.items():
@@ -730,10 +861,10 @@ class ROClient:
             elif item == 'vim_account':
                 all_tenants = False
 
-            async with aiohttp.ClientSession(loop=self.loop) as session:
-                content = await self._get_item(session, self.client_to_RO[item], item_id_name, extra_item=extra_item,
-                                               extra_item_id=extra_item_id, all_tenants=all_tenants)
-                return remove_envelop(item, content)
+            session = self._get_session()
+            content = await self._get_item(session, self.client_to_RO[item], item_id_name, extra_item=extra_item,
+                                           extra_item_id=extra_item_id, all_tenants=all_tenants)
+            return remove_envelop(item, content)
         except (aiohttp.ClientOSError, aiohttp.ClientError) as e:
             raise ROClientException(e, http_code=504)
         except asyncio.TimeoutError:
@@ -753,15 +884,15 @@ class ROClient:
             if item in ('tenant', 'vim', 'wim'):
                 all_tenants = None
 
-            async with aiohttp.ClientSession(loop=self.loop) as session:
-                result = await self._del_item(session, self.client_to_RO[item], item_id_name, all_tenants=all_tenants)
-                # in case of ns delete, get the action_id embeded in text
-                if item == "ns" and result.get("result"):
-                    _, _, action_id = result["result"].partition("action_id=")
-                    action_id, _, _ = action_id.partition(" ")
-                    if action_id:
-                        result["action_id"] = action_id
-                return result
+            session = self._get_session()
+            result = await self._del_item(session, self.client_to_RO[item], item_id_name, all_tenants=all_tenants)
+            # in case of ns delete, get the action_id embeded in text
+            if item == "ns" and result.get("result"):
+                _, _, action_id = result["result"].partition("action_id=")
+                action_id, _, _ = action_id.partition(" ")
+                if action_id:
+                    result["action_id"] = action_id
+            return result
         except (aiohttp.ClientOSError, aiohttp.ClientError) as e:
             raise ROClientException(e, http_code=504)
         except asyncio.TimeoutError:
@@ -798,18 +929,17 @@ class ROClient:
 
             create_desc = self._create_envelop(item, desc)
 
-            async with aiohttp.ClientSession(loop=self.loop) as session:
-                _all_tenants = all_tenants
-                if item == 'vim':
-                    _all_tenants = True
-                item_id = await self._get_item_uuid(session, self.client_to_RO[item], item_id_name,
-                                                    all_tenants=_all_tenants)
-                if item == 'vim':
-                    _all_tenants = None
-                # await self._get_tenant(session)
-                outdata = await self._edit_item(session, self.client_to_RO[item], item_id, create_desc,
-                                                all_tenants=_all_tenants)
-                return remove_envelop(item, outdata)
+            session = self._get_session()
+            _all_tenants = all_tenants
+            if item == 'vim':
+                _all_tenants = True
+            edit_all_tenants = None if item == 'vim' else _all_tenants
+            # await self._get_tenant(session)
+            outdata = await self._retry_outdated_uuid(
+                session, self.client_to_RO[item], item_id_name, _all_tenants,
+                lambda item_id: self._edit_item(session, self.client_to_RO[item], item_id, create_desc,
+                                                all_tenants=edit_all_tenants))
+            return remove_envelop(item, outdata)
         except (aiohttp.ClientOSError, aiohttp.ClientError) as e:
             raise ROClientException(e, http_code=504)
         except asyncio.TimeoutError:
@@ -851,10 +981,10 @@ class ROClient:
 
             create_desc = self._create_envelop(item, desc)
 
-            async with aiohttp.ClientSession(loop=self.loop) as session:
-                outdata = await self._create_item(session, self.client_to_RO[item], create_desc,
-                                                  all_tenants=all_tenants)
-                return remove_envelop(item, outdata)
+            session = self._get_session()
+            outdata = await self._create_item(session, self.client_to_RO[item], create_desc,
+                                              all_tenants=all_tenants)
+            return remove_envelop(item, outdata)
         except (aiohttp.ClientOSError, aiohttp.ClientError) as e:
             raise ROClientException(e, http_code=504)
         except asyncio.TimeoutError:
@@ -900,16 +1030,16 @@ class ROClient:
             # create_desc = self._create_envelop(item, desc)
             create_desc = desc
 
-            async with aiohttp.ClientSession(loop=self.loop) as session:
-                _all_tenants = all_tenants
-                if item == 'vim':
-                    _all_tenants = True
-                # item_id = await self._get_item_uuid(session, self.client_to_RO[item], item_id_name,
-                #                                     all_tenants=_all_tenants)
-                outdata = await self._create_item(session, self.client_to_RO[item], create_desc,
-                                                  item_id_name=item_id_name,  # item_id_name=item_id
-                                                  action=action, all_tenants=_all_tenants)
-                return remove_envelop(item, outdata)
+            session = self._get_session()
+            _all_tenants = all_tenants
+            if item == 'vim':
+                _all_tenants = True
+            # item_id = await self._get_item_uuid(session, self.client_to_RO[item], item_id_name,
+            #                                     all_tenants=_all_tenants)
+            outdata = await self._create_item(session, self.client_to_RO[item], create_desc,
+                                              item_id_name=item_id_name,  # item_id_name=item_id
+                                              action=action, all_tenants=_all_tenants)
+            return remove_envelop(item, outdata)
         except (aiohttp.ClientOSError, aiohttp.ClientError) as e:
             raise ROClientException(e, http_code=504)
         except asyncio.TimeoutError:
@@ -950,24 +1080,27 @@ class ROClient:
                                         format(item))
             create_desc = self._create_envelop(item, desc)
             payload_req = yaml.safe_dump(create_desc)
-            async with aiohttp.ClientSession(loop=self.loop) as session:
-                # check that exist
-                item_id = await self._get_item_uuid(session, self.client_to_RO[item], item_id_name, all_tenants=True)
-                await self._get_tenant(session)
+            session = self._get_session()
 
+            async def post_attach(item_id):
+                await self._get_tenant(session)
                 url = "{}/{tenant}/{item}/{item_id}".format(self.uri, tenant=self.tenant,
                                                             item=self.client_to_RO[item], item_id=item_id)
                 self.logger.debug("RO POST %s %s", url, payload_req)
-                # timeout = aiohttp.ClientTimeout(total=self.timeout_large)
-                async with session.post(url, headers=self.headers_req, data=payload_req) as response:
-                    response_text = await response.read()
-                    self.logger.debug("POST {} [{}] {}".format(url, response.status, response_text[:100]))
-                    if response.status >= 300:
-                        raise ROClientException(self._parse_error_yaml(response_text), http_code=response.status)
+                with self._get_coalescer.writing():
+                    # timeout = aiohttp.ClientTimeout(total=self.timeout_large)
+                    async with session.post(url, headers=self.headers_req, data=payload_req) as response:
+                        response_text = await response.read()
+                        self.logger.debug("POST {} [{}] {}".format(url, response.status, response_text[:100]))
+                        if response.status >= 300:
+                            raise ROClientException(self._parse_error_yaml(response_text), http_code=response.status)
+                return self._parse_yaml(response_text, response=True)
 
-                response_desc = self._parse_yaml(response_text, response=True)
-                desc = remove_envelop(item, response_desc)
-                return desc
+            # check that exist
+            response_desc = await self._retry_outdated_uuid(session, self.client_to_RO[item], item_id_name, True,
+                                                            post_attach)
+            desc = remove_envelop(item, response_desc)
+            return desc
         except (aiohttp.ClientOSError, aiohttp.ClientError) as e:
             raise ROClientException(e, http_code=504)
         except asyncio.TimeoutError:
@@ -976,25 +1109,27 @@ class ROClient:
     async def detach(self, item, item_id_name=None):
         # TODO replace the code with delete_item(vim_account,...)
         try:
-            async with aiohttp.ClientSession(loop=self.loop) as session:
-                # check that exist
-                item_id = await self._get_item_uuid(session, self.client_to_RO[item], item_id_name, all_tenants=False)
-                tenant = await self._get_tenant(session)
+            session = self._get_session()
 
+            async def delete_attach(item_id):
+                tenant = await self._get_tenant(session)
                 url = "{}/{tenant}/{item}/{datacenter}".format(self.uri, tenant=tenant,
                                                                item=self.client_to_RO[item], datacenter=item_id)
                 self.logger.debug("RO DELETE %s", url)
-               
-                # timeout = aiohttp.ClientTimeout(total=self.timeout_large)
-                async with session.delete(url, headers=self.headers_req) as response:
-                    response_text = await response.read()
-                    self.logger.debug("DELETE {} [{}] {}".format(url, response.status, response_text[:100]))
-                    if response.status >= 300:
-                        raise ROClientException(self._parse_error_yaml(response_text), http_code=response.status)
- 
-                response_desc = self._parse_yaml(response_text, response=True)
-                desc = remove_envelop(item, response_desc)
-                return desc
+                with self._get_coalescer.writing():
+                    # timeout = aiohttp.ClientTimeout(total=self.timeout_large)
+                    async with session.delete(url, headers=self.headers_req) as response:
+                        response_text = await response.read()
+                        self.logger.debug("DELETE {} [{}] {}".format(url, response.status, response_text[:100]))
+                        if response.status >= 300:
+                            raise ROClientException(self._parse_error_yaml(response_text), http_code=response.status)
+                return self._parse_yaml(response_text, response=True)
+
+            # check that exist
+            response_desc = await self._retry_outdated_uuid(session, self.client_to_RO[item], item_id_name, False,
+                                                            delete_attach)
+            desc = remove_envelop(item, response_desc)
+            return desc
         except (aiohttp.ClientOSError, aiohttp.ClientError) as e:
             raise ROClientException(e, http_code=504)
         except asyncio.TimeoutError:
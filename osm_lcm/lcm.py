@@ -32,9 +32,11 @@ import sys
 from osm_lcm import ns, prometheus, vim_sdn, netslice
 from osm_lcm.ng_ro import NgRoException, NgRoClient
 from osm_lcm.ROclient import ROClient, ROClientException
+from osm_lcm.lcm_metrics import LcmMetrics
 
 from time import time
-from osm_lcm.lcm_utils import versiontuple, LcmException, TaskRegistry, LcmExceptionExit
+from osm_lcm.lcm_utils import versiontuple, LcmException, TaskRegistry, LcmExceptionExit, AdmissionControl, \
+    DescriptorCache, DbAsync, PackageCache, TemplateCache, PollBackoff
 from osm_lcm import version as lcm_version, version_date as lcm_version_date
 
 from osm_common import dbmemory, dbmongo, fslocal, fsmongo, msglocal, msgkafka
@@ -62,7 +64,8 @@ class Lcm:
 
     ping_interval_pace = 120  # how many time ping is send once is confirmed all is running
     ping_interval_boot = 5    # how many time ping is sent when booting
-    cfg_logger_name = {"message": "lcm.msg", "database": "lcm.db", "storage": "lcm.fs", "tsdb": "lcm.prometheus"}
+    cfg_logger_name = {"message": "lcm.msg", "database": "lcm.db", "storage": "lcm.fs", "tsdb": "lcm.prometheus",
+                       "metrics": "lcm.metrics"}
     # ^ contains for each section at lcm.cfg the used logger name
 
     def __init__(self, config_file, loop=None):
@@ -92,6 +95,12 @@ class Lcm:
             "tenant": config.get("tenant", "osm"),
             "logger_name": "lcm.roclient",
             "loglevel": config["RO"].get("loglevel", "ERROR"),
+            "pool_limit": config["RO"].get("pool_limit"),
+            "pool_limit_per_host": config["RO"].get("pool_limit_per_host"),
+            "keepalive_timeout": config["RO"].get("keepalive_timeout"),
+            "get_cache_ttl": config["RO"].get("get_cache_ttl"),
+            "uuid_cache_ttl": config["RO"].get("uuid_cache_ttl"),
+            "shared_descriptors": config["RO"].get("shared_descriptors", False),
         }
         if not self.config["ro_config"]["uri"]:
             if not self.config["ro_config"]["ng"]:
@@ -189,18 +198,43 @@ class Lcm:
             self.logger.critical(str(e), exc_info=True)
             raise LcmException(str(e))
 
+        # internal metrics, served at an http endpoint. Database calls are timed
+        self.metrics = LcmMetrics(config["metrics"], self.loop, logging.getLogger("lcm.metrics"))
+        self.metrics.collectors.append(self._collect_metrics)
+        self.db = self.metrics.instrument(self.db, "db")
+
+        # database calls done from coroutines are run at a thread pool. Memory driver is not thread safe
+        if config["database"]["driver"] == "mongo":
+            DbAsync.configure(config["database"].get("async_workers", 10))
+
         # contains created tasks/futures to be able to cancel
         self.lcm_tasks = TaskRegistry(self.worker_id, self.db, self.logger)
+        # limits the concurrent operations, queuing the ones over the limits
+        self.admission = AdmissionControl(self.config["admission"], self.loop, logging.getLogger("lcm.admission"),
+                                          self.metrics)
 
+        # compiled jinja2 templates of cloud-init and prometheus jobs, shared by all modules
+        self.template_cache = TemplateCache(config["global"].get("template_cache_size", 1000),
+                                            logging.getLogger("lcm.cache"))
         if self.config.get("tsdb") and self.config["tsdb"].get("driver"):
             if self.config["tsdb"]["driver"] == "prometheus":
-                self.prometheus = prometheus.Prometheus(self.config["tsdb"], self.worker_id, self.db, self.loop)
+                self.prometheus = prometheus.Prometheus(self.config["tsdb"], self.worker_id, self.db, self.loop,
+                                                        template_cache=self.template_cache)
             else:
                 raise LcmException("Invalid configuration param '{}' at '[tsdb]':'driver'".format(
                     config["tsdb"]["driver"]))
         else:
             self.prometheus = None
-        self.ns = ns.NsLcm(self.db, self.msg, self.fs, self.lcm_tasks, self.config, self.loop, self.prometheus)
+        # nsd and vnfd read from database, shared by all modules
+        self.descriptor_cache = DescriptorCache(self.db, config["global"].get("descriptor_cache_size", 50000000),
+                                                config["global"].get("descriptor_cache_ttl", 300),
+                                                logging.getLogger("lcm.cache"))
+        # local copy of the packages. With mongo storage the local filesystem is just a copy that can be evicted
+        self.package_cache = PackageCache(self.fs, self.loop, config["storage"].get("package_cache_size", 0),
+                                          evict=config["storage"]["driver"] == "mongo",
+                                          logger=logging.getLogger("lcm.fs"))
+        self.ns = ns.NsLcm(self.db, self.msg, self.fs, self.lcm_tasks, self.config, self.loop, self.prometheus,
+                           self.descriptor_cache, self.package_cache, self.metrics, self.template_cache)
         self.netslice = netslice.NetsliceLcm(self.db, self.msg, self.fs, self.lcm_tasks, self.config, self.loop,
                                              self.ns)
         self.vim = vim_sdn.VimLcm(self.db, self.msg, self.fs, self.lcm_tasks, self.config, self.loop)
@@ -208,6 +242,19 @@ class Lcm:
         self.sdn = vim_sdn.SdnLcm(self.db, self.msg, self.fs, self.lcm_tasks, self.config, self.loop)
         self.k8scluster = vim_sdn.K8sClusterLcm(self.db, self.msg, self.fs, self.lcm_tasks, self.config, self.loop)
         self.k8srepo = vim_sdn.K8sRepoLcm(self.db, self.msg, self.fs, self.lcm_tasks, self.config, self.loop)
+        for lcm_module in (self.netslice, self.vim, self.wim, self.sdn):
+            lcm_module.RO = self.metrics.instrument(lcm_module.RO, "ro")
+
+    def _collect_metrics(self):
+        for topic, running in self.lcm_tasks.count_running().items():
+            self.metrics.set_gauge("lcm_tasks_in_flight", {"topic": topic}, running)
+        admission_status = self.admission.get_status()
+        for name, running in admission_status["running"].items():
+            # name is either a topic or a command, as admission limits are set
+            self.metrics.set_gauge("lcm_admission_running", {"name": name}, running)
+        self.metrics.set_gauge("lcm_admission_pending", None, admission_status["pending"])
+        running_op_ids = self.lcm_tasks.get_running_op_ids("ns") | self.lcm_tasks.get_running_op_ids("nsi")
+        self.metrics.forget_operations(running_op_ids)
 
     async def check_RO_version(self):
         tries = 14
@@ -218,7 +265,10 @@ class Lcm:
                     ro_server = NgRoClient(self.loop, **self.config["ro_config"])
                 else:
                     ro_server = ROClient(self.loop, **self.config["ro_config"])
-                ro_version = await ro_server.get_version()
+                try:
+                    ro_version = await ro_server.get_version()
+                finally:
+                    await ro_server.close()
                 if versiontuple(ro_version) < versiontuple(min_RO_version):
                     raise LcmException("Not compatible osm/RO version '{}'. Needed '{}' or higher".format(
                         ro_version, min_RO_version))
@@ -248,7 +298,7 @@ class Lcm:
             try:
                 await self.msg_admin.aiowrite(
                     "admin", "ping",
-                    {"from": "lcm", "to": "lcm", "worker_id": self.worker_id, "version": lcm_version},
+                    {"from": "lcm", "to": "lcm", "worker_id": self.worker_id, "version": lcm_version, "time": time()},
                     self.loop)
                 # time between pings are low when it is not received and at starting
                 wait_time = self.ping_interval_boot if not kafka_has_received else self.ping_interval_pace
@@ -258,6 +308,11 @@ class Lcm:
                 await asyncio.sleep(wait_time, loop=self.loop)
                 if self.pings_not_received > 10:
                     raise LcmException("It is not receiving pings from Kafka bus")
+                admission_status = self.admission.get_status()
+                if admission_status["queued"]:
+                    self.logger.info("Admission status: running={running} pending={pending} queued={queued} "
+                                     "wait_time_average={wait_time_average:.1f}s wait_time_max={wait_time_max:.1f}s"
+                                     .format(**admission_status))
                 consecutive_errors = 0
                 first_start = False
             except LcmException:
@@ -278,6 +333,7 @@ class Lcm:
 
         if topic != "admin" and command != "ping":
             self.logger.debug("Task kafka_read receives {} {}: {}".format(topic, command, params))
+        self.metrics.message_received(topic, command, params)
         self.consecutive_errors = 0
         self.first_start = False
         order_id += 1
@@ -305,6 +361,13 @@ class Lcm:
                 except Exception as e:
                     self.logger.error("Cannot write into '{}' for healthcheck: {}".format(health_check_file, e))
             return
+        elif topic in ("vnfd", "nsd"):
+            # descriptors changed by NBI. These topics are read by every worker to keep the cache updated
+            if command in ("edited", "deleted"):
+                self.descriptor_cache.invalidate(topic + "s", params.get("_id"))
+            if command == "deleted":
+                self.package_cache.invalidate(params.get("_id"))
+            return
         elif topic == "pla":
             if command == "placement":
                 self.ns.update_nsrs_with_pla_result(params)
@@ -312,24 +375,28 @@ class Lcm:
         elif topic == "k8scluster":
             if command == "create" or command == "created":
                 k8scluster_id = params.get("_id")
-                task = asyncio.ensure_future(self.k8scluster.create(params, order_id))
+                task = self.admission.admit("k8scluster", "k8scluster_create", k8scluster_id,
+                                            self.k8scluster.create(params, order_id))
                 self.lcm_tasks.register("k8scluster", k8scluster_id, order_id, "k8scluster_create", task)
                 return
             elif command == "delete" or command == "deleted":
                 k8scluster_id = params.get("_id")
-                task = asyncio.ensure_future(self.k8scluster.delete(params, order_id))
+                task = self.admission.admit("k8scluster", "k8scluster_delete", k8scluster_id,
+                                            self.k8scluster.delete(params, order_id))
                 self.lcm_tasks.register("k8scluster", k8scluster_id, order_id, "k8scluster_delete", task)
                 return
         elif topic == "k8srepo":
             if command == "create" or command == "created":
                 k8srepo_id = params.get("_id")
                 self.logger.debug("k8srepo_id = {}".format(k8srepo_id))
-                task = asyncio.ensure_future(self.k8srepo.create(params, order_id))
+                task = self.admission.admit("k8srepo", "k8srepo_create", k8srepo_id,
+                                            self.k8srepo.create(params, order_id))
                 self.lcm_tasks.register("k8srepo", k8srepo_id, order_id, "k8srepo_create", task)
                 return
             elif command == "delete" or command == "deleted":
                 k8srepo_id = params.get("_id")
-                task = asyncio.ensure_future(self.k8srepo.delete(params, order_id))
+                task = self.admission.admit("k8srepo", "k8srepo_delete", k8srepo_id,
+                                            self.k8srepo.delete(params, order_id))
                 self.lcm_tasks.register("k8srepo", k8srepo_id, order_id, "k8srepo_delete", task)
                 return
         elif topic == "ns":
@@ -338,7 +405,7 @@ class Lcm:
                 nslcmop = params
                 nslcmop_id = nslcmop["_id"]
                 nsr_id = nslcmop["nsInstanceId"]
-                task = asyncio.ensure_future(self.ns.instantiate(nsr_id, nslcmop_id))
+                task = self.admission.admit("ns", "ns_instantiate", nsr_id, self.ns.instantiate(nsr_id, nslcmop_id))
                 self.lcm_tasks.register("ns", nsr_id, nslcmop_id, "ns_instantiate", task)
                 return
             elif command == "terminate":
@@ -347,7 +414,7 @@ class Lcm:
                 nslcmop_id = nslcmop["_id"]
                 nsr_id = nslcmop["nsInstanceId"]
                 self.lcm_tasks.cancel(topic, nsr_id)
-                task = asyncio.ensure_future(self.ns.terminate(nsr_id, nslcmop_id))
+                task = self.admission.admit("ns", "ns_terminate", nsr_id, self.ns.terminate(nsr_id, nslcmop_id))
                 self.lcm_tasks.register("ns", nsr_id, nslcmop_id, "ns_terminate", task)
                 return
             elif command == "action":
@@ -355,7 +422,7 @@ class Lcm:
                 nslcmop = params
                 nslcmop_id = nslcmop["_id"]
                 nsr_id = nslcmop["nsInstanceId"]
-                task = asyncio.ensure_future(self.ns.action(nsr_id, nslcmop_id))
+                task = self.admission.admit("ns", "ns_action", nsr_id, self.ns.action(nsr_id, nslcmop_id))
                 self.lcm_tasks.register("ns", nsr_id, nslcmop_id, "ns_action", task)
                 return
             elif command == "scale":
@@ -363,7 +430,7 @@ class Lcm:
                 nslcmop = params
                 nslcmop_id = nslcmop["_id"]
                 nsr_id = nslcmop["nsInstanceId"]
-                task = asyncio.ensure_future(self.ns.scale(nsr_id, nslcmop_id))
+                task = self.admission.admit("ns", "ns_scale", nsr_id, self.ns.scale(nsr_id, nslcmop_id))
                 self.lcm_tasks.register("ns", nsr_id, nslcmop_id, "ns_scale", task)
                 return
             elif command == "show":
@@ -382,6 +449,8 @@ class Lcm:
             elif command == "deleted":
                 return  # TODO cleaning of task just in case should be done
             elif command in ("terminated", "instantiated", "scaled", "actioned"):  # "scaled-cooldown-time"
+                # operation finished, maybe at other worker. Wake up the operations waiting for it
+                self.lcm_tasks.notify_completion(params.get("nsr_id"))
                 return
         elif topic == "nsi":  # netslice LCM processes (instantiate, terminate, etc)
             if command == "instantiate":
@@ -389,7 +458,8 @@ class Lcm:
                 nsilcmop = params
                 nsilcmop_id = nsilcmop["_id"]  # slice operation id
                 nsir_id = nsilcmop["netsliceInstanceId"]  # slice record id
-                task = asyncio.ensure_future(self.netslice.instantiate(nsir_id, nsilcmop_id))
+                task = self.admission.admit("nsi", "nsi_instantiate", nsir_id,
+                                            self.netslice.instantiate(nsir_id, nsilcmop_id))
                 self.lcm_tasks.register("nsi", nsir_id, nsilcmop_id, "nsi_instantiate", task)
                 return
             elif command == "terminate":
@@ -398,7 +468,8 @@ class Lcm:
                 nsilcmop_id = nsilcmop["_id"]  # slice operation id
                 nsir_id = nsilcmop["netsliceInstanceId"]  # slice record id
                 self.lcm_tasks.cancel(topic, nsir_id)
-                task = asyncio.ensure_future(self.netslice.terminate(nsir_id, nsilcmop_id))
+                task = self.admission.admit("nsi", "nsi_terminate", nsir_id,
+                                            self.netslice.terminate(nsir_id, nsilcmop_id))
                 self.lcm_tasks.register("nsi", nsir_id, nsilcmop_id, "nsi_terminate", task)
                 return
             elif command == "show":
@@ -417,16 +488,18 @@ class Lcm:
             elif command == "deleted":
                 return  # TODO cleaning of task just in case should be done
             elif command in ("terminated", "instantiated", "scaled", "actioned"):  # "scaled-cooldown-time"
+                # operation finished, maybe at other worker. Wake up the operations waiting for it
+                self.lcm_tasks.notify_completion(params.get("nsir_id"))
                 return
         elif topic == "vim_account":
             vim_id = params["_id"]
             if command in ("create", "created"):
-                task = asyncio.ensure_future(self.vim.create(params, order_id))
+                task = self.admission.admit("vim_account", "vim_create", vim_id, self.vim.create(params, order_id))
                 self.lcm_tasks.register("vim_account", vim_id, order_id, "vim_create", task)
                 return
             elif command == "delete" or command == "deleted":
                 self.lcm_tasks.cancel(topic, vim_id)
-                task = asyncio.ensure_future(self.vim.delete(params, order_id))
+                task = self.admission.admit("vim_account", "vim_delete", vim_id, self.vim.delete(params, order_id))
                 self.lcm_tasks.register("vim_account", vim_id, order_id, "vim_delete", task)
                 return
             elif command == "show":
@@ -434,7 +507,7 @@ class Lcm:
                 sys.stdout.flush()
                 return
             elif command in ("edit", "edited"):
-                task = asyncio.ensure_future(self.vim.edit(params, order_id))
+                task = self.admission.admit("vim_account", "vim_edit", vim_id, self.vim.edit(params, order_id))
                 self.lcm_tasks.register("vim_account", vim_id, order_id, "vim_edit", task)
                 return
             elif command == "deleted":
@@ -442,12 +515,12 @@ class Lcm:
         elif topic == "wim_account":
             wim_id = params["_id"]
             if command in ("create", "created"):
-                task = asyncio.ensure_future(self.wim.create(params, order_id))
+                task = self.admission.admit("wim_account", "wim_create", wim_id, self.wim.create(params, order_id))
                 self.lcm_tasks.register("wim_account", wim_id, order_id, "wim_create", task)
                 return
             elif command == "delete" or command == "deleted":
                 self.lcm_tasks.cancel(topic, wim_id)
-                task = asyncio.ensure_future(self.wim.delete(params, order_id))
+                task = self.admission.admit("wim_account", "wim_delete", wim_id, self.wim.delete(params, order_id))
                 self.lcm_tasks.register("wim_account", wim_id, order_id, "wim_delete", task)
                 return
             elif command == "show":
@@ -455,7 +528,7 @@ class Lcm:
                 sys.stdout.flush()
                 return
             elif command in ("edit", "edited"):
-                task = asyncio.ensure_future(self.wim.edit(params, order_id))
+                task = self.admission.admit("wim_account", "wim_edit", wim_id, self.wim.edit(params, order_id))
                 self.lcm_tasks.register("wim_account", wim_id, order_id, "wim_edit", task)
                 return
             elif command == "deleted":
@@ -463,22 +536,30 @@ class Lcm:
         elif topic == "sdn":
             _sdn_id = params["_id"]
             if command in ("create", "created"):
-                task = asyncio.ensure_future(self.sdn.create(params, order_id))
+                task = self.admission.admit("sdn", "sdn_create", _sdn_id, self.sdn.create(params, order_id))
                 self.lcm_tasks.register("sdn", _sdn_id, order_id, "sdn_create", task)
                 return
             elif command == "delete" or command == "deleted":
                 self.lcm_tasks.cancel(topic, _sdn_id)
-                task = asyncio.ensure_future(self.sdn.delete(params, order_id))
+                task = self.admission.admit("sdn", "sdn_delete", _sdn_id, self.sdn.delete(params, order_id))
                 self.lcm_tasks.register("sdn", _sdn_id, order_id, "sdn_delete", task)
                 return
             elif command in ("edit", "edited"):
-                task = asyncio.ensure_future(self.sdn.edit(params, order_id))
+                task = self.admission.admit("sdn", "sdn_edit", _sdn_id, self.sdn.edit(params, order_id))
                 self.lcm_tasks.register("sdn", _sdn_id, order_id, "sdn_edit", task)
                 return
             elif command == "deleted":
                 return  # TODO cleaning of task just in case should be done
         self.logger.critical("unknown topic {} and command '{}'".format(topic, command))
 
+    async def kafka_read_aiocallback(self, topic, command, params):
+        """
+        Same as kafka_read_callback, but it does not return while the admission pending queue is full. This pauses the
+        kafka consumption, leaving the messages to other LCM workers of the same group
+        """
+        self.kafka_read_callback(topic, command, params)
+        await self.admission.wait_pending_room()
+
     async def kafka_read(self):
         self.logger.debug("Task kafka_read Enter with worker_id={}".format(self.worker_id))
         # future = asyncio.Future()
@@ -487,9 +568,9 @@ class Lcm:
         while self.consecutive_errors < 10:
             try:
                 topics = ("ns", "vim_account", "wim_account", "sdn", "nsi", "k8scluster", "k8srepo", "pla")
-                topics_admin = ("admin", )
+                topics_admin = ("admin", "vnfd", "nsd")
                 await asyncio.gather(
-                    self.msg.aioread(topics, self.loop, self.kafka_read_callback, from_beginning=True),
+                    self.msg.aioread(topics, self.loop, aiocallback=self.kafka_read_aiocallback, from_beginning=True),
                     self.msg_admin.aioread(topics_admin, self.loop, self.kafka_read_callback, group_id=False)
                 )
 
@@ -519,10 +600,22 @@ class Lcm:
         if self.prometheus:
             self.loop.run_until_complete(self.prometheus.start())
 
+        self.loop.run_until_complete(self.metrics.start())
         self.loop.run_until_complete(asyncio.gather(
             self.kafka_read(),
             self.kafka_ping()
         ))
+        self.loop.run_until_complete(self.metrics.stop())
+        # close the persistent http sessions with RO and write the pending buffered status
+        for lcm_module in (self.ns, self.netslice, self.vim, self.wim, self.sdn):
+            self.loop.run_until_complete(lcm_module.RO.close())
+            try:
+                lcm_module.flush_db_2()
+            except Exception as e:
+                self.logger.error("Writing buffered database updates: {}".format(e))
+        # close the grpc channels to the helm execution environments
+        self.ns.conn_helm_ee.close()
+        DbAsync.configure(0)
         # TODO
         # self.logger.debug("Terminating cancelling creation tasks")
         # self.lcm_tasks.cancel("ALL", "create")
@@ -553,7 +646,8 @@ class Lcm:
             with open(config_file) as f:
                 conf = yaml.load(f, Loader=yaml.Loader)
             # Ensure all sections are not empty
-            for k in ("global", "timeout", "RO", "VCA", "database", "storage", "message"):
+            for k in ("global", "timeout", "RO", "VCA", "database", "storage", "message", "admission",
+                      "metrics", "polling"):
                 if not conf.get(k):
                     conf[k] = {}
 
@@ -568,8 +662,13 @@ class Lcm:
                     # put in capital letter
                     subject = subject.upper()
                 try:
-                    if item == "port" or subject == "timeout":
+                    if item in ("port", "max_pending", "async_workers") or subject == "timeout":
                         conf[subject][item] = int(v)
+                    elif subject == "polling" and item in PollBackoff.defaults:
+                        conf[subject][item] = float(v)
+                    elif subject == "polling" and item == "vim_type":
+                        # overrides per VIM type, in yaml/json format
+                        conf[subject][item] = yaml.safe_load(v)
                     else:
                         conf[subject][item] = v
                 except Exception as e:
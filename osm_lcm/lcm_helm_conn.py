@@ -20,8 +20,10 @@ import yaml
 import asyncio
 import socket
 import uuid
+from time import time
 
 from grpclib.client import Channel
+from grpclib.exceptions import StreamTerminatedError
 
 from osm_lcm.frontend_pb2 import PrimitiveRequest
 from osm_lcm.frontend_pb2 import SshKeyRequest, SshKeyReply
@@ -31,29 +33,119 @@ from n2vc.n2vc_conn import N2VCConnector
 from n2vc.k8s_helm_conn import K8sHelmConnector
 from n2vc.exceptions import N2VCBadArgumentsException, N2VCException, N2VCExecutionException
 
-from osm_lcm.lcm_utils import deep_get
+from osm_lcm.lcm_utils import deep_get, RetryPolicy
 
 
-def retryer(max_wait_time=60, delay_time=10):
-    def wrapper(func):
-        retry_exceptions = (
-            ConnectionRefusedError
-        )
+class EEChannelPool:
+    """
+    grpc channels to the helm execution environments, one per ee and address, shared by all the requests to the ee.
+    grpclib channels connect on first request and reconnect by themselves when the connection has been closed. A
+    channel is discarded when a request fails at connection level, so that next requests use a new connection, and
+    it is closed when idle for more than idle_timeout seconds or when the ee is deleted or redeployed at other address
+    """
 
-        @functools.wraps(func)
-        async def wrapped(*args, **kwargs):
-            wait_time = max_wait_time
-            while wait_time > 0:
-                try:
-                    return await func(*args, **kwargs)
-                except retry_exceptions:
-                    wait_time = wait_time - delay_time
-                    await asyncio.sleep(delay_time)
-                    continue
-            else:
-                return ConnectionRefusedError
-        return wrapped
-    return wrapper
+    def __init__(self, port, idle_timeout=300, log=None, loop=None):
+        """
+        :param port: grpc port of the execution environments
+        :param idle_timeout: seconds without requests before closing a channel
+        :param log: logger to use
+        :param loop: asyncio event loop, used to close the idle channels. If None, they are closed at next acquire
+        """
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self.log = log
+        self.loop = loop
+        self.channels = {}  # (ee_id, ip_addr): {"key": , "channel": Channel, "in_use": requests, "last_used": time}
+        self._idle_timer = None  # timer handle to close the idle channels
+
+    @staticmethod
+    def _close(entry):
+        entry["discarded"] = True
+        if not entry["in_use"]:
+            entry["channel"].close()
+
+    def _discard(self, key):
+        self._close(self.channels.pop(key))
+
+    def _close_idle(self):
+        """
+        Closes the channels idle for more than idle_timeout, and schedules the next check while any channel is idle
+        """
+        self._idle_timer = None
+        now = time()
+        next_timeout = None
+        for key, entry in list(self.channels.items()):
+            if entry["in_use"]:
+                continue
+            if now - entry["last_used"] >= self.idle_timeout:
+                self._discard(key)
+            elif next_timeout is None or entry["last_used"] + self.idle_timeout < next_timeout:
+                next_timeout = entry["last_used"] + self.idle_timeout
+        if next_timeout is not None and self.loop:
+            self._idle_timer = self.loop.call_later(next_timeout - now, self._close_idle)
+
+    def acquire(self, ee_id, ip_addr):
+        """
+        Obtains the channel to an ee, creating it if needed. It must be returned with release
+        :param ee_id: helm id of the execution environment
+        :param ip_addr: ip address of the execution environment
+        :return: pool entry, with the grpclib Channel at 'channel' key
+        """
+        now = time()
+        if not self.loop:
+            for key, entry in list(self.channels.items()):
+                if not entry["in_use"] and now - entry["last_used"] > self.idle_timeout:
+                    self._discard(key)
+        key = (ee_id, ip_addr)
+        entry = self.channels.get(key)
+        if not entry:
+            # the ee can be redeployed with a different address
+            for old_key in [k for k in self.channels if k[0] == ee_id]:
+                self._discard(old_key)
+            if self.log:
+                self.log.debug("Opening channel to ee {} at {}:{}".format(ee_id, ip_addr, self.port))
+            entry = self.channels[key] = {"key": key, "channel": Channel(ip_addr, self.port), "in_use": 0,
+                                          "discarded": False}
+        entry["in_use"] += 1
+        entry["last_used"] = now
+        return entry
+
+    def release(self, entry, failed=False):
+        """
+        Returns a channel obtained with acquire
+        :param entry: pool entry returned by acquire
+        :param failed: True if the request failed at connection level, to discard the channel
+        :return: None
+        """
+        entry["in_use"] -= 1
+        entry["last_used"] = time()
+        if failed and self.channels.get(entry["key"]) is entry:
+            self.channels.pop(entry["key"])
+            entry["discarded"] = True
+        if entry["discarded"] and not entry["in_use"]:
+            entry["channel"].close()
+        elif not entry["in_use"] and self.loop and not self._idle_timer:
+            self._idle_timer = self.loop.call_later(self.idle_timeout, self._close_idle)
+
+    def discard(self, ee_id):
+        """
+        Closes the channels to an ee, e.g. because it has been deleted. Channels in use are closed once released
+        :param ee_id: helm id of the execution environment
+        :return: None
+        """
+        for key in [k for k in self.channels if k[0] == ee_id]:
+            self._discard(key)
+
+    def close(self):
+        """
+        Closes all the channels, e.g. at LCM shutdown. Channels in use are closed once released
+        :return: None
+        """
+        if self._idle_timer:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+        for key in list(self.channels):
+            self._discard(key)
 
 
 class LCMHelmConn(N2VCConnector):
@@ -61,12 +153,15 @@ class LCMHelmConn(N2VCConnector):
     _KUBECTL_OSM_CLUSTER_NAME = "_system-osm-k8s"
     _EE_SERVICE_PORT = 50050
 
-    # Time beetween retries
+    # Time beetween retries, growing from initial to max
+    _EE_RETRY_INITIAL_DELAY = 0.5
     _EE_RETRY_DELAY = 10
     # Initial max retry time
     _MAX_INITIAL_RETRY_TIME = 300
     # Other retry time
     _MAX_RETRY_TIME = 30
+    # Timeout of the readiness probe, a tcp connection to the ee grpc port
+    _EE_READINESS_TIMEOUT = 2
 
     def __init__(self,
                  db: object,
@@ -76,9 +171,11 @@ class LCMHelmConn(N2VCConnector):
                  url: str = None,
                  username: str = None,
                  vca_config: dict = None,
-                 on_update_db=None, ):
+                 on_update_db=None,
+                 metrics=None, ):
         """
         Initialize EE helm connector.
+        :param metrics: LcmMetrics where the ee address resolution latency is reported. None for not reporting
         """
 
         # parent class constructor
@@ -103,6 +200,24 @@ class LCMHelmConn(N2VCConnector):
         self._max_retry_time = self._MAX_RETRY_TIME
         self._initial_retry_time = self._MAX_INITIAL_RETRY_TIME
 
+        # retries while the ee is not ready. Backoff parameters can be changed with vca_config 'helm_ee_retry'
+        retry_backoff = {"initial": self._EE_RETRY_INITIAL_DELAY, "max": self._retry_delay, "factor": 2, "jitter": 0.2}
+        if isinstance(self.vca_config.get("helm_ee_retry"), dict):
+            retry_backoff.update(self.vca_config["helm_ee_retry"])
+        self._initial_retry_policy = RetryPolicy(retry_backoff, deadline=self._initial_retry_time,
+                                                 retry_exceptions=ConnectionRefusedError, loop=self.loop)
+        self._retry_policy = RetryPolicy(retry_backoff, deadline=self._max_retry_time,
+                                         retry_exceptions=ConnectionRefusedError, loop=self.loop)
+
+        # grpc channels to the execution environments, reused by all the primitives and ssh key requests
+        self._channel_pool = EEChannelPool(self._ee_service_port,
+                                           float(self.vca_config.get("helm_ee_channel_idle_timeout", 300)),
+                                           log=self.log, loop=self.loop)
+        # ee addresses resolved by dns
+        self._ee_addresses = {}  # ee_id: (ip_addr, resolution time)
+        self._ee_address_ttl = float(self.vca_config.get("helm_ee_address_ttl", 60))
+        self._metrics = metrics
+
         # initialize helm connector
         self._k8sclusterhelm = K8sHelmConnector(
             kubectl_command=self.vca_config.get("kubectlpath"),
@@ -257,11 +372,10 @@ class LCMHelmConn(N2VCConnector):
         try:
             # Obtain ip_addr for the ee service, it is resolved by dns from the ee name by kubernetes
             namespace, helm_id = self._get_ee_id_parts(ee_id)
-            ip_addr = socket.gethostbyname(helm_id)
 
             # Obtain ssh_key from the ee, this method will implement retries to allow the ee
             # install libraries and start successfully
-            ssh_key = await self._get_ssh_key(ip_addr)
+            ssh_key = await self._get_ssh_key(helm_id)
             return ssh_key
         except Exception as e:
             self.log.error("Error obtaining ee ssh_key: {}".format(e), exc_info=True)
@@ -307,7 +421,7 @@ class LCMHelmConn(N2VCConnector):
 
         try:
             namespace, helm_id = self._get_ee_id_parts(ee_id)
-            ip_addr = socket.gethostbyname(helm_id)
+            await self._get_ee_address(helm_id)
         except Exception as e:
             self.log.error("Error getting ee ip ee: {}".format(e))
             raise N2VCException("Error getting ee ip ee: {}".format(e))
@@ -315,7 +429,7 @@ class LCMHelmConn(N2VCConnector):
         if primitive_name == "config":
             try:
                 # Execute config primitive, higher timeout to check the case ee is starting
-                status, detailed_message = await self._execute_config_primitive(ip_addr, params_dict, db_dict=db_dict)
+                status, detailed_message = await self._execute_config_primitive(helm_id, params_dict, db_dict=db_dict)
                 self.log.debug("Executed config primitive ee_id_ {}, status: {}, message: {}".format(
                     ee_id, status, detailed_message))
                 if status != "OK":
@@ -339,7 +453,7 @@ class LCMHelmConn(N2VCConnector):
         else:
             try:
                 # Execute primitive
-                status, detailed_message = await self._execute_primitive(ip_addr, primitive_name,
+                status, detailed_message = await self._execute_primitive(helm_id, primitive_name,
                                                                          params_dict, db_dict=db_dict)
                 self.log.debug("Executed primitive {} ee_id_ {}, status: {}, message: {}".format(
                     primitive_name, ee_id, status, detailed_message))
@@ -366,6 +480,13 @@ class LCMHelmConn(N2VCConnector):
                 )
             return detailed_message
 
+    def close(self):
+        """
+        Closes the grpc channels to the execution environments, e.g. at LCM shutdown
+        :return: None
+        """
+        self._channel_pool.close()
+
     async def deregister_execution_environments(self):
         # nothing to be done
         pass
@@ -399,6 +520,8 @@ class LCMHelmConn(N2VCConnector):
             namespace, helm_id = self._get_ee_id_parts(ee_id)
 
             # Uninstall chart
+            self._channel_pool.discard(helm_id)
+            self._ee_addresses.pop(helm_id, None)
             await self._k8sclusterhelm.uninstall(system_cluster_uuid, helm_id)
             self.log.info("ee_id: {} deleted".format(ee_id))
         except N2VCException:
@@ -423,30 +546,60 @@ class LCMHelmConn(N2VCConnector):
     ) -> str:
         pass
 
-    @retryer(max_wait_time=_MAX_INITIAL_RETRY_TIME, delay_time=_EE_RETRY_DELAY)
-    async def _get_ssh_key(self, ip_addr):
-        channel = Channel(ip_addr, self._ee_service_port)
+    async def _is_ee_ready(self, ee_id):
+        """
+        Readiness probe of an ee, checking that its grpc port accepts connections
+        :param ee_id: helm id of the execution environment
+        :return: True if ready
+        """
         try:
-            stub = FrontendExecutorStub(channel)
+            ip_addr = await self._get_ee_address(ee_id)
+            _, writer = await asyncio.wait_for(asyncio.open_connection(ip_addr, self._ee_service_port),
+                                               timeout=self._EE_READINESS_TIMEOUT)
+            writer.close()
+            return True
+        except (OSError, asyncio.TimeoutError):
+            self._ee_addresses.pop(ee_id, None)
+            return False
+
+    async def _get_ssh_key(self, ee_id):
+        return await self._initial_retry_policy.run(functools.partial(self._get_ssh_key_internal, ee_id),
+                                                    readiness=functools.partial(self._is_ee_ready, ee_id))
+
+    async def _get_ssh_key_internal(self, ee_id):
+        ip_addr = await self._get_ee_address(ee_id)
+        pool_entry = self._channel_pool.acquire(ee_id, ip_addr)
+        failed = False
+        try:
+            stub = FrontendExecutorStub(pool_entry["channel"])
             self.log.debug("get ssh key, ip_addr: {}".format(ip_addr))
             reply: SshKeyReply = await stub.GetSshKey(SshKeyRequest())
             return reply.message
+        except (OSError, StreamTerminatedError):
+            failed = True
+            # resolve the address again on next try, the ee may have been redeployed
+            self._ee_addresses.pop(ee_id, None)
+            raise
         finally:
-            channel.close()
+            self._channel_pool.release(pool_entry, failed)
 
-    @retryer(max_wait_time=_MAX_INITIAL_RETRY_TIME, delay_time=_EE_RETRY_DELAY)
-    async def _execute_config_primitive(self, ip_addr, params, db_dict=None):
-        return await self._execute_primitive_internal(ip_addr, "config", params, db_dict=db_dict)
+    async def _execute_config_primitive(self, ee_id, params, db_dict=None):
+        return await self._initial_retry_policy.run(
+            functools.partial(self._execute_primitive_internal, ee_id, "config", params, db_dict=db_dict),
+            readiness=functools.partial(self._is_ee_ready, ee_id))
 
-    @retryer(max_wait_time=_MAX_RETRY_TIME, delay_time=_EE_RETRY_DELAY)
-    async def _execute_primitive(self, ip_addr, primitive_name, params, db_dict=None):
-        return await  self._execute_primitive_internal(ip_addr, primitive_name, params, db_dict=db_dict)
+    async def _execute_primitive(self, ee_id, primitive_name, params, db_dict=None):
+        return await self._retry_policy.run(
+            functools.partial(self._execute_primitive_internal, ee_id, primitive_name, params, db_dict=db_dict),
+            readiness=functools.partial(self._is_ee_ready, ee_id))
 
-    async def _execute_primitive_internal(self, ip_addr, primitive_name, params, db_dict=None):
+    async def _execute_primitive_internal(self, ee_id, primitive_name, params, db_dict=None):
 
-        channel = Channel(ip_addr, self._ee_service_port)
+        ip_addr = await self._get_ee_address(ee_id)
+        pool_entry = self._channel_pool.acquire(ee_id, ip_addr)
+        failed = False
         try:
-            stub = FrontendExecutorStub(channel)
+            stub = FrontendExecutorStub(pool_entry["channel"])
             async with stub.RunPrimitive.open() as stream:
                 primitive_id = str(uuid.uuid1())
                 result = None
@@ -464,8 +617,29 @@ class LCMHelmConn(N2VCConnector):
                     return reply.status, reply.detailed_message
                 else:
                     return "ERROR", "No result received"
+        except (OSError, StreamTerminatedError):
+            failed = True
+            self._ee_addresses.pop(ee_id, None)
+            raise
         finally:
-            channel.close()
+            self._channel_pool.release(pool_entry, failed)
+
+    async def _get_ee_address(self, ee_id):
+        """
+        Resolves by dns the address of an ee, at a thread to not block the event loop. Addresses are cached for
+        _ee_address_ttl seconds, and removed when a connection to the ee fails or when the ee is deleted
+        :param ee_id: helm id of the execution environment, that is the name of its kubernetes service
+        :return: ip address. Raise OSError if it cannot be resolved
+        """
+        cached = self._ee_addresses.get(ee_id)
+        now = time()
+        if cached and now - cached[1] < self._ee_address_ttl:
+            return cached[0]
+        ip_addr = await self.loop.run_in_executor(None, socket.gethostbyname, ee_id)
+        if self._metrics:
+            self._metrics.observe("lcm_ee_address_resolution_seconds", None, time() - now)
+        self._ee_addresses[ee_id] = (ip_addr, now)
+        return ip_addr
 
     def _write_op_detailed_status(self, db_dict, status, detailed_message):
 
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+
+##
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+
+"""
+Internal metrics of the LCM worker, exposed at an http endpoint with the prometheus text format.
+It is independent of prometheus.py, that manages the prometheus scrape configuration of the deployed NS
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+from time import time
+from aiohttp import web
+from osm_lcm.lcm_utils import deep_get
+
+default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+
+class Histogram:
+
+    def __init__(self, buckets=default_buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bucket in enumerate(self.buckets):
+            if value <= bucket:
+                self.counts[index] += 1
+                break
+
+
+class _InstrumentedProxy:
+    """
+    Wraps an object (database, RO client, N2VC connector), timing the calls to its public methods. The timing wrappers
+    are built once per method
+    """
+
+    def __init__(self, target, metrics, component):
+        self.__dict__["_target"] = target
+        self.__dict__["_metrics"] = metrics
+        self.__dict__["_component"] = component
+        self.__dict__["_wrappers"] = {}  # name: (wrapped function, timing wrapper)
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+        # bound methods are new objects at every access, compare their function
+        func = getattr(attr, "__func__", attr)
+        cached = self._wrappers.get(name)
+        if cached and cached[0] is func:
+            return cached[1]
+        labels = {"component": self._component, "method": name}
+        metrics = self._metrics
+        if asyncio.iscoroutinefunction(attr):
+            @wraps(attr)
+            async def timed_call(*args, **kwargs):
+                start = time()
+                try:
+                    return await attr(*args, **kwargs)
+                finally:
+                    metrics.observe("lcm_call_duration_seconds", labels, time() - start)
+        else:
+            @wraps(attr)
+            def timed_call(*args, **kwargs):
+                start = time()
+                try:
+                    return attr(*args, **kwargs)
+                finally:
+                    metrics.observe("lcm_call_duration_seconds", labels, time() - start)
+        self._wrappers[name] = (func, timed_call)
+        return timed_call
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, value)
+
+
+class LcmMetrics:
+    """
+    Collects the LCM internal metrics and serves them at http://<host>:<port>/metrics
+    """
+
+    help = {
+        "lcm_tasks_in_flight": "Running tasks registered at TaskRegistry, per topic",
+        "lcm_admission_running": "Operations admitted and running, per topic and per command",
+        "lcm_admission_pending": "Operations queued by admission control",
+        "lcm_admission_wait_seconds": "Time queued by admission control, per topic and command",
+        "lcm_operation_duration_seconds": "Duration of the operations, per topic and command",
+        "lcm_operation_stage_duration_seconds": "Duration of each operation stage, per command and stage",
+        "lcm_call_duration_seconds": "Latency of the calls to database, RO and N2VC, per component and method",
+        "lcm_ee_address_resolution_seconds": "Latency of the dns resolution of the helm execution environments",
+        "lcm_kafka_consume_lag_seconds": "Time since a message is created until it is consumed, per topic",
+        "lcm_event_loop_lag_seconds": "Delay of the asyncio event loop when running a scheduled callback",
+        "lcm_event_loop_lag_max_seconds": "Maximum event loop delay since last scrape",
+    }
+    max_operations = 10000  # max operations tracked for stage durations
+    operation_commands = {"ns": ("instantiate", "terminate", "action", "scale"), "nsi": ("instantiate", "terminate")}
+
+    def __init__(self, config, loop, logger=None):
+        """
+        :param config: 'metrics' section of configuration: host (default 127.0.0.1), port (0 or missing disables the
+            http server and the event loop lag probe) and loop_lag_interval (seconds between event loop lag probes)
+        :param loop: asyncio event loop
+        :param logger: logger to use
+        """
+        self.loop = loop
+        self.logger = logger or logging.getLogger("lcm.metrics")
+        self.host = config.get("host") or "127.0.0.1"
+        self.port = int(config.get("port") or 0)
+        self.loop_lag_interval = float(config.get("loop_lag_interval", 1))
+        self.histograms = {}  # name: {labels tuple: Histogram}
+        self.gauges = {}  # name: {labels tuple: value}
+        self.collectors = []  # functions called before rendering, to refresh gauges
+        self.operations = OrderedDict()  # op_id: {"command": , "stage": , "start": }
+        self.loop_lag_max = 0
+        self._lock = Lock()  # database calls are timed at a thread pool
+        self._handler = None
+        self._server = None
+        self._loop_lag_task = None
+
+    @staticmethod
+    def _labels_key(labels):
+        return tuple(sorted((labels or {}).items()))
+
+    @staticmethod
+    def _escape_label(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    def observe(self, name, labels, value):
+        """
+        Adds a value to a histogram
+        :param name: metric name
+        :param labels: dictionary of labels
+        :param value: observed value, normally seconds
+        :return: None
+        """
+        key = self._labels_key(labels)
+        with self._lock:
+            histogram = self.histograms.setdefault(name, {}).get(key)
+            if not histogram:
+                histogram = self.histograms[name][key] = Histogram()
+            histogram.observe(value)
+
+    def set_gauge(self, name, labels, value):
+        with self._lock:
+            self.gauges.setdefault(name, {})[self._labels_key(labels)] = value
+
+    def instrument(self, target, component):
+        """
+        Returns a wrapper of target that times the calls to its public methods at lcm_call_duration_seconds
+        :param target: object to wrap, e.g. database or RO client
+        :param component: value of the 'component' label, e.g. "db", "ro", "n2vc"
+        :return: the wrapper
+        """
+        return _InstrumentedProxy(target, self, component)
+
+    def message_received(self, topic, command, params):
+        """
+        Computes the kafka consume lag of a message and remembers the command of the ns/nsi operations
+        :param topic: kafka topic
+        :param command: kafka key
+        :param params: message content
+        :return: None
+        """
+        if not isinstance(params, dict):
+            return
+        if topic == "admin":
+            created = params.get("time")
+        else:
+            created = params.get("startTime") or deep_get(params, ("_admin", "modified"))
+        if isinstance(created, (int, float)):
+            self.observe("lcm_kafka_consume_lag_seconds", {"topic": topic}, max(0, time() - created))
+        if command in self.operation_commands.get(topic, ()) and params.get("_id"):
+            self.operations[params["_id"]] = {"command": "{}_{}".format(topic, command), "stage": None, "start": None}
+            while len(self.operations) > self.max_operations:
+                self.operations.popitem(last=False)
+
+    def operation_stage(self, op_id, stage, finished=False):
+        """
+        Records the duration of the previous stage of an operation when the stage changes or the operation finishes
+        :param op_id: operation _id
+        :param stage: current stage name
+        :param finished: True if operation is finished
+        :return: None
+        """
+        operation = self.operations.get(op_id)
+        if not operation:
+            return
+        now = time()
+        if operation["stage"] and (finished or stage != operation["stage"]):
+            self.observe("lcm_operation_stage_duration_seconds",
+                         {"command": operation["command"], "stage": operation["stage"]}, now - operation["start"])
+        if finished:
+            del self.operations[op_id]
+        elif stage != operation["stage"]:
+            operation["stage"] = stage
+            operation["start"] = now
+
+    def forget_operations(self, running_op_ids):
+        """
+        Stops tracking the operations that are not running anymore without having written a final state, e.g. when
+        executed by other worker, or failed before starting
+        :param running_op_ids: set of operation _id that are running
+        :return: None
+        """
+        for op_id in list(self.operations):
+            if op_id not in running_op_ids:
+                self.operation_stage(op_id, None, finished=True)
+
+    async def _loop_lag_probe(self):
+        while True:
+            start = self.loop.time()
+            await asyncio.sleep(self.loop_lag_interval, loop=self.loop)
+            lag = max(0, self.loop.time() - start - self.loop_lag_interval)
+            self.observe("lcm_event_loop_lag_seconds", None, lag)
+            self.loop_lag_max = max(self.loop_lag_max, lag)
+
+    def render(self):
+        """
+        Generates the metrics in prometheus text format
+        :return: text
+        """
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as e:
+                self.logger.error("Error collecting metrics: {}".format(e))
+        self.set_gauge("lcm_event_loop_lag_max_seconds", None, self.loop_lag_max)
+        self.loop_lag_max = 0
+
+        def labels_text(labels_key, extra=None):
+            labels = list(labels_key) + (extra or [])
+            if not labels:
+                return ""
+            return "{" + ",".join('{}="{}"'.format(k, self._escape_label(v)) for k, v in labels) + "}"
+
+        lines = []
+        with self._lock:
+            for name, values in sorted(self.gauges.items()):
+                lines.append("# HELP {} {}".format(name, self.help.get(name, name)))
+                lines.append("# TYPE {} gauge".format(name))
+                for labels_key, value in values.items():
+                    lines.append("{}{} {}".format(name, labels_text(labels_key), value))
+            for name, values in sorted(self.histograms.items()):
+                lines.append("# HELP {} {}".format(name, self.help.get(name, name)))
+                lines.append("# TYPE {} histogram".format(name))
+                for labels_key, histogram in values.items():
+                    cumulative = 0
+                    for bucket, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append("{}_bucket{} {}".format(name, labels_text(labels_key, [("le", bucket)]),
+                                                             cumulative))
+                    lines.append("{}_bucket{} {}".format(name, labels_text(labels_key, [("le", "+Inf")]),
+                                                         histogram.count))
+                    lines.append("{}_sum{} {}".format(name, labels_text(labels_key), histogram.sum))
+                    lines.append("{}_count{} {}".format(name, labels_text(labels_key), histogram.count))
+        return "\n".join(lines) + "\n"
+
+    async def _handle_metrics(self, request):
+        return web.Response(text=self.render(), content_type="text/plain")
+
+    async def start(self):
+        """
+        Starts the http server and the event loop lag probe, if a port is configured
+        :return: None
+        """
+        if not self.port:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_metrics)
+        handler = app.make_handler(loop=self.loop)
+        try:
+            self._server = await self.loop.create_server(handler, self.host, self.port)
+            self._handler = handler
+            self.logger.info("Serving metrics at http://{}:{}/metrics".format(self.host, self.port))
+        except OSError as e:
+            self.logger.error("Cannot serve metrics at {}:{}: {}".format(self.host, self.port, e))
+            return
+        self._loop_lag_task = asyncio.ensure_future(self._loop_lag_probe(), loop=self.loop)
+
+    async def stop(self):
+        if self._loop_lag_task:
+            self._loop_lag_task.cancel()
+            self._loop_lag_task = None
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            await self._handler.shutdown(1.0)
+            self._server = None
+            self._handler = None
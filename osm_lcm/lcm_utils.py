@@ -17,8 +17,18 @@
 ##
 
 import asyncio
+import hashlib
+import inspect
+import os
+import random
+import shutil
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from copy import deepcopy
+from functools import partial
 from time import time
+from jinja2 import Environment, meta
 # from osm_common.dbbase import DbException
 
 __author__ = "Alfonso Tierno"
@@ -93,28 +103,188 @@ def populate_dict(target_dict, key_list, value):
     target_dict[key_list[-1]] = value
 
 
+def get_update_delta(old, new, key):
+    """
+    Obtains the database update, with dot separated keys, that changes the content 'old' stored at 'key' into 'new'.
+    Dictionaries are compared key by key and lists of the same length item by item, so that only the changed leaves
+    are written. A removed key, a list with different length or a changed type makes the whole parent to be written
+    Example old={a: {b: 1, c: 2}}, new={a: {b: 1, c: 3}}, key=k returns {k.a.c: 3}
+    :param old: previous content
+    :param new: new content
+    :param key: dot separated key where the content is stored
+    :return: dictionary with dot separated keys and new values. Empty if there is no change
+    """
+    if old == new:
+        return {}
+    if isinstance(old, dict) and isinstance(new, dict):
+        if any(k not in new for k in old) or any(not isinstance(k, str) or "." in k or k.startswith("$") for k in new):
+            return {key: new}
+        delta = {}
+        for k, v in new.items():
+            if k not in old:
+                delta["{}.{}".format(key, k)] = v
+            else:
+                delta.update(get_update_delta(old[k], v, "{}.{}".format(key, k)))
+        return delta
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        delta = {}
+        for index, (old_item, new_item) in enumerate(zip(old, new)):
+            delta.update(get_update_delta(old_item, new_item, "{}.{}".format(key, index)))
+        return delta
+    return {key: new}
+
+
+class DbAsync:
+    """
+    Asyncio facade of a database connection. The calls are run at a process wide bounded thread pool, so that a slow
+    database does not block the event loop. Parameters, results and exceptions are the same as the wrapped database.
+    While the pool size is 0 (the class default, kept for dbmemory driver and unittests) the calls are run directly.
+    LcmBase.update_db_2 and TaskRegistry.lock_HA/unlock_HA keep using the synchronous connection: the former is called
+    from synchronous code and its writes are ordered with the write buffer; the latter run before the operation
+    exception handling, where a cancellation must not be received
+    """
+    max_workers = 0
+    _executor = None
+
+    def __init__(self, db, before_write=None):
+        """
+        :param db: database connection
+        :param before_write: function called with the table and filter of every set, del or replace before running it.
+            Used to write first the buffered updates of the same records
+        """
+        self.db = db
+        self.before_write = before_write
+
+    @classmethod
+    def configure(cls, max_workers):
+        """
+        Set the size of the thread pool shared by all instances. Calls in progress are not affected
+        :param max_workers: max number of threads. 0 to run the database calls directly at the event loop
+        :return: None
+        """
+        cls.max_workers = int(max_workers or 0)
+        if cls._executor:
+            cls._executor.shutdown(wait=False)
+            cls._executor = None
+
+    async def _run(self, method_name, *args, **kwargs):
+        # method is got at call time, as it can be replaced, e.g. by mocks
+        method = getattr(self.db, method_name)
+        if not self.max_workers:
+            return method(*args, **kwargs)
+        if DbAsync._executor is None:
+            DbAsync._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return await asyncio.get_event_loop().run_in_executor(DbAsync._executor, partial(method, *args, **kwargs))
+
+    def _notify_write(self, method_name, args, kwargs):
+        if not self.before_write:
+            return
+        table = args[0] if args else kwargs.get("table")
+        if method_name == "replace":
+            q_filter = {"_id": args[1] if len(args) > 1 else kwargs.get("_id")}
+        else:
+            q_filter = args[1] if len(args) > 1 else kwargs.get("q_filter")
+        self.before_write(table, q_filter)
+
+    async def get_one(self, *args, **kwargs):
+        return await self._run("get_one", *args, **kwargs)
+
+    async def get_list(self, *args, **kwargs):
+        return await self._run("get_list", *args, **kwargs)
+
+    async def create(self, *args, **kwargs):
+        return await self._run("create", *args, **kwargs)
+
+    async def create_list(self, *args, **kwargs):
+        return await self._run("create_list", *args, **kwargs)
+
+    async def set_one(self, *args, **kwargs):
+        self._notify_write("set_one", args, kwargs)
+        return await self._run("set_one", *args, **kwargs)
+
+    async def set_list(self, *args, **kwargs):
+        self._notify_write("set_list", args, kwargs)
+        return await self._run("set_list", *args, **kwargs)
+
+    async def del_one(self, *args, **kwargs):
+        self._notify_write("del_one", args, kwargs)
+        return await self._run("del_one", *args, **kwargs)
+
+    async def del_list(self, *args, **kwargs):
+        self._notify_write("del_list", args, kwargs)
+        return await self._run("del_list", *args, **kwargs)
+
+    async def replace(self, *args, **kwargs):
+        self._notify_write("replace", args, kwargs)
+        return await self._run("replace", *args, **kwargs)
+
+
 class LcmBase:
 
+    # seconds that a buffered update_db_2 is kept in memory before being written
+    write_buffer_interval = 2
+
     def __init__(self, db, msg, fs, logger):
         """
 
         :param db: database connection
         """
         self.db = db
+        self.db_async = DbAsync(db, before_write=self._flush_before_write)
         self.msg = msg
         self.fs = fs
         self.logger = logger
+        self._write_buffer = {}  # (item, _id): {"desc": merged dot separated updates, "timer": flush TimerHandle}
+
+    @staticmethod
+    def _keys_overlap(key1, key2):
+        """
+        Check if two dot separated keys point to the same content or one contains the other
+        """
+        if key1 == key2:
+            return True
+        short_key, long_key = (key1, key2) if len(key1) < len(key2) else (key2, key1)
+        return long_key.startswith(short_key + ".")
 
-    def update_db_2(self, item, _id, _desc):
+    def update_db_2(self, item, _id, _desc, buffered=False):
         """
         Updates database with _desc information. If success _desc is cleared
         :param item:
         :param _id:
         :param _desc: dictionary with the content to update. Keys are dot separated keys for
+        :param buffered: if True the update is merged in memory with other buffered updates of the same record and
+            written after write_buffer_interval seconds, or before a later non buffered update of the same record.
+            Intended for progress information (stages, detailed status) that is quickly overwritten
         :return: None. Exception is raised on error
         """
         if not _desc:
             return
+        key = (item, _id)
+        pending = self._write_buffer.get(key)
+        if pending:
+            if any(self._keys_overlap(k, pending_k) for k in _desc for pending_k in pending["desc"]
+                   if k != pending_k):
+                # e.g. a whole list replaced after a pending update of one of its elements. Keep the order
+                self.flush_db_2(item, _id)
+                pending = None
+        if buffered:
+            try:
+                loop = asyncio.get_event_loop()
+            except RuntimeError:
+                loop = None
+            if loop and loop.is_running():
+                if not pending:
+                    pending = self._write_buffer[key] = {"desc": {}, "timer": None}
+                    pending["timer"] = loop.call_later(self.write_buffer_interval, self._flush_db_2_timer, item, _id)
+                pending["desc"].update(_desc)
+                _desc.clear()
+                return
+        if pending:
+            self._write_buffer.pop(key)
+            pending["timer"].cancel()
+            pending["desc"].update(_desc)
+            _desc.clear()
+            _desc = pending["desc"]
         now = time()
         _desc["_admin.modified"] = now
         self.db.set_one(item, {"_id": _id}, _desc)
@@ -122,6 +292,400 @@ class LcmBase:
         # except DbException as e:
         #     self.logger.error("Updating {} _id={} with '{}'. Error: {}".format(item, _id, _desc, e))
 
+    def flush_db_2(self, item=None, _id=None):
+        """
+        Writes the buffered updates of update_db_2. Exception is raised on error
+        :param item: only records of this table. None for all
+        :param _id: only this record. None for all
+        :return: None
+        """
+        for key in list(self._write_buffer):
+            if (item is None or key[0] == item) and (_id is None or key[1] == _id):
+                pending = self._write_buffer.pop(key)
+                pending["timer"].cancel()
+                self.update_db_2(key[0], key[1], pending["desc"])
+
+    def _flush_before_write(self, item, q_filter):
+        """
+        Writes the buffered updates that a direct database write over the same records could overtake
+        :param item: database table
+        :param q_filter: filter of the direct write. Buffered records of the table are written unless it selects an _id
+        :return: None. Exception is raised on error
+        """
+        if not self._write_buffer:
+            return
+        _id = q_filter.get("_id") if isinstance(q_filter, dict) else None
+        self.flush_db_2(item, _id if isinstance(_id, str) else None)
+
+    def _flush_db_2_timer(self, item, _id):
+        try:
+            self.flush_db_2(item, _id)
+        except Exception as e:
+            self.logger.error("Writing buffered updates of {} _id={}. Error: {}".format(item, _id, e))
+
+    async def update_db_2_async(self, item, _id, _desc):
+        """
+        Same as update_db_2, but without blocking the event loop
+        :param item:
+        :param _id:
+        :param _desc: dictionary with the content to update. Keys are dot separated keys for
+        :return: None. Exception is raised on error
+        """
+        if not _desc:
+            return
+        now = time()
+        _desc["_admin.modified"] = now
+        await self.db_async.set_one(item, {"_id": _id}, _desc)
+        _desc.clear()
+
+
+class DescriptorCache:
+    """
+    In-process LRU cache of descriptors (nsds, vnfds) read from database, shared by the LCM modules. Entries are
+    indexed by table and _id. They are invalidated when NBI notifies a descriptor edition or deletion, and, as a safety
+    net, they are checked against database '_admin.modified' when older than ttl. The cache is bounded by the
+    approximate memory size of the stored descriptors, evicting the least recently used ones.
+    Returned descriptors are shared with the cache and other operations, and must not be modified unless a copy is
+    requested
+    """
+
+    def __init__(self, db, max_size=50000000, ttl=300, logger=None):
+        """
+        :param db: database connection
+        :param max_size: approximate max size in bytes of all stored descriptors. 0 disables the cache
+        :param ttl: seconds after which a cached descriptor is validated against database
+        :param logger: logger to use
+        """
+        self.db = db
+        self.db_async = DbAsync(db)
+        self.max_size = int(max_size)
+        self.ttl = int(ttl)
+        self.logger = logger
+        self.size = 0
+        self.entries = OrderedDict()  # (table, _id): {"descriptor": ..., "modified": ..., "size": ..., "checked": ..}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, table, _id, copy=False):
+        """
+        Obtain a descriptor, from cache if present, or from database otherwise. Raise DbException if not found
+        :param table: database table, as "vnfds" or "nsds"
+        :param _id: _id of the descriptor
+        :param copy: if True a copy is returned, that can be modified by the caller
+        :return: the descriptor. It must not be modified unless copy is True
+        """
+        if not self.max_size:
+            return await self.db_async.get_one(table, {"_id": _id})
+        key = (table, _id)
+        entry = self.entries.get(key)
+        now = time()
+        if entry and now - entry["checked"] > self.ttl:
+            descriptor = await self.db_async.get_one(table, {"_id": _id})
+            if deep_get(descriptor, ("_admin", "modified")) == entry["modified"]:
+                entry["checked"] = now
+            else:
+                self.invalidate(table, _id)
+                entry = None
+                self._store(key, descriptor, now)
+                self.misses += 1
+                return deepcopy(descriptor) if copy else descriptor
+        if entry:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return deepcopy(entry["descriptor"]) if copy else entry["descriptor"]
+        descriptor = await self.db_async.get_one(table, {"_id": _id})
+        self._store(key, descriptor, now)
+        self.misses += 1
+        return deepcopy(descriptor) if copy else descriptor
+
+    async def get_list(self, table, ids, copy=False):
+        """
+        Obtain several descriptors, reading from database with a single query the ones not present at cache or that
+        must be validated. Raise DbException if any is not found
+        :param table: database table, as "vnfds" or "nsds"
+        :param ids: iterable of descriptor _id. Repeated values are allowed
+        :param copy: if True copies are returned, that can be modified by the caller
+        :return: dictionary indexed by _id with each descriptor. They must not be modified unless copy is True
+        """
+        ids = list(OrderedDict.fromkeys(ids))
+        now = time()
+        descriptors = {}
+        to_read = []
+        for _id in ids:
+            entry = self.entries.get((table, _id)) if self.max_size else None
+            if entry and now - entry["checked"] <= self.ttl:
+                self.entries.move_to_end((table, _id))
+                self.hits += 1
+                descriptors[_id] = entry["descriptor"]
+            else:
+                to_read.append(_id)
+        if to_read:
+            for descriptor in await self.db_async.get_list(table, {"_id": to_read}):
+                _id = descriptor["_id"]
+                key = (table, _id)
+                entry = self.entries.get(key)
+                if entry and deep_get(descriptor, ("_admin", "modified")) == entry["modified"]:
+                    entry["checked"] = now
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    descriptor = entry["descriptor"]
+                elif self.max_size:
+                    self.invalidate(table, _id)
+                    self._store(key, descriptor, now)
+                    self.misses += 1
+                descriptors[_id] = descriptor
+            for _id in to_read:
+                if _id not in descriptors:
+                    # raises the not found exception
+                    descriptors[_id] = await self.get(table, _id)
+        if copy:
+            descriptors = deepcopy(descriptors)
+        return descriptors
+
+    def _store(self, key, descriptor, now):
+        size = len(str(descriptor))
+        if size > self.max_size:
+            return
+        self.entries[key] = {"descriptor": descriptor, "modified": deep_get(descriptor, ("_admin", "modified")),
+                             "size": size, "checked": now}
+        self.size += size
+        while self.size > self.max_size:
+            _, old_entry = self.entries.popitem(last=False)
+            self.size -= old_entry["size"]
+
+    def invalidate(self, table=None, _id=None):
+        """
+        Remove descriptors from cache
+        :param table: database table, as "vnfds" or "nsds". None for all tables
+        :param _id: _id of the descriptor. None for all descriptors of the table
+        :return: None
+        """
+        for key in list(self.entries):
+            if (table is None or key[0] == table) and (_id is None or key[1] == _id):
+                self.size -= self.entries.pop(key)["size"]
+
+
+class TemplateCache:
+    """
+    In-process LRU cache of compiled Jinja2 templates, shared by the LCM modules, for the templates that are rendered
+    many times with different variables, as cloud-init of the vdus or prometheus jobs. Entries are indexed by the
+    sha256 of the template content, or by a caller provided key (e.g. file path and package revision) that avoids
+    reading the content again. Together with the compiled template it stores its undeclared variables
+    """
+
+    def __init__(self, max_entries=1000, logger=None):
+        """
+        :param max_entries: max number of templates stored, evicting the least recently used ones. 0 disables the cache
+        :param logger: logger to use
+        """
+        self.max_entries = int(max_entries)
+        self.logger = logger
+        self.env = Environment()
+        self.entries = OrderedDict()  # key: (template, frozenset of undeclared variables)
+        self.hits = 0
+        self.misses = 0
+
+    def _compile(self, content):
+        ast = self.env.parse(content)
+        return self.env.from_string(ast), frozenset(meta.find_undeclared_variables(ast))
+
+    def _store(self, key, entry):
+        self.entries[key] = entry
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def get(self, content=None, key=None, read_content=None):
+        """
+        Obtain a compiled template, from cache if present, or compiling it otherwise. Raise jinja2 TemplateError
+        :param content: template text. Not needed if key and read_content are provided
+        :param key: optional hashable that identifies the content, e.g. (file path, package revision)
+        :param read_content: function returning the template text, called only if key is not at cache
+        :return: tuple with jinja2 Template and frozenset of the undeclared variables
+        """
+        if key is not None:
+            key = ("key", key)
+            entry = self.entries.get(key)
+            if entry:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        if content is None:
+            content = read_content()
+        if not self.max_entries:
+            self.misses += 1
+            return self._compile(content)
+        content_key = ("sha256", hashlib.sha256(content.encode()).hexdigest())
+        entry = self.entries.get(content_key)
+        if entry:
+            self.entries.move_to_end(content_key)
+            self.hits += 1
+        else:
+            entry = self._compile(content)
+            self.misses += 1
+            self._store(content_key, entry)
+        if key is not None:
+            self._store(key, entry)
+        return entry
+
+
+class PackageCache:
+    """
+    Copies the nsd/vnfd packages from the storage (e.g. fsmongo) to the local filesystem on demand, only for the
+    packages needed by an operation. A package is copied again only when its descriptor revision ('_admin.modified'
+    and storage folders) changes or the local copy is missing. When eviction is enabled the local copies are bounded by
+    max_size bytes, removing the least recently used packages that are not in use by a running operation
+    """
+
+    def __init__(self, fs, loop, max_size=0, evict=False, logger=None):
+        """
+        :param fs: filesystem storage connection
+        :param loop: asyncio event loop
+        :param max_size: max size in bytes of the local copies when evict is enabled. 0 means unlimited
+        :param evict: True when the local filesystem is only a copy of the storage, so that packages can be removed
+        :param logger: logger to use
+        """
+        self.fs = fs
+        self.loop = loop
+        self.max_size = int(max_size)
+        self.evict = evict
+        self.logger = logger
+        self.size = 0
+        self.entries = OrderedDict()  # folder: {"revision": ..., "size": bytes, "in_use": operations using it}
+        self.syncing = {}  # folder: future of an ongoing copy, shared by concurrent operations
+        self.invalidated = set()  # folders invalidated while being copied
+        self.partial_sync = self._admits_partial_sync(fs)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _admits_partial_sync(fs):
+        """
+        Check if the storage can sync only a path. Older osm_common versions sync always the whole storage
+        """
+        try:
+            parameters = inspect.signature(fs.sync).parameters.values()
+        except (TypeError, ValueError):
+            return False
+        return any(p.name == "from_path" or p.kind == p.VAR_KEYWORD for p in parameters)
+
+    @staticmethod
+    def _get_revision(descriptor):
+        storage = deep_get(descriptor, ("_admin", "storage")) or {}
+        return deep_get(descriptor, ("_admin", "modified")), storage.get("pkg-dir"), storage.get("descriptor")
+
+    def _local_path(self, folder):
+        return "{}/{}".format(str(self.fs.path).rstrip("/"), folder)
+
+    def _local_size(self, folder):
+        size = 0
+        for dir_path, _, file_names in os.walk(self._local_path(folder)):
+            for file_name in file_names:
+                try:
+                    size += os.path.getsize(os.path.join(dir_path, file_name))
+                except OSError:
+                    pass
+        return size
+
+    def _copy(self, folder):
+        if self.partial_sync:
+            self.fs.sync(from_path=folder)
+        else:
+            self.fs.sync()
+        return self._local_size(folder)
+
+    async def acquire(self, descriptors):
+        """
+        Ensures that the packages of the descriptors are present at local filesystem, and marks them as in use, so
+        that they are not evicted until release is called
+        :param descriptors: iterable of nsd/vnfd database content
+        :return: list of acquired package folders, to be provided to release
+        """
+        folders = []
+        try:
+            for descriptor in descriptors:
+                folder = deep_get(descriptor, ("_admin", "storage", "folder"))
+                if not folder or folder in folders:
+                    continue
+                await self._sync_folder(folder, self._get_revision(descriptor))
+                folders.append(folder)
+        except Exception:
+            self.release(folders)
+            raise
+        return folders
+
+    async def _sync_folder(self, folder, revision):
+        while folder in self.syncing:
+            await asyncio.shield(self.syncing[folder])
+        entry = self.entries.get(folder)
+        if entry and entry["revision"] == revision and os.path.isdir(self._local_path(folder)):
+            self.hits += 1
+            self.entries.move_to_end(folder)
+            entry["in_use"] += 1
+            return
+        self.misses += 1
+        self.syncing[folder] = self.loop.run_in_executor(None, self._copy, folder)
+        try:
+            size = await self.syncing[folder]
+        finally:
+            del self.syncing[folder]
+        if folder in self.invalidated:
+            # the copy can be outdated, it will be done again the next time
+            self.invalidated.discard(folder)
+            revision = None
+        in_use = 1
+        # entry can have been modified while copying
+        entry = self.entries.pop(folder, None)
+        if entry:
+            in_use += entry["in_use"]
+            self.size -= entry["size"]
+        self.entries[folder] = {"revision": revision, "size": size, "in_use": in_use}
+        self.size += size
+        self._evict()
+
+    def release(self, folders):
+        """
+        Marks the package folders returned by acquire as not used by the operation
+        :param folders: list of folders
+        :return: None
+        """
+        for folder in folders or ():
+            entry = self.entries.get(folder)
+            if entry and entry["in_use"]:
+                entry["in_use"] -= 1
+        self._evict()
+
+    def invalidate(self, folder):
+        """
+        Forgets a package, e.g. when it is deleted. The local copy is removed if eviction is enabled and not in use
+        :param folder: package folder, that is the descriptor _id
+        :return: None
+        """
+        if folder in self.syncing:
+            self.invalidated.add(folder)
+        entry = self.entries.get(folder)
+        if not entry:
+            return
+        if entry["in_use"] or not self.evict or folder in self.syncing:
+            entry["revision"] = None
+            return
+        self.entries.pop(folder, None)
+        self.size -= entry["size"]
+        shutil.rmtree(self._local_path(folder), ignore_errors=True)
+
+    def _evict(self):
+        if not self.evict or not self.max_size:
+            return
+        for folder in list(self.entries):
+            if self.size <= self.max_size:
+                break
+            entry = self.entries[folder]
+            if entry["in_use"] or folder in self.syncing:
+                continue
+            del self.entries[folder]
+            self.size -= entry["size"]
+            self.logger.debug("Removing local copy of package folder '{}'".format(folder))
+            shutil.rmtree(self._local_path(folder), ignore_errors=True)
+
 
 class TaskRegistry(LcmBase):
     """
@@ -172,7 +736,10 @@ class TaskRegistry(LcmBase):
         }
         self.worker_id = worker_id
         self.db = db
+        self.db_async = DbAsync(db)
         self.logger = logger
+        # futures of waitfor_related_HA waiting for a completion, indexed by instance _id. None for any instance
+        self.completion_waiters = {}
 
     def register(self, topic, _id, op_id, task_name, task):
         """
@@ -190,8 +757,65 @@ class TaskRegistry(LcmBase):
             self.task_registry[topic][_id][op_id] = {task_name: task}
         else:
             self.task_registry[topic][_id][op_id][task_name] = task
+        task.add_done_callback(lambda _: self.notify_completion(_id))
         # print("registering task", topic, _id, op_id, task_name, task)
 
+    def count_running(self):
+        """
+        Count the registered tasks not finished yet
+        :return: dictionary with the number of running tasks per topic
+        """
+        return {topic: sum(1 for ops in ids.values() for tasks in ops.values() for task in tasks.values()
+                           if not task.done())
+                for topic, ids in self.task_registry.items()}
+
+    def get_running_op_ids(self, topic):
+        """
+        Obtain the operations with registered tasks not finished yet
+        :param topic: Can be "ns", "nsi", "vim_account", "sdn"
+        :return: set of op_id
+        """
+        return {op_id for ops in self.task_registry[topic].values() for op_id, tasks in ops.items()
+                if any(not task.done() for task in tasks.values())}
+
+    def notify_completion(self, _id=None):
+        """
+        Wakes up the waitfor_related_HA calls waiting for the completion of an operation over this _id, so that they
+        check the database again without waiting for the polling interval.
+        It is called when a local task ends, and when a completion message ('instantiated', 'terminated', ...) is
+        received from kafka, that can be sent by other LCM workers
+        :param _id: _id of the related item. If None all waiters are notified
+        :return: None
+        """
+        if _id is None:
+            waiter_ids = list(self.completion_waiters)
+        else:
+            waiter_ids = (_id, None)
+        for waiter_id in waiter_ids:
+            for waiter in self.completion_waiters.pop(waiter_id, ()):
+                if not waiter.done():
+                    waiter.set_result(None)
+
+    async def _wait_completion(self, _id, timeout):
+        """
+        Waits until notify_completion is called for this _id, or timeout
+        :param _id: _id of the related item. None for any item
+        :param timeout: max time to wait in seconds
+        :return: None
+        """
+        waiter = asyncio.get_event_loop().create_future()
+        self.completion_waiters.setdefault(_id, []).append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            waiters = self.completion_waiters.get(_id)
+            if waiters and waiter in waiters:
+                waiters.remove(waiter)
+                if not waiters:
+                    del self.completion_waiters[_id]
+
     def remove(self, topic, _id, op_id, task_name=None):
         """
         When task is ended, it should be removed. It ignores missing tasks. It also removes tasks done with this _id
@@ -427,9 +1051,9 @@ class TaskRegistry(LcmBase):
         # Get instance ID
         _id = self._get_instance_id_HA(topic, op_type, op_id)
         _filter = {"_id": _id}
-        db_lcmop = self.db.get_one(db_table_name,
-                                   _filter,
-                                   fail_on_empty=False)
+        db_lcmop = await self.db_async.get_one(db_table_name,
+                                               _filter,
+                                               fail_on_empty=False)
         if not db_lcmop:
             return
 
@@ -437,17 +1061,25 @@ class TaskRegistry(LcmBase):
         _filter = self._get_waitfor_filter_HA(db_lcmop, topic, op_type, op_id)
 
         # For HA, get list of tasks from DB instead of from dictionary (in-memory) variable.
+        # Database is checked again when a related task finishes, either locally or at other worker (notified by
+        # kafka). The polling is kept as a safety net in case the notification is lost
         timeout_wait_for_task = 3600   # Max time (seconds) to wait for a related task to finish
-        # interval_wait_for_task = 30    #  A too long polling interval slows things down considerably
-        interval_wait_for_task = 10       # Interval in seconds for polling related tasks
-        time_left = timeout_wait_for_task
+        interval_wait_for_task = 60    # Interval in seconds for polling related tasks when not notified
+        # Instance to wait for its completions. For op_type='ANY' any completion is waited
+        if op_type == 'ANY':
+            waitfor_id = None
+        elif self._is_service_type_HA(topic):
+            waitfor_id = db_lcmop.get(self.topic2instid_dict.get(topic))
+        else:
+            waitfor_id = _id
+        time_limit = time() + timeout_wait_for_task
         old_num_related_tasks = 0
         while True:
             # Get related tasks (operations within the same instance as this) which are
             # still running (operationState='PROCESSING') and which were started before this task.
             # In the case of op_type='ANY', get any related tasks with operationState='PROCESSING', ignore timestamps.
-            db_waitfor_related_task = self.db.get_list(db_table_name,
-                                                       q_filter=_filter)
+            db_waitfor_related_task = await self.db_async.get_list(db_table_name,
+                                                                   q_filter=_filter)
             new_num_related_tasks = len(db_waitfor_related_task)
             # If there are no related tasks, there is nothing to wait for, so return.
             if not new_num_related_tasks:
@@ -467,16 +1099,410 @@ class TaskRegistry(LcmBase):
                     _, op_index = self._get_account_and_op_HA(op_id)
                     update_dict = {'_admin.operations.{}.detailed-status'.format(op_index): step}
                 self.logger.debug("Task {} operation={} {}".format(topic, _id, step))
-                self.db.set_one(db_table_name,
-                                q_filter=q_filter,
-                                update_dict=update_dict,
-                                fail_on_empty=False)
+                await self.db_async.set_one(db_table_name,
+                                            q_filter=q_filter,
+                                            update_dict=update_dict,
+                                            fail_on_empty=False)
                 old_num_related_tasks = new_num_related_tasks
-            time_left -= interval_wait_for_task
+            time_left = time_limit - time()
             if time_left < 0:
                 raise LcmException(
                     "Timeout ({}) when waiting for related tasks to be completed".format(
                         timeout_wait_for_task))
-            await asyncio.sleep(interval_wait_for_task)
+            await self._wait_completion(waitfor_id, min(interval_wait_for_task, time_left))
 
         return
+
+
+class AdmissionControl:
+    """
+    Limits the number of lcm operations running at the same time in this worker. Limits can be set per topic
+    (e.g. "ns") and per command (the task name used at TaskRegistry, e.g. "ns_instantiate"). Operations over the limits
+    are kept in a pending queue and started in arrival order when there is room. An operation is never started before
+    an older pending operation over the same _id, so that the operation order of an instance is kept.
+    When the pending queue is full, wait_pending_room() blocks, which is used to pause the kafka consumption.
+    """
+
+    def __init__(self, config=None, loop=None, logger=None, metrics=None):
+        """
+        :param config: dictionary with the admission configuration, the lcm.cfg 'admission' section:
+            max_pending: maximum number of pending operations before pausing kafka reading. 0 or None for unlimited
+            topic: dictionary with the maximum number of running operations per topic
+            command: dictionary with the maximum number of running operations per command
+        :param loop: asyncio event loop
+        :param logger: logger to use
+        :param metrics: LcmMetrics where queue and operation durations are reported. None for not reporting
+        """
+        config = config or {}
+        self.loop = loop or asyncio.get_event_loop()
+        self.logger = logger
+        self.metrics = metrics
+        self.max_pending = int(config.get("max_pending") or 0)
+        self.topic_limits = {k: int(v) for k, v in (config.get("topic") or {}).items()}
+        self.command_limits = {k: int(v) for k, v in (config.get("command") or {}).items()}
+        self.running = {}       # running operations per topic and per command
+        self.pending = []       # list of pending operations, in arrival order
+        self.room_waiters = []  # futures waiting for room at the pending queue
+        # statistics for reporting
+        self.admitted = 0
+        self.queued = 0
+        self.wait_time_total = 0
+        self.wait_time_max = 0
+
+    def _fits(self, topic, command):
+        for key, limits in ((topic, self.topic_limits), (command, self.command_limits)):
+            limit = limits.get(key)
+            if limit and self.running.get(key, 0) >= limit:
+                return False
+        return True
+
+    def _acquire(self, topic, command):
+        for key in (topic, command):
+            self.running[key] = self.running.get(key, 0) + 1
+
+    def _release(self, topic, command):
+        for key in (topic, command):
+            self.running[key] -= 1
+            if not self.running[key]:
+                del self.running[key]
+        self._schedule()
+
+    def _schedule(self):
+        """
+        Start the pending operations that fit into the limits, keeping the order of operations of the same instance
+        """
+        blocked = set()
+        for pending_op in list(self.pending):
+            instance = (pending_op["topic"], pending_op["_id"])
+            if instance in blocked:
+                continue
+            if pending_op["future"].done() or not self._fits(pending_op["topic"], pending_op["command"]):
+                blocked.add(instance)
+                continue
+            self._acquire(pending_op["topic"], pending_op["command"])
+            self.pending.remove(pending_op)
+            pending_op["future"].set_result(None)
+        self._wake_room_waiters()
+
+    def _wake_room_waiters(self):
+        if self.max_pending and len(self.pending) >= self.max_pending:
+            return
+        for waiter in self.room_waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self.room_waiters.clear()
+
+    def admit(self, topic, command, _id, coro):
+        """
+        Creates a task that runs the coroutine when the admission limits allow it. The operation is admitted or queued
+        at once, so that wait_pending_room() takes it into account
+        :param topic: Can be "ns", "nsi", "vim_account", "sdn", ...
+        :param command: operation name, as registered at TaskRegistry, e.g. "ns_instantiate"
+        :param _id: _id of the related item
+        :param coro: coroutine of the operation
+        :return: the asyncio task, that can be registered and cancelled at TaskRegistry
+        """
+        op = {"topic": topic, "command": command, "_id": _id, "future": None, "started": False}
+        instance_pending = any(p["topic"] == topic and p["_id"] == _id for p in self.pending)
+        self.admitted += 1
+        if not instance_pending and self._fits(topic, command):
+            self._acquire(topic, command)
+        else:
+            op["future"] = self.loop.create_future()
+            op["queued_at"] = time()
+            self.pending.append(op)
+            self.queued += 1
+            if self.logger:
+                self.logger.debug("Admission {} {}={} queued. Pending operations: {}".format(
+                    command, topic, _id, len(self.pending)))
+        task = asyncio.ensure_future(self._run(op, coro), loop=self.loop)
+        task.add_done_callback(partial(self._run_done, op, coro))
+        return task
+
+    def _run_done(self, op, coro, task):
+        if not op["started"]:
+            # task cancelled before starting
+            self._drop(op)
+            self._cancel_operation(coro)
+
+    def _drop(self, op):
+        """
+        Frees the place of an operation that will not run, either at the pending queue or at the running limits
+        """
+        if op in self.pending:
+            self.pending.remove(op)
+            self._schedule()
+        else:
+            # it was already admitted
+            self._release(op["topic"], op["command"])
+
+    def _cancel_operation(self, coro):
+        """
+        Runs the coroutine of an operation cancelled before being admitted, and cancels it at its first wait. The
+        operation then executes its own cancellation handling, e.g. writing at database that it has been cancelled
+        """
+        task = asyncio.ensure_future(coro, loop=self.loop)
+        # this is called after the first step of the task, that is scheduled before
+        self.loop.call_soon(task.cancel)
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    async def _run(self, op, coro):
+        op["started"] = True
+        topic, command = op["topic"], op["command"]
+        if op["future"]:
+            try:
+                await op["future"]
+            except asyncio.CancelledError:
+                self._drop(op)
+                self._cancel_operation(coro)
+                raise
+            wait_time = time() - op["queued_at"]
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+            if self.logger:
+                self.logger.debug("Admission {} {}={} started after {:.1f} seconds queued. Pending operations: {}"
+                                  .format(command, topic, op["_id"], wait_time, len(self.pending)))
+            if self.metrics:
+                self.metrics.observe("lcm_admission_wait_seconds", {"topic": topic, "command": command}, wait_time)
+        start_time = time()
+        try:
+            return await coro
+        finally:
+            self._release(topic, command)
+            if self.metrics:
+                self.metrics.observe("lcm_operation_duration_seconds", {"topic": topic, "command": command},
+                                     time() - start_time)
+
+    async def wait_pending_room(self):
+        """
+        Blocks while the pending queue is full
+        """
+        if not self.max_pending or len(self.pending) < self.max_pending:
+            return
+        if self.logger:
+            self.logger.warning("Admission pending queue is full ({} operations). Pausing reading".format(
+                len(self.pending)))
+        time_start = time()
+        while self.max_pending and len(self.pending) >= self.max_pending:
+            waiter = self.loop.create_future()
+            self.room_waiters.append(waiter)
+            await waiter
+        if self.logger:
+            self.logger.warning("Admission resuming reading after {:.1f} seconds".format(time() - time_start))
+
+    def get_status(self):
+        """
+        Obtain the current admission status, used for reporting
+        :return: dictionary with the number of running operations per topic/command, the pending queue depth, and the
+            waiting time statistics
+        """
+        return {
+            "running": dict(self.running),
+            "pending": len(self.pending),
+            "max_pending": self.max_pending,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "wait_time_average": self.wait_time_total / self.queued if self.queued else 0,
+            "wait_time_max": self.wait_time_max,
+        }
+
+
+class ReadCoalescer:
+    """
+    Coalesces identical asynchronous reads in progress into a single one, whose result is shared by all the callers.
+    Results can be reused during ttl seconds. Writes must be done inside writing() context: cached results are
+    removed, and reads in progress, that can return the content previous to the write, are neither joined by new
+    callers nor cached
+    """
+
+    def __init__(self, ttl=0, max_size=1000, loop=None):
+        """
+        :param ttl: seconds to reuse a result. 0 disables the reuse, and only reads in progress are shared
+        :param max_size: max number of stored results
+        :param loop: asyncio event loop
+        """
+        self.ttl = float(ttl or 0)
+        self.max_size = max_size
+        self.loop = loop
+        self.generation = 0  # increased at each invalidation
+        self.inflight = {}  # key: future with the result
+        self.cache = {}  # key: (time, result)
+
+    async def _read(self, key, read, cacheable, generation):
+        result = await read()
+        if self.ttl and generation == self.generation and (not cacheable or cacheable(result)):
+            now = time()
+            if len(self.cache) >= self.max_size:
+                self.cache = {k: v for k, v in self.cache.items() if now - v[0] < self.ttl}
+            self.cache[key] = (now, result)
+        return result
+
+    def _read_done(self, key, future):
+        if self.inflight.get(key) is future:
+            del self.inflight[key]
+        if not future.cancelled():
+            future.exception()  # retrieved, in case all the callers have been cancelled
+
+    async def get(self, key, read, cacheable=None):
+        """
+        Obtains a result, from cache, from an identical read in progress, or performing the read
+        :param key: identification of the read, e.g. the url
+        :param read: coroutine function without parameters that performs the read
+        :param cacheable: function that receives the result and returns False if it must not be reused, e.g. an error
+            response. None to reuse all the results
+        :return: the result of read. Exceptions of read are raised
+        """
+        if self.ttl:
+            cached = self.cache.get(key)
+            if cached and time() - cached[0] < self.ttl:
+                return cached[1]
+        future = self.inflight.get(key)
+        if not future:
+            future = self.inflight[key] = asyncio.ensure_future(self._read(key, read, cacheable, self.generation),
+                                                                loop=self.loop)
+            future.add_done_callback(lambda f: self._read_done(key, f))
+        # a cancelled caller must not cancel the read of the others
+        return await asyncio.shield(future)
+
+    def invalidate(self):
+        """
+        Discards the cached results and the reads in progress, as they can be outdated after a write operation.
+        Callers already waiting for a read in progress get its result
+        :return: None
+        """
+        self.generation += 1
+        self.cache.clear()
+        self.inflight.clear()
+
+    @contextmanager
+    def writing(self):
+        """
+        Context of a write operation. Invalidates before the write, and again when it finishes, as reads started
+        meanwhile can return the content previous to the write
+        """
+        self.invalidate()
+        try:
+            yield
+        finally:
+            self.invalidate()
+
+
+class PollBackoff:
+    """
+    Interval between the polls of a long asynchronous operation, e.g. a deployment at RO. It starts at 'initial'
+    seconds, grows by 'factor' up to 'max' while no progress is observed, and goes back to 'initial' when the polled
+    status changes. A random 'jitter' fraction is added or subtracted, so that many concurrent operations do not poll
+    at the same time. Parameters can be overridden per VIM type
+    """
+    defaults = {"initial": 1, "max": 30, "factor": 1.5, "jitter": 0.2}
+    min_interval = 0.1  # lower values, as 0, would poll without pause
+
+    def __init__(self, config=None, vim_type=None, loop=None):
+        """
+        :param config: dictionary with the lcm.cfg 'polling' section: initial, max, factor, jitter and vim_type, a
+            dictionary with the same parameters per VIM type
+        :param vim_type: VIM type of the polled operation, used to select the overrides. None for the defaults
+        :param loop: asyncio event loop
+        """
+        config = config or {}
+        params = self.defaults.copy()
+        params.update({k: v for k, v in config.items() if k in self.defaults and v is not None})
+        if vim_type:
+            params.update((config.get("vim_type") or {}).get(vim_type) or {})
+        self.initial = max(float(params["initial"]), self.min_interval)
+        self.max = max(float(params["max"]), self.initial)
+        self.factor = max(float(params["factor"]), 1)
+        self.jitter = min(max(float(params["jitter"]), 0), 1)
+        self.loop = loop
+        self.delay = self.initial
+
+    def progress(self):
+        """
+        Notifies that progress has been observed, so next poll is done after the initial interval
+        :return: None
+        """
+        self.delay = self.initial
+
+    def next_delay(self):
+        """
+        Obtains the interval until next poll, and increases the following one
+        :return: seconds
+        """
+        delay = self.delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+        self.delay = min(self.delay * self.factor, self.max)
+        return delay
+
+    async def wait(self, progress=False):
+        """
+        Sleeps until next poll
+        :param progress: True if the last poll showed progress, which resets the interval
+        :return: the slept seconds
+        """
+        if progress:
+            self.progress()
+        delay = self.next_delay()
+        await asyncio.sleep(delay, loop=self.loop)
+        return delay
+
+
+class RetryPolicy:
+    """
+    Retries an asynchronous call that fails with a retriable exception, waiting between attempts with the exponential
+    backoff and jitter of PollBackoff, until a total deadline or a max number of attempts. Optionally, after a failure
+    it polls a cheap readiness probe with the same backoff, and the call is retried as soon as the probe succeeds
+    """
+    readiness_deadline = 600  # default deadline when a readiness probe is used, so that it is not polled forever
+
+    def __init__(self, backoff=None, deadline=None, max_attempts=None, retry_exceptions=(Exception, ), loop=None):
+        """
+        :param backoff: dictionary with the PollBackoff parameters of the waits: initial, max, factor, jitter
+        :param deadline: max seconds since first attempt to start a new attempt. None for no limit, except if a
+            readiness probe is used, where readiness_deadline applies
+        :param max_attempts: max number of attempts. None for no limit
+        :param retry_exceptions: exception or tuple of exceptions that are retried. Others are raised at once
+        :param loop: asyncio event loop
+        """
+        self.backoff = backoff or {}
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.retry_exceptions = retry_exceptions
+        self.loop = loop
+
+    async def run(self, func, readiness=None, on_error=None):
+        """
+        Executes func until it succeeds
+        :param func: function without arguments that returns the awaitable to execute at each attempt
+        :param readiness: optional function without arguments that returns an awaitable boolean, polled after a failure
+            to know when to retry
+        :param on_error: optional function called with the exception of every failed attempt that is retried
+        :return: result of func. Raises the last exception if it is not retriable, or if deadline or max_attempts are
+            reached
+        """
+        start = time()
+        backoff = PollBackoff(self.backoff, loop=self.loop)
+        deadline = self.deadline
+        if deadline is None and readiness:
+            # probes are not attempts, so max_attempts does not limit them
+            deadline = self.readiness_deadline
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await func()
+            except asyncio.CancelledError:
+                raise
+            except self.retry_exceptions as e:
+                if self.max_attempts and attempt >= self.max_attempts:
+                    raise
+                if on_error:
+                    on_error(e)
+                while True:
+                    delay = backoff.next_delay()
+                    if deadline is not None:
+                        remaining = deadline - (time() - start)
+                        if remaining <= 0:
+                            raise e
+                        delay = min(delay, remaining)
+                    await asyncio.sleep(delay, loop=self.loop)
+                    if not readiness or await readiness():
+                        break
@@ -43,6 +43,7 @@ class NetsliceLcm(LcmBase):
         self.lcm_tasks = lcm_tasks
         self.ns = ns
         self.ro_config = config["ro_config"]
+        self.RO = ROclient.ROClient(self.loop, **self.ro_config)
         self.timeout = config["timeout"]
 
         super().__init__(db, msg, fs, self.logger)
@@ -86,7 +87,7 @@ class NetsliceLcm(LcmBase):
         db_nsilcmop_update = {}
         nsilcmop_operation_state = None
         vim_2_RO = {}
-        RO = ROclient.ROClient(self.loop, **self.ro_config)
+        RO = self.RO
 
         def ip_profile_2_RO(ip_profile):
             RO_ip_profile = deepcopy((ip_profile))
@@ -139,7 +140,7 @@ class NetsliceLcm(LcmBase):
             vld_shared = None
             for shared_nsrs_item in get_iterable(vld_item, "shared-nsrs-list"):
                 _filter = {"_id.ne": nsir_id, "_admin.nsrs-detailed-list.ANYINDEX.nsrId": shared_nsrs_item}
-                shared_nsi = self.db.get_one("nsis", _filter, fail_on_empty=False, fail_on_more=False)
+                shared_nsi = await self.db_async.get_one("nsis", _filter, fail_on_empty=False, fail_on_more=False)
                 if shared_nsi:
                     for vlds in get_iterable(shared_nsi["_admin"]["deployed"], "RO"):
                         if vld_id == vlds["vld_id"]:
@@ -224,7 +225,7 @@ class NetsliceLcm(LcmBase):
                 db_nsir_update_RO["vld_id"] = RO_ns_params["name"]
                 db_nsir_update["_admin.deployed.RO"].append(db_nsir_update_RO)
 
-        def overwrite_nsd_params(self, db_nsir, nslcmop):
+        async def overwrite_nsd_params(self, db_nsir, nslcmop):
             RO_list = []
             vld_op_list = []
             vld = None
@@ -246,7 +247,7 @@ class NetsliceLcm(LcmBase):
                             for nss in get_iterable(db_nsir["_admin"], "netslice-subnet"):
                                 # Compare nss-ref equal nss from nst
                                 if nss_cp_item["nss-ref"] == nss["nss-id"]:
-                                    db_nsds = self.db.get_one("nsds", {"_id": nss["nsdId"]})
+                                    db_nsds = await self.ns.descriptor_cache.get("nsds", nss["nsdId"])
                                     # Go for nsd, and search the CP that match with nst:CP to get vld-id-ref
                                     for cp_nsd in db_nsds.get("connection-point", ()):
                                         if cp_nsd["name"] == nss_cp_item["nsd-connection-point-ref"]:
@@ -270,9 +271,9 @@ class NetsliceLcm(LcmBase):
             await self.lcm_tasks.waitfor_related_HA('nsi', 'nsilcmops', nsilcmop_id)
 
             step = "Getting nsir={} from db".format(nsir_id)
-            db_nsir = self.db.get_one("nsis", {"_id": nsir_id})
+            db_nsir = await self.db_async.get_one("nsis", {"_id": nsir_id})
             step = "Getting nsilcmop={} from db".format(nsilcmop_id)
-            db_nsilcmop = self.db.get_one("nsilcmops", {"_id": nsilcmop_id})
+            db_nsilcmop = await self.db_async.get_one("nsilcmops", {"_id": nsilcmop_id})
 
             start_deploy = time()
             nsi_params = db_nsilcmop.get("operationParams")
@@ -303,7 +304,7 @@ class NetsliceLcm(LcmBase):
             db_nsir_update["detailed-status"] = step
             self.update_db_2("nsis", nsir_id, db_nsir_update)
 
-            db_nsir = self.db.get_one("nsis", {"_id": nsir_id})
+            db_nsir = await self.db_async.get_one("nsis", {"_id": nsir_id})
 
             # Check status of the VLDs and wait for creation
             # netslice_scenarios = db_nsir["_admin"]["deployed"]["RO"]
@@ -317,12 +318,12 @@ class NetsliceLcm(LcmBase):
 
             # Iterate over the network services operation ids to instantiate NSs
             step = "Instantiating Netslice Subnets"
-            db_nsir = self.db.get_one("nsis", {"_id": nsir_id})
+            db_nsir = await self.db_async.get_one("nsis", {"_id": nsir_id})
             nslcmop_ids = db_nsilcmop["operationParams"].get("nslcmops_ids")
             for nslcmop_id in nslcmop_ids:
-                nslcmop = self.db.get_one("nslcmops", {"_id": nslcmop_id})
+                nslcmop = await self.db_async.get_one("nslcmops", {"_id": nslcmop_id})
                 # Overwriting netslice-vld vim-net-id to ns
-                nsr_id, nslcmop = overwrite_nsd_params(self, db_nsir, nslcmop)
+                nsr_id, nslcmop = await overwrite_nsd_params(self, db_nsir, nslcmop)
                 step = "Launching ns={} instantiate={} task".format(nsr_id, nslcmop_id)
                 task = asyncio.ensure_future(self.ns.instantiate(nsr_id, nslcmop_id))
                 self.lcm_tasks.register("ns", nsr_id, nslcmop_id, "ns_instantiate", task)
@@ -336,11 +337,11 @@ class NetsliceLcm(LcmBase):
             while time() <= start_deploy + timeout_nsi_deploy:
                 # Check ns instantiation status
                 nsi_ready = True
-                nsir = self.db.get_one("nsis", {"_id": nsir_id})
+                nsir = await self.db_async.get_one("nsis", {"_id": nsir_id})
                 nsrs_detailed_list = nsir["_admin"]["nsrs-detailed-list"]
                 nsrs_detailed_list_new = []
                 for nslcmop_item in nslcmop_ids:
-                    nslcmop = self.db.get_one("nslcmops", {"_id": nslcmop_item})
+                    nslcmop = await self.db_async.get_one("nslcmops", {"_id": nslcmop_item})
                     status = nslcmop.get("operationState")
                     # TODO: (future improvement) other possible status: ROLLING_BACK,ROLLED_BACK
                     for nss in nsrs_detailed_list:
@@ -433,7 +434,7 @@ class NetsliceLcm(LcmBase):
         db_nsilcmop = None
         db_nsir_update = {"_admin.nsilcmop": nsilcmop_id}
         db_nsilcmop_update = {}
-        RO = ROclient.ROClient(self.loop, **self.ro_config)
+        RO = self.RO
         nsir_deployed = None
         failed_detail = []   # annotates all failed error messages
         nsilcmop_operation_state = None
@@ -443,10 +444,10 @@ class NetsliceLcm(LcmBase):
             await self.lcm_tasks.waitfor_related_HA('nsi', 'nsilcmops', nsilcmop_id)
 
             step = "Getting nsir={} from db".format(nsir_id)
-            db_nsir = self.db.get_one("nsis", {"_id": nsir_id})
+            db_nsir = await self.db_async.get_one("nsis", {"_id": nsir_id})
             nsir_deployed = deepcopy(db_nsir["_admin"].get("deployed"))
             step = "Getting nsilcmop={} from db".format(nsilcmop_id)
-            db_nsilcmop = self.db.get_one("nsilcmops", {"_id": nsilcmop_id})
+            db_nsilcmop = await self.db_async.get_one("nsilcmops", {"_id": nsilcmop_id})
 
             # TODO: Check if makes sense check the nsiState=NOT_INSTANTIATED when terminate
             # CASE: Instance was terminated but there is a second request to terminate the instance
@@ -470,10 +471,11 @@ class NetsliceLcm(LcmBase):
             nslcmop_ids = db_nsilcmop["operationParams"].get("nslcmops_ids")
             nslcmop_new = []
             for nslcmop_id in nslcmop_ids:
-                nslcmop = self.db.get_one("nslcmops", {"_id": nslcmop_id})
+                nslcmop = await self.db_async.get_one("nslcmops", {"_id": nslcmop_id})
                 nsr_id = nslcmop["operationParams"].get("nsInstanceId")
-                nss_in_use = self.db.get_list("nsis", {"_admin.netslice-vld.ANYINDEX.shared-nsrs-list": nsr_id,
-                                                       "operational-status": {"$nin": ["terminated", "failed"]}})
+                nss_in_use = await self.db_async.get_list(
+                    "nsis", {"_admin.netslice-vld.ANYINDEX.shared-nsrs-list": nsr_id,
+                             "operational-status": {"$nin": ["terminated", "failed"]}})
                 if len(nss_in_use) < 2:
                     task = asyncio.ensure_future(self.ns.terminate(nsr_id, nslcmop_id))
                     self.lcm_tasks.register("ns", nsr_id, nslcmop_id, "ns_instantiate", task)
@@ -485,9 +487,10 @@ class NetsliceLcm(LcmBase):
                         if db_nsir["_id"] != nsis_item["_id"]:
                             netsliceInstanceId = nsis_item["_id"]
                             break
-                    self.db.set_one("nslcmops", {"_id": nslcmop_id},
-                                    {"operationParams.netsliceInstanceId": netsliceInstanceId})
-            self.db.set_one("nsilcmops", {"_id": nsilcmop_id}, {"operationParams.nslcmops_ids": nslcmop_new})
+                    await self.db_async.set_one("nslcmops", {"_id": nslcmop_id},
+                                                {"operationParams.netsliceInstanceId": netsliceInstanceId})
+            await self.db_async.set_one("nsilcmops", {"_id": nsilcmop_id},
+                                        {"operationParams.nslcmops_ids": nslcmop_new})
 
             # Wait until Network Slice is terminated
             step = nsir_status_detailed = " Waiting nsi terminated. nsi_id={}".format(nsir_id)
@@ -498,11 +501,11 @@ class NetsliceLcm(LcmBase):
             while termination_timeout > 0:
                 # Check ns termination status
                 nsi_ready = True
-                db_nsir = self.db.get_one("nsis", {"_id": nsir_id})
+                db_nsir = await self.db_async.get_one("nsis", {"_id": nsir_id})
                 nsrs_detailed_list = db_nsir["_admin"].get("nsrs-detailed-list")
                 nsrs_detailed_list_new = []
                 for nslcmop_item in nslcmop_ids:
-                    nslcmop = self.db.get_one("nslcmops", {"_id": nslcmop_item})
+                    nslcmop = await self.db_async.get_one("nslcmops", {"_id": nslcmop_item})
                     status = nslcmop["operationState"]
                     # TODO: (future improvement) other possible status: ROLLING_BACK,ROLLED_BACK 
                     for nss in nsrs_detailed_list:
@@ -520,13 +523,14 @@ class NetsliceLcm(LcmBase):
 
                 if nsi_ready:
                     # Check if it is the last used nss and mark isinstantiate: False
-                    db_nsir = self.db.get_one("nsis", {"_id": nsir_id})
+                    db_nsir = await self.db_async.get_one("nsis", {"_id": nsir_id})
                     nsrs_detailed_list = db_nsir["_admin"].get("nsrs-detailed-list")
                     for nss in nsrs_detailed_list:
                         _filter = {"_admin.nsrs-detailed-list.ANYINDEX.nsrId": nss["nsrId"],
                                    "operational-status.ne": "terminated",
                                    "_id.ne": nsir_id}
-                        nsis_list = self.db.get_one("nsis", _filter, fail_on_empty=False, fail_on_more=False)
+                        nsis_list = await self.db_async.get_one("nsis", _filter, fail_on_empty=False,
+                                                                fail_on_more=False)
                         if not nsis_list:
                             nss.update({"instantiated": False})
 
@@ -26,6 +26,7 @@ import asyncio
 import aiohttp
 import yaml
 import logging
+from osm_lcm.lcm_utils import ReadCoalescer
 
 __author__ = "Alfonso Tierno <alfonso.tiernosepulveda@telefonica.com"
 __date__ = "$09-Jan-2018 09:09:48$"
@@ -58,6 +59,7 @@ class NgRoClient:
     }
     timeout_large = 120
     timeout_short = 30
+    get_cache_max_size = 1000
 
     def __init__(self, loop, uri, **kwargs):
         self.loop = loop
@@ -77,6 +79,54 @@ class NgRoClient:
         self.logger = logging.getLogger(logger_name)
         if kwargs.get("loglevel"):
             self.logger.setLevel(kwargs["loglevel"])
+        # persistent http session, created at first use. Connections are kept alive and reused
+        self._session = None
+        self.pool_limit = int(kwargs.get("pool_limit") or 100)  # max number of simultaneous connections
+        self.pool_limit_per_host = int(kwargs.get("pool_limit_per_host") or 0)  # 0 means no limit
+        self.keepalive_timeout = int(kwargs.get("keepalive_timeout") or 30)  # time to keep alive an idle connection
+        # identical GET requests in progress are coalesced. Responses can be reused during get_cache_ttl seconds
+        self.get_cache_ttl = float(kwargs.get("get_cache_ttl") or 0)
+        self._get_coalescer = ReadCoalescer(self.get_cache_ttl, self.get_cache_max_size, loop=self.loop)
+
+    def _get_session(self):
+        """
+        Obtain the persistent http session, creating it at first use, or if it has been closed
+        :return: aiohttp.ClientSession
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_limit, limit_per_host=self.pool_limit_per_host,
+                                             keepalive_timeout=self.keepalive_timeout, loop=self.loop)
+            self._session = aiohttp.ClientSession(connector=connector, loop=self.loop)
+        return self._session
+
+    async def close(self):
+        """
+        Close the persistent http session, releasing the connections. It is created again if the client is used
+        :return: None
+        """
+        if self._session is not None:
+            if not self._session.closed:
+                await self._session.close()
+            self._session = None
+
+    async def _http_get_request(self, session, url):
+        self.logger.debug("GET %s", url)
+        # timeout = aiohttp.ClientTimeout(total=self.timeout_short)
+        async with session.get(url, headers=self.headers_req) as response:
+            response_text = await response.read()
+            self.logger.debug("GET {} [{}] {}".format(url, response.status, response_text[:100]))
+        return response.status, response_text
+
+    async def _http_get(self, session, url):
+        """
+        Performs an http GET. Identical requests in progress are coalesced into a single one, whose response is shared
+        by all the callers. Successful responses are reused during get_cache_ttl seconds, if set
+        :param session: aiohttp.ClientSession
+        :param url: url to get
+        :return: response status and response text. aiohttp exceptions are raised
+        """
+        return await self._get_coalescer.get(url, lambda: self._http_get_request(session, url),
+                                             cacheable=lambda response: response[0] < 300)
 
     async def deploy(self, nsr_id, target):
         """
@@ -95,8 +145,9 @@ class NgRoClient:
             payload_req = yaml.safe_dump(target)
 
             url = "{}/ns/v1/deploy/{nsr_id}".format(self.endpoint_url, nsr_id=nsr_id)
-            async with aiohttp.ClientSession(loop=self.loop) as session:
-                self.logger.debug("NG-RO POST %s %s", url, payload_req)
+            session = self._get_session()
+            self.logger.debug("NG-RO POST %s %s", url, payload_req)
+            with self._get_coalescer.writing():
                 # timeout = aiohttp.ClientTimeout(total=self.timeout_large)
                 async with session.post(url, headers=self.headers_req, data=payload_req) as response:
                     response_text = await response.read()
@@ -112,15 +163,11 @@ class NgRoClient:
     async def status(self, nsr_id, action_id):
         try:
             url = "{}/ns/v1/deploy/{nsr_id}/{action_id}".format(self.endpoint_url, nsr_id=nsr_id, action_id=action_id)
-            async with aiohttp.ClientSession(loop=self.loop) as session:
-                self.logger.debug("GET %s", url)
-                # timeout = aiohttp.ClientTimeout(total=self.timeout_short)
-                async with session.get(url, headers=self.headers_req) as response:
-                    response_text = await response.read()
-                    self.logger.debug("GET {} [{}] {}".format(url, response.status, response_text[:100]))
-                    if response.status >= 300:
-                        raise NgRoException(response_text, http_code=response.status)
-                    return self._parse_yaml(response_text, response=True)
+            session = self._get_session()
+            response_status, response_text = await self._http_get(session, url)
+            if response_status >= 300:
+                raise NgRoException(response_text, http_code=response_status)
+            return self._parse_yaml(response_text, response=True)
 
         except (aiohttp.ClientOSError, aiohttp.ClientError) as e:
             raise NgRoException(e, http_code=504)
@@ -130,8 +177,9 @@ class NgRoClient:
     async def delete(self, nsr_id):
         try:
             url = "{}/ns/v1/deploy/{nsr_id}".format(self.endpoint_url, nsr_id=nsr_id)
-            async with aiohttp.ClientSession(loop=self.loop) as session:
-                self.logger.debug("DELETE %s", url)
+            session = self._get_session()
+            self.logger.debug("DELETE %s", url)
+            with self._get_coalescer.writing():
                 # timeout = aiohttp.ClientTimeout(total=self.timeout_short)
                 async with session.delete(url, headers=self.headers_req) as response:
                     self.logger.debug("DELETE {} [{}]".format(url, response.status))
@@ -151,21 +199,17 @@ class NgRoClient:
         """
         try:
             response_text = ""
-            async with aiohttp.ClientSession(loop=self.loop) as session:
-                url = "{}/version".format(self.endpoint_url)
-                self.logger.debug("RO GET %s", url)
-                # timeout = aiohttp.ClientTimeout(total=self.timeout_short)
-                async with session.get(url, headers=self.headers_req) as response:
-                    response_text = await response.read()
-                    self.logger.debug("GET {} [{}] {}".format(url, response.status, response_text[:100]))
-                    if response.status >= 300:
-                        raise NgRoException(response_text, http_code=response.status)
-
-                for word in str(response_text).split(" "):
-                    if "." in word:
-                        version_text, _, _ = word.partition("-")
-                        return version_text
-                raise NgRoException("Got invalid version text: '{}'".format(response_text), http_code=500)
+            session = self._get_session()
+            url = "{}/version".format(self.endpoint_url)
+            response_status, response_text = await self._http_get(session, url)
+            if response_status >= 300:
+                raise NgRoException(response_text, http_code=response_status)
+
+            for word in str(response_text).split(" "):
+                if "." in word:
+                    version_text, _, _ = word.partition("-")
+                    return version_text
+            raise NgRoException("Got invalid version text: '{}'".format(response_text), http_code=500)
         except (aiohttp.ClientOSError, aiohttp.ClientError) as e:
             raise NgRoException(e, http_code=504)
         except asyncio.TimeoutError:
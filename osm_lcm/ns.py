@@ -17,16 +17,18 @@
 ##
 
 import asyncio
+import hashlib
 import yaml
 import logging
 import logging.handlers
 import traceback
 import json
-from jinja2 import Environment, Template, meta, TemplateError, TemplateNotFound, TemplateSyntaxError
+from jinja2 import TemplateError, TemplateNotFound, TemplateSyntaxError
 
 from osm_lcm import ROclient
 from osm_lcm.ng_ro import NgRoClient, NgRoException
-from osm_lcm.lcm_utils import LcmException, LcmExceptionNoMgmtIP, LcmBase, deep_get, get_iterable, populate_dict
+from osm_lcm.lcm_utils import LcmException, LcmExceptionNoMgmtIP, LcmBase, deep_get, get_iterable, populate_dict, \
+    get_update_delta, DescriptorCache, PackageCache, PollBackoff, TemplateCache, RetryPolicy
 from n2vc.k8s_helm_conn import K8sHelmConnector
 from n2vc.k8s_juju_conn import K8sJujuConnector
 
@@ -38,6 +40,7 @@ from n2vc.exceptions import N2VCException, N2VCNotFound, K8sException
 
 from osm_lcm.lcm_helm_conn import LCMHelmConn
 
+from collections import OrderedDict
 from copy import copy, deepcopy
 from http import HTTPStatus
 from time import time
@@ -84,16 +87,24 @@ class NsLcm(LcmBase):
     timeout_charm_delete = 10 * 60
     timeout_primitive = 30 * 60  # timeout for primitive execution
     timeout_progress_primitive = 10 * 60  # timeout for some progress in a primitive execution
+    vca_status_window = 1  # seconds to coalesce the N2VC status callbacks of a ns
+    vca_status_full_refresh = 300  # seconds after which the whole vcaStatus is written, not only the changes
+    RO_SHARED_LOCKED_TIME = 120  # seconds after which the lock of a shared RO descriptor expires, if not released
 
     SUBOPERATION_STATUS_NOT_FOUND = -1
     SUBOPERATION_STATUS_NEW = -2
     SUBOPERATION_STATUS_SKIP = -3
     task_name_deploy_vca = "Deploying VCA"
 
-    def __init__(self, db, msg, fs, lcm_tasks, config, loop, prometheus=None):
+    def __init__(self, db, msg, fs, lcm_tasks, config, loop, prometheus=None, descriptor_cache=None,
+                 package_cache=None, metrics=None, template_cache=None):
         """
         Init, Connect to database, filesystem storage, and messaging
         :param config: two level dictionary with configuration. Top level should contain 'database', 'storage',
+        :param descriptor_cache: DescriptorCache shared with other modules. If not provided a new one is created
+        :param package_cache: PackageCache for syncing packages from storage. If not provided a new one is created
+        :param metrics: LcmMetrics where RO/N2VC call latency and stage durations are reported. None for not reporting
+        :param template_cache: TemplateCache for cloud-init templates. If not provided a new one is created
         :return: None
         """
         super().__init__(
@@ -107,7 +118,10 @@ class NsLcm(LcmBase):
         self.lcm_tasks = lcm_tasks
         self.timeout = config["timeout"]
         self.ro_config = config["ro_config"]
+        self.polling_config = config.get("polling") or {}
         self.ng_ro = config["ro_config"].get("ng")
+        # reuse the legacy RO vnfd/nsd among the ns with the same translated descriptors
+        self.ro_shared_descriptors = config["ro_config"].get("shared_descriptors", False)
         self.vca_config = config["VCA"].copy()
 
         # create N2VC connector
@@ -130,7 +144,8 @@ class NsLcm(LcmBase):
             url=None,
             username=None,
             vca_config=self.vca_config,
-            on_update_db=self._on_update_n2vc_db
+            on_update_db=self._on_update_n2vc_db,
+            metrics=metrics,
         )
 
         self.k8sclusterhelm = K8sHelmConnector(
@@ -151,6 +166,13 @@ class NsLcm(LcmBase):
             on_update_db=None,
         )
 
+        self.metrics = metrics
+        if self.metrics:
+            self.n2vc = self.metrics.instrument(self.n2vc, "n2vc")
+            self.conn_helm_ee = self.metrics.instrument(self.conn_helm_ee, "n2vc")
+            self.k8sclusterhelm = self.metrics.instrument(self.k8sclusterhelm, "n2vc")
+            self.k8sclusterjuju = self.metrics.instrument(self.k8sclusterjuju, "n2vc")
+
         self.k8scluster_map = {
             "helm-chart": self.k8sclusterhelm,
             "chart": self.k8sclusterhelm,
@@ -166,14 +188,36 @@ class NsLcm(LcmBase):
         }
 
         self.prometheus = prometheus
+        self.descriptor_cache = descriptor_cache or DescriptorCache(self.db, logger=self.logger)
+        self.package_cache = package_cache or PackageCache(self.fs, self.loop, logger=self.logger)
+        self.template_cache = template_cache or TemplateCache(logger=self.logger)
+        # configuration status of the VCAs being instantiated by this worker, to wake up their dependent VCAs
+        self._vca_status = {}  # nsr_id: {vca_index: status}
+        self._vca_status_waiters = {}  # nsr_id: list of futures
+        self._vca_relations = {}  # nsr_id: relations indexed by entity, see _get_vca_relations_index
+        # vnfrs updated from RO by this worker, to wake up the VCAs waiting for the VDU ip address. Kept while an
+        # operation of the ns runs
+        self._vnfr_readiness = {}  # nsr_id: {"vnfrs": {vnfr_id: vnfr content}, "waiters": list of futures}
+        # N2VC status callbacks pending to be processed, and last vcaStatus written, per ns
+        self._vca_status_pending = {}  # nsr_id: {"filter": nsr filter, "vca_indexes": set of VCA changed}
+        self._vca_status_written = {}  # nsr_id: {"status": vcaStatus, "problems": , "time": }
+        self._vca_status_locks = {}  # nsr_id: lock to process the callbacks of a ns in order
+        # RO descriptor last written at nsr deploymentStatus by this worker, to write only the changes
+        self._ro_deployment_status = {}  # nsr_id: RO descriptor
 
         # create RO client
         if self.ng_ro:
             self.RO = NgRoClient(self.loop, **self.ro_config)
         else:
             self.RO = ROclient.ROClient(self.loop, **self.ro_config)
+        if self.metrics:
+            self.RO = self.metrics.instrument(self.RO, "ro")
 
     def _on_update_ro_db(self, nsrs_id, ro_descriptor):
+        """
+        Writes the RO descriptor at nsr deploymentStatus. Only the content changed since the previous descriptor
+        written by this worker for the same ns is written
+        """
 
         # self.logger.debug('_on_update_ro_db(nsrs_id={}'.format(nsrs_id))
 
@@ -181,15 +225,22 @@ class NsLcm(LcmBase):
             # TODO filter RO descriptor fields...
 
             # write to database
-            db_dict = dict()
             # db_dict['deploymentStatus'] = yaml.dump(ro_descriptor, default_flow_style=False, indent=2)
-            db_dict['deploymentStatus'] = ro_descriptor
+            if nsrs_id in self._ro_deployment_status:
+                db_dict = get_update_delta(self._ro_deployment_status[nsrs_id], ro_descriptor, "deploymentStatus")
+            else:
+                db_dict = {"deploymentStatus": ro_descriptor}
             self.update_db_2("nsrs", nsrs_id, db_dict)
+            self._ro_deployment_status[nsrs_id] = ro_descriptor
 
         except Exception as e:
             self.logger.warn('Cannot write database RO deployment for ns={} -> {}'.format(nsrs_id, e))
 
     async def _on_update_n2vc_db(self, table, filter, path, updated_data):
+        """
+        Callback of N2VC when a VCA is updated at database. The callbacks of the same ns are coalesced during
+        vca_status_window seconds and processed at once by _update_vca_status
+        """
 
         # remove last dot from path (if exists)
         if path.endswith('.'):
@@ -198,71 +249,140 @@ class NsLcm(LcmBase):
         # self.logger.debug('_on_update_n2vc_db(table={}, filter={}, path={}, updated_data={}'
         #                   .format(table, filter, path, updated_data))
 
+        nsr_id = filter.get('_id')
+        pending = self._vca_status_pending.get(nsr_id)
+        if pending is None:
+            pending = self._vca_status_pending[nsr_id] = {"filter": filter, "vca_indexes": set()}
+            asyncio.ensure_future(self._update_vca_status(nsr_id), loop=self.loop)
         try:
+            pending["vca_indexes"].add(int(path[path.rfind(".")+1:]))
+        except ValueError:
+            pass
 
-            nsr_id = filter.get('_id')
+    @staticmethod
+    def _get_vca_status_problem(entry_type, entry_id, entry):
+        """
+        Check if a juju machine or application is not ok
+        :param entry_type: "machines" or "applications"
+        :param entry_id: machine or application id
+        :param entry: juju status of the machine or application
+        :return: text with the problem, empty if it is ok
+        """
+        problem = ""
+        if entry_type == "machines":
+            # check machine agent-status
+            if entry.get('agent-status'):
+                s = entry.get('agent-status').get('status')
+                if s != 'started':
+                    problem += 'machine {} agent-status={} ; '.format(entry_id, s)
+            # check machine instance status
+            if entry.get('instance-status'):
+                s = entry.get('instance-status').get('status')
+                if s != 'running':
+                    problem += 'machine {} instance-status={} ; '.format(entry_id, s)
+        # check application status
+        elif entry.get('status'):
+            s = entry.get('status').get('status')
+            if s != 'active':
+                problem += 'application {} status={} ; '.format(entry_id, s)
+        return problem
+
+    def _get_vca_status_update(self, nsr_id, status_dict):
+        """
+        Compares the juju status with the last one written for this ns. Only the changed machines and applications
+        are written, and their problems re-evaluated. The whole vcaStatus is written the first time, when any entry is
+        removed or other content changes, and every vca_status_full_refresh seconds
+        :param nsr_id: ns instance id
+        :param status_dict: juju status of the ns model
+        :return: tuple with the dictionary with the database update, and the new written state to be stored at
+            _vca_status_written once the update is written
+        """
+        now = time()
+        written = self._vca_status_written.get(nsr_id)
+        entry_types = ("machines", "applications")
+        full_write = not written or now - written["time"] > self.vca_status_full_refresh
+        if not full_write:
+            old_status = written["status"]
+            full_write = any(old_status.get(k) != v for k, v in status_dict.items() if k not in entry_types) or \
+                any(k not in status_dict for k in old_status) or \
+                any(entry_id not in (status_dict.get(entry_type) or {})
+                    for entry_type in entry_types for entry_id in (old_status.get(entry_type) or {}))
+        if full_write:
+            problems = OrderedDict()
+            for entry_type in entry_types:
+                for entry_id, entry in (status_dict.get(entry_type) or {}).items():
+                    problem = self._get_vca_status_problem(entry_type, entry_id, entry)
+                    if problem:
+                        problems[(entry_type, entry_id)] = problem
+            return {"vcaStatus": status_dict}, {"status": status_dict, "problems": problems, "time": now}
+
+        db_dict = {}
+        problems = OrderedDict(written["problems"])
+        for entry_type in entry_types:
+            old_entries = written["status"].get(entry_type) or {}
+            for entry_id, entry in (status_dict.get(entry_type) or {}).items():
+                if old_entries.get(entry_id) == entry:
+                    continue
+                db_dict["vcaStatus.{}.{}".format(entry_type, entry_id)] = entry
+                problem = self._get_vca_status_problem(entry_type, entry_id, entry)
+                if problem:
+                    problems[(entry_type, entry_id)] = problem
+                else:
+                    problems.pop((entry_type, entry_id), None)
+        return db_dict, {"status": status_dict, "problems": problems, "time": written["time"]}
+
+    async def _update_vca_status(self, nsr_id):
+        """
+        Updates vcaStatus, configurationStatus and nsState of a ns from the juju status, after the N2VC callbacks
+        """
+        await asyncio.sleep(self.vca_status_window, loop=self.loop)
+        lock = self._vca_status_locks.setdefault(nsr_id, asyncio.Lock())
+        async with lock:
+            await self._update_vca_status_pending(nsr_id)
+        # the lock is kept only while there are callbacks pending to be processed
+        if nsr_id not in self._vca_status_pending and self._vca_status_locks.get(nsr_id) is lock:
+            del self._vca_status_locks[nsr_id]
+
+    async def _update_vca_status_pending(self, nsr_id):
+        pending = self._vca_status_pending.pop(nsr_id)
+        try:
 
             # read ns record from database
-            nsr = self.db.get_one(table='nsrs', q_filter=filter)
+            nsr = await self.db_async.get_one(table='nsrs', q_filter=pending["filter"])
             current_ns_status = nsr.get('nsState')
 
             # get vca status for NS
             status_dict = await self.n2vc.get_status(namespace='.' + nsr_id, yaml_format=False)
 
             # vcaStatus
-            db_dict = dict()
-            db_dict['vcaStatus'] = status_dict
-
-            # update configurationStatus for this VCA
-            try:
-                vca_index = int(path[path.rfind(".")+1:])
-
-                vca_list = deep_get(target_dict=nsr, key_list=('_admin', 'deployed', 'VCA'))
-                vca_status = vca_list[vca_index].get('status')
-
-                configuration_status_list = nsr.get('configurationStatus')
-                config_status = configuration_status_list[vca_index].get('status')
+            db_dict, written = self._get_vca_status_update(nsr_id, status_dict)
 
+            # update configurationStatus for the VCAs notified
+            vca_list = deep_get(target_dict=nsr, key_list=('_admin', 'deployed', 'VCA')) or []
+            configuration_status_list = nsr.get('configurationStatus') or []
+            for vca_index in pending["vca_indexes"]:
+                try:
+                    vca_status = vca_list[vca_index].get('status')
+                    config_status = configuration_status_list[vca_index].get('status')
+                except Exception as e:
+                    # not update configurationStatus
+                    self.logger.debug('Error updating vca_index (ignore): {}'.format(e))
+                    continue
+                new_config_status = None
                 if config_status == 'BROKEN' and vca_status != 'failed':
-                    db_dict['configurationStatus'][vca_index] = 'READY'
+                    new_config_status = 'READY'
                 elif config_status != 'BROKEN' and vca_status == 'failed':
-                    db_dict['configurationStatus'][vca_index] = 'BROKEN'
-            except Exception as e:
-                # not update configurationStatus
-                self.logger.debug('Error updating vca_index (ignore): {}'.format(e))
+                    new_config_status = 'BROKEN'
+                if new_config_status:
+                    db_dict['configurationStatus.{}.status'.format(vca_index)] = new_config_status
+                    self._notify_vca_status(nsr_id, vca_index, new_config_status)
 
             # if nsState = 'READY' check if juju is reporting some error => nsState = 'DEGRADED'
             # if nsState = 'DEGRADED' check if all is OK
-            is_degraded = False
             if current_ns_status in ('READY', 'DEGRADED'):
-                error_description = ''
-                # check machines
-                if status_dict.get('machines'):
-                    for machine_id in status_dict.get('machines'):
-                        machine = status_dict.get('machines').get(machine_id)
-                        # check machine agent-status
-                        if machine.get('agent-status'):
-                            s = machine.get('agent-status').get('status')
-                            if s != 'started':
-                                is_degraded = True
-                                error_description += 'machine {} agent-status={} ; '.format(machine_id, s)
-                        # check machine instance status
-                        if machine.get('instance-status'):
-                            s = machine.get('instance-status').get('status')
-                            if s != 'running':
-                                is_degraded = True
-                                error_description += 'machine {} instance-status={} ; '.format(machine_id, s)
-                # check applications
-                if status_dict.get('applications'):
-                    for app_id in status_dict.get('applications'):
-                        app = status_dict.get('applications').get(app_id)
-                        # check application status
-                        if app.get('status'):
-                            s = app.get('status').get('status')
-                            if s != 'active':
-                                is_degraded = True
-                                error_description += 'application {} status={} ; '.format(app_id, s)
-
+                problems = written["problems"]
+                error_description = "".join(problems.values())
+                is_degraded = bool(problems)
                 if error_description:
                     db_dict['errorDescription'] = error_description
                 if current_ns_status == 'READY' and is_degraded:
@@ -272,12 +392,96 @@ class NsLcm(LcmBase):
 
             # write to database
             self.update_db_2("nsrs", nsr_id, db_dict)
+            # late callbacks after terminate must not keep the state
+            if deep_get(nsr, ("_admin", "nsState")) == "NOT_INSTANTIATED":
+                self._vca_status_written.pop(nsr_id, None)
+            else:
+                self._vca_status_written[nsr_id] = written
 
         except (asyncio.CancelledError, asyncio.TimeoutError):
             raise
         except Exception as e:
             self.logger.warn('Error updating NS state for ns={}: {}'.format(nsr_id, e))
 
+    @staticmethod
+    def _get_RO_shared_id(item, descriptor_RO):
+        """
+        Computes the osm_id of a RO descriptor shared among ns, as a fingerprint of its content
+        :param item: "vnfd" or "nsd"
+        :param descriptor_RO: RO descriptor content, as generated by vnfd2RO with the cloud-init rendered
+        :return: osm_id text
+        """
+        content = json.dumps(descriptor_RO, sort_keys=True, default=str)
+        return "shared.{}.{}".format(item, hashlib.sha256(content.encode()).hexdigest())
+
+    async def _lock_RO_shared(self, osm_id, nsr_id):
+        """
+        Locks a shared RO descriptor at database 'admin' table, so that only one ns at a time, at any LCM worker,
+        registers, checks, creates or deletes it. The lock expires after RO_SHARED_LOCKED_TIME, in case the worker
+        holding it dies
+        :param osm_id: osm_id of the shared RO descriptor
+        :param nsr_id: ns that locks it
+        :return: None. Raise LcmException if it cannot be locked
+        """
+        _id = "RO_shared:" + osm_id
+        time_limit = time() + 2 * self.RO_SHARED_LOCKED_TIME
+        wait_time = 0.5
+        while True:
+            now = time()
+            if await self.db_async.set_one("admin", {"_id": _id, "locked_at.lt": now - self.RO_SHARED_LOCKED_TIME},
+                                           {"locked_at": now, "locked_by": nsr_id}, fail_on_empty=False):
+                return
+            if not await self.db_async.get_one("admin", {"_id": _id}, fail_on_empty=False):
+                try:
+                    await self.db_async.create("admin", {"_id": _id, "users": {}, "locked_at": now,
+                                                         "locked_by": nsr_id})
+                    return
+                except DbException:
+                    pass  # created meanwhile by other worker
+            if now > time_limit:
+                raise LcmException("Timeout waiting for the lock of the shared RO descriptor {}".format(osm_id))
+            await asyncio.sleep(wait_time, loop=self.loop)
+            wait_time = min(wait_time * 2, 5)
+
+    async def _unlock_RO_shared(self, osm_id, nsr_id):
+        """
+        Unlocks a shared RO descriptor. The database entry is removed if no ns uses it
+        :param osm_id: osm_id of the shared RO descriptor
+        :param nsr_id: ns that locked it
+        :return: None
+        """
+        _id = "RO_shared:" + osm_id
+        db_shared = await self.db_async.get_one("admin", {"_id": _id, "locked_by": nsr_id}, fail_on_empty=False)
+        if not db_shared:
+            self.logger.warning("Lock of the shared RO descriptor {} expired before being released".format(osm_id))
+        elif db_shared.get("users"):
+            await self.db_async.set_one("admin", {"_id": _id, "locked_by": nsr_id},
+                                        {"locked_at": 0, "locked_by": None}, fail_on_empty=False)
+        else:
+            await self.db_async.del_one("admin", {"_id": _id, "locked_by": nsr_id}, fail_on_empty=False)
+
+    async def _acquire_RO_shared(self, osm_id, nsr_id):
+        """
+        Registers a ns as user of a shared RO descriptor at database 'admin' table. It is idempotent. It must be called
+        with the shared descriptor locked
+        :param osm_id: osm_id of the shared RO descriptor
+        :param nsr_id: ns using it
+        :return: None. Raise DbException on error
+        """
+        await self.db_async.set_one("admin", {"_id": "RO_shared:" + osm_id}, {"users." + nsr_id: time()})
+
+    async def _release_RO_shared(self, osm_id, nsr_id):
+        """
+        Unregisters a ns as user of a shared RO descriptor. It must be called with the shared descriptor locked
+        :param osm_id: osm_id of the shared RO descriptor
+        :param nsr_id: ns that does not use it anymore
+        :return: True if it was the last user, so that the descriptor must be deleted from RO
+        """
+        _id = "RO_shared:" + osm_id
+        await self.db_async.set_one("admin", {"_id": _id}, None, unset={"users." + nsr_id: None}, fail_on_empty=False)
+        db_shared = await self.db_async.get_one("admin", {"_id": _id}, fail_on_empty=False)
+        return not (db_shared and db_shared.get("users"))
+
     def vnfd2RO(self, vnfd, new_id=None, additionalParams=None, nsrId=None):
         """
         Converts creates a new vnfd descriptor for RO base on input OSM IM vnfd
@@ -307,24 +511,26 @@ class NsLcm(LcmBase):
                     base_folder = vnfd["_admin"]["storage"]
                     cloud_init_file = "{}/{}/cloud_init/{}".format(base_folder["folder"], base_folder["pkg-dir"],
                                                                    vdu["cloud-init-file"])
-                    with self.fs.file_open(cloud_init_file, "r") as ci_file:
-                        cloud_init_content = ci_file.read()
+
+                    def read_cloud_init_file():
+                        with self.fs.file_open(cloud_init_file, "r") as ci_file:
+                            return ci_file.read()
+
+                    # the file is read only once per package revision
+                    template, mandatory_vars = self.template_cache.get(
+                        key=(cloud_init_file, deep_get(vnfd, ("_admin", "modified"))),
+                        read_content=read_cloud_init_file)
                     vdu.pop("cloud-init-file", None)
                 elif vdu.get("cloud-init"):
-                    cloud_init_content = vdu["cloud-init"]
+                    template, mandatory_vars = self.template_cache.get(vdu["cloud-init"])
                 else:
                     continue
 
-                env = Environment()
-                ast = env.parse(cloud_init_content)
-                mandatory_vars = meta.find_undeclared_variables(ast)
-                if mandatory_vars:
-                    for var in mandatory_vars:
-                        if not additionalParams or var not in additionalParams.keys():
-                            raise LcmException("Variable '{}' defined at vnfd[id={}]:vdu[id={}]:cloud-init/cloud-init-"
-                                               "file, must be provided in the instantiation parameters inside the "
-                                               "'additionalParamsForVnf' block".format(var, vnfd["id"], vdu["id"]))
-                template = Template(cloud_init_content)
+                for var in mandatory_vars:
+                    if not additionalParams or var not in additionalParams.keys():
+                        raise LcmException("Variable '{}' defined at vnfd[id={}]:vdu[id={}]:cloud-init/cloud-init-"
+                                           "file, must be provided in the instantiation parameters inside the "
+                                           "'additionalParamsForVnf' block".format(var, vnfd["id"], vdu["id"]))
                 cloud_init_content = template.render(additionalParams or {})
                 vdu["cloud-init"] = cloud_init_content
 
@@ -652,27 +858,27 @@ class NsLcm(LcmBase):
         db_vnfr["vdur"] = vdurs
         self.update_db_2("vnfrs", db_vnfr["_id"], vnfr_update)
 
-    def ns_update_nsr(self, ns_update_nsr, db_nsr, nsr_desc_RO):
+    def ns_update_nsr(self, ns_update_nsr, db_nsr, nsr_desc_RO, ro_parsed=None):
         """
         Updates database nsr with the RO info for the created vld
         :param ns_update_nsr: dictionary to be filled with the updated info
         :param db_nsr: content of db_nsr. This is also modified
         :param nsr_desc_RO: nsr descriptor from RO
+        :param ro_parsed: nsr_desc_RO already parsed with ROClient.parse_ns_descriptor. None to parse it here
         :return: Nothing, LcmException is raised on errors
         """
+        if not ro_parsed:
+            ro_parsed = ROclient.ROClient.parse_ns_descriptor(nsr_desc_RO)
 
         for vld_index, vld in enumerate(get_iterable(db_nsr, "vld")):
-            for net_RO in get_iterable(nsr_desc_RO, "nets"):
-                if vld["id"] != net_RO.get("ns_net_osm_id"):
-                    continue
-                vld["vim-id"] = net_RO.get("vim_net_id")
-                vld["name"] = net_RO.get("vim_name")
-                vld["status"] = net_RO.get("status")
-                vld["status-detailed"] = net_RO.get("error_msg")
-                ns_update_nsr["vld.{}".format(vld_index)] = vld
-                break
-            else:
+            net_RO = ro_parsed["ns_nets"].get(vld["id"])
+            if not net_RO:
                 raise LcmException("ns_update_nsr: Not found vld={} at RO info".format(vld["id"]))
+            vld["vim-id"] = net_RO.get("vim_net_id")
+            vld["name"] = net_RO.get("vim_name")
+            vld["status"] = net_RO.get("status")
+            vld["status-detailed"] = net_RO.get("error_msg")
+            ns_update_nsr["vld.{}".format(vld_index)] = vld
 
     def set_vnfr_at_error(self, db_vnfrs, error_text):
         try:
@@ -686,81 +892,118 @@ class NsLcm(LcmBase):
                             vdur["status-detailed"] = str(error_text)
                             vnfr_update["vdur.{}.status-detailed".format(vdu_index)] = "ERROR"
                 self.update_db_2("vnfrs", db_vnfr["_id"], vnfr_update)
+                db_vnfr["status"] = "ERROR"
+                self._publish_vnfr_readiness(db_vnfr.get("nsr-id-ref"), db_vnfr)
         except DbException as e:
             self.logger.error("Cannot update vnf. {}".format(e))
 
-    def ns_update_vnfr(self, db_vnfrs, nsr_desc_RO):
+    @staticmethod
+    def _update_if_changed(record, new_values):
+        """
+        Sets new_values at record dictionary
+        :return: True if any value has changed
         """
-        Updates database vnfr with the RO info, e.g. ip_address, vim_id... Descriptor db_vnfrs is also updated
+        changed = False
+        for k, v in new_values.items():
+            if k not in record or record[k] != v:
+                record[k] = v
+                changed = True
+        return changed
+
+    def ns_update_vnfr(self, db_vnfrs, nsr_desc_RO, ro_parsed=None):
+        """
+        Updates database vnfr with the RO info, e.g. ip_address, vim_id... Descriptor db_vnfrs is also updated.
+        Only the changed vdur and vld are written
         :param db_vnfrs: dictionary with member-vnf-index: vnfr-content
         :param nsr_desc_RO: nsr descriptor from RO
+        :param ro_parsed: nsr_desc_RO already parsed with ROClient.parse_ns_descriptor. None to parse it here
         :return: Nothing, LcmException is raised on errors
         """
+        if not ro_parsed:
+            ro_parsed = ROclient.ROClient.parse_ns_descriptor(nsr_desc_RO)
         for vnf_index, db_vnfr in db_vnfrs.items():
-            for vnf_RO in nsr_desc_RO["vnfs"]:
-                if vnf_RO["member_vnf_index"] != vnf_index:
+            vnf_RO = ro_parsed["vnfs"].get(vnf_index)
+            if not vnf_RO:
+                raise LcmException("ns_update_vnfr: Not found member_vnf_index={} from VIM info".format(vnf_index))
+            vnfr_update = {}
+            if vnf_RO.get("ip_address"):
+                ip_address = vnf_RO["ip_address"].split(";")[0]
+                if db_vnfr.get("ip-address") != ip_address:
+                    db_vnfr["ip-address"] = vnfr_update["ip-address"] = ip_address
+            elif not db_vnfr.get("ip-address"):
+                if db_vnfr.get("vdur"):   # if not VDUs, there is not ip_address
+                    raise LcmExceptionNoMgmtIP("ns member_vnf_index '{}' has no IP address".format(vnf_index))
+
+            for vdu_index, vdur in enumerate(get_iterable(db_vnfr, "vdur")):
+                if vdur.get("pdu-type"):
                     continue
-                vnfr_update = {}
-                if vnf_RO.get("ip_address"):
-                    db_vnfr["ip-address"] = vnfr_update["ip-address"] = vnf_RO["ip_address"].split(";")[0]
-                elif not db_vnfr.get("ip-address"):
-                    if db_vnfr.get("vdur"):   # if not VDUs, there is not ip_address
-                        raise LcmExceptionNoMgmtIP("ns member_vnf_index '{}' has no IP address".format(vnf_index))
-
-                for vdu_index, vdur in enumerate(get_iterable(db_vnfr, "vdur")):
-                    vdur_RO_count_index = 0
-                    if vdur.get("pdu-type"):
-                        continue
-                    for vdur_RO in get_iterable(vnf_RO, "vms"):
-                        if vdur["vdu-id-ref"] != vdur_RO["vdu_osm_id"]:
-                            continue
-                        if vdur["count-index"] != vdur_RO_count_index:
-                            vdur_RO_count_index += 1
-                            continue
-                        vdur["vim-id"] = vdur_RO.get("vim_vm_id")
-                        if vdur_RO.get("ip_address"):
-                            vdur["ip-address"] = vdur_RO["ip_address"].split(";")[0]
-                        else:
-                            vdur["ip-address"] = None
-                        vdur["vdu-id-ref"] = vdur_RO.get("vdu_osm_id")
-                        vdur["name"] = vdur_RO.get("vim_name")
-                        vdur["status"] = vdur_RO.get("status")
-                        vdur["status-detailed"] = vdur_RO.get("error_msg")
-                        for ifacer in get_iterable(vdur, "interfaces"):
-                            for interface_RO in get_iterable(vdur_RO, "interfaces"):
-                                if ifacer["name"] == interface_RO.get("internal_name"):
-                                    ifacer["ip-address"] = interface_RO.get("ip_address")
-                                    ifacer["mac-address"] = interface_RO.get("mac_address")
-                                    break
-                            else:
-                                raise LcmException("ns_update_vnfr: Not found member_vnf_index={} vdur={} interface={} "
-                                                   "from VIM info"
-                                                   .format(vnf_index, vdur["vdu-id-ref"], ifacer["name"]))
-                        vnfr_update["vdur.{}".format(vdu_index)] = vdur
-                        break
-                    else:
-                        raise LcmException("ns_update_vnfr: Not found member_vnf_index={} vdur={} count_index={} from "
-                                           "VIM info".format(vnf_index, vdur["vdu-id-ref"], vdur["count-index"]))
-
-                for vld_index, vld in enumerate(get_iterable(db_vnfr, "vld")):
-                    for net_RO in get_iterable(nsr_desc_RO, "nets"):
-                        if vld["id"] != net_RO.get("vnf_net_osm_id"):
-                            continue
-                        vld["vim-id"] = net_RO.get("vim_net_id")
-                        vld["name"] = net_RO.get("vim_name")
-                        vld["status"] = net_RO.get("status")
-                        vld["status-detailed"] = net_RO.get("error_msg")
-                        vnfr_update["vld.{}".format(vld_index)] = vld
-                        break
-                    else:
-                        raise LcmException("ns_update_vnfr: Not found member_vnf_index={} vld={} from VIM info".format(
-                            vnf_index, vld["id"]))
-
+                vdurs_RO = ro_parsed["vms"].get((vnf_index, vdur["vdu-id-ref"]), ())
+                if vdur["count-index"] >= len(vdurs_RO):
+                    raise LcmException("ns_update_vnfr: Not found member_vnf_index={} vdur={} count_index={} from "
+                                       "VIM info".format(vnf_index, vdur["vdu-id-ref"], vdur["count-index"]))
+                vdur_RO = vdurs_RO[vdur["count-index"]]
+                changed = self._update_if_changed(vdur, {
+                    "vim-id": vdur_RO.get("vim_vm_id"),
+                    "ip-address": vdur_RO["ip_address"].split(";")[0] if vdur_RO.get("ip_address") else None,
+                    "vdu-id-ref": vdur_RO.get("vdu_osm_id"),
+                    "name": vdur_RO.get("vim_name"),
+                    "status": vdur_RO.get("status"),
+                    "status-detailed": vdur_RO.get("error_msg"),
+                })
+                interfaces_RO = {}
+                for interface_RO in get_iterable(vdur_RO, "interfaces"):
+                    interfaces_RO.setdefault(interface_RO.get("internal_name"), interface_RO)
+                for ifacer in get_iterable(vdur, "interfaces"):
+                    interface_RO = interfaces_RO.get(ifacer["name"])
+                    if not interface_RO:
+                        raise LcmException("ns_update_vnfr: Not found member_vnf_index={} vdur={} interface={} "
+                                           "from VIM info".format(vnf_index, vdur["vdu-id-ref"], ifacer["name"]))
+                    if self._update_if_changed(ifacer, {"ip-address": interface_RO.get("ip_address"),
+                                                        "mac-address": interface_RO.get("mac_address")}):
+                        changed = True
+                if changed:
+                    vnfr_update["vdur.{}".format(vdu_index)] = vdur
+
+            for vld_index, vld in enumerate(get_iterable(db_vnfr, "vld")):
+                net_RO = ro_parsed["vnf_nets"].get(vld["id"])
+                if not net_RO:
+                    raise LcmException("ns_update_vnfr: Not found member_vnf_index={} vld={} from VIM info".format(
+                        vnf_index, vld["id"]))
+                if self._update_if_changed(vld, {"vim-id": net_RO.get("vim_net_id"),
+                                                 "name": net_RO.get("vim_name"),
+                                                 "status": net_RO.get("status"),
+                                                 "status-detailed": net_RO.get("error_msg")}):
+                    vnfr_update["vld.{}".format(vld_index)] = vld
+
+            if vnfr_update:
                 self.update_db_2("vnfrs", db_vnfr["_id"], vnfr_update)
-                break
+                self._publish_vnfr_readiness(db_vnfr.get("nsr-id-ref"), db_vnfr)
 
-            else:
-                raise LcmException("ns_update_vnfr: Not found member_vnf_index={} from VIM info".format(vnf_index))
+    def _publish_vnfr_readiness(self, nsr_id, db_vnfr=None):
+        """
+        Wakes up the wait_vm_up_insert_key_ro calls of a ns, because its vnfrs have been updated
+        :param nsr_id: ns instance id
+        :param db_vnfr: vnfr content updated by this worker, that is used by the waiters instead of reading database.
+            None if the vnfrs have been updated at database by other component (e.g. NG-RO)
+        :return: None
+        """
+        readiness = self._vnfr_readiness.setdefault(nsr_id, {"vnfrs": {}, "waiters": []})
+        if db_vnfr:
+            readiness["vnfrs"][db_vnfr["_id"]] = db_vnfr
+        for waiter in readiness["waiters"]:
+            if not waiter.done():
+                waiter.set_result(None)
+        readiness["waiters"].clear()
+
+    async def _wait_vnfr_readiness(self, nsr_id, timeout):
+        readiness = self._vnfr_readiness.setdefault(nsr_id, {"vnfrs": {}, "waiters": []})
+        waiter = self.loop.create_future()
+        readiness["waiters"].append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            if waiter in readiness["waiters"]:
+                readiness["waiters"].remove(waiter)
 
     def _get_ns_config_info(self, nsr_id):
         """
@@ -822,21 +1065,32 @@ class NsLcm(LcmBase):
             primitive_list.insert(config_position + 1, {"name": "verify-ssh-credentials", "parameter": []})
         return primitive_list
 
-    async def _instantiate_ng_ro(self, logging_text, nsr_id, nsd, db_nsr, db_nslcmop, db_vnfrs, db_vnfds_ref,
-                                 n2vc_key_list, stage, start_deploy, timeout_ns_deploy):
+    @staticmethod
+    def _get_ng_ro_target(nsr_id, nsd, db_nsr, db_nslcmop, db_vnfrs, db_vnfds_ref, n2vc_key_list):
+        """
+        Builds the NG-RO deploy target of a ns. Descriptors are indexed once, so that the cost is linear with the
+        number of vdur. Records are not modified; only the target items that are changed are copied
+        :param nsr_id: nsr identity
+        :param nsd: database content of ns descriptor
+        :param db_nsr: database content of ns record
+        :param db_nslcmop: database content of ns operation, in this case, 'instantiate'
+        :param db_vnfrs: database content of vnfrs, indexed by member-vnf-index
+        :param db_vnfds_ref: database content of vnfds, indexed by id (not _id)
+        :param n2vc_key_list: ssh-public-key list to be inserted to management vdus via cloud-init
+        :return: target dictionary
+        """
         nslcmop_id = db_nslcmop["_id"]
         target = {
             "name": db_nsr["name"],
             "ns": {"vld": []},
             "vnf": [],
-            "image": deepcopy(db_nsr["image"]),
-            "flavor": deepcopy(db_nsr["flavor"]),
+            "image": [dict(image, vim_info=[]) for image in db_nsr["image"]],
+            "flavor": [dict(flavor, vim_info=[]) for flavor in db_nsr["flavor"]],
             "action_id": nslcmop_id,
         }
-        for image in target["image"]:
-            image["vim_info"] = []
-        for flavor in target["flavor"]:
-            flavor["vim_info"] = []
+        # vim accounts already added to each image and flavor vim_info
+        image_vims = [set() for _ in target["image"]]
+        flavor_vims = [set() for _ in target["flavor"]]
 
         ns_params = db_nslcmop.get("operationParams")
         ssh_keys = []
@@ -858,31 +1112,45 @@ class NsLcm(LcmBase):
                 cp2target["member_vnf:{}.{}".format(cp["member-vnf-index-ref"], cp["vnfd-connection-point-ref"])] = \
                     "nsrs:{}:vld.{}".format(nsr_id, vld_index)
             target["ns"]["vld"].append(target_vld)
+
+        vnfd_indexes = {}  # vnfd id: (vdu id: (index, vdud), internal-vld-ref: connection point, ssh-access required)
         for vnfr in db_vnfrs.values():
             vnfd = db_vnfds_ref[vnfr["vnfd-ref"]]
-            target_vnf = deepcopy(vnfr)
+            if vnfr["vnfd-ref"] not in vnfd_indexes:
+                vdu_index = {vdud["id"]: (index, vdud) for index, vdud in reversed(list(enumerate(vnfd["vdu"])))}
+                vld_cp_index = {}
+                for cp in vnfd.get("connection-point", ()):
+                    if cp.get("internal-vld-ref"):
+                        vld_cp_index.setdefault(cp["internal-vld-ref"], cp)
+                vnf_ssh_required = deep_get(vnfd, ("vnf-configuration", "config-access", "ssh-access", "required"))
+                vnfd_indexes[vnfr["vnfd-ref"]] = (vdu_index, vld_cp_index, vnf_ssh_required)
+            vdu_index, vld_cp_index, vnf_ssh_required = vnfd_indexes[vnfr["vnfd-ref"]]
+            vim_account_id = vnfr["vim-account-id"]
+
+            target_vnf = dict(vnfr)
+            if "vld" in vnfr:
+                target_vnf["vld"] = [dict(vld) for vld in vnfr["vld"]]
             for vld in target_vnf.get("vld", ()):
                 # check if connected to a ns.vld
-                vnf_cp = next((cp for cp in vnfd.get("connection-point", ()) if
-                               cp.get("internal-vld-ref") == vld["id"]), None)
+                vnf_cp = vld_cp_index.get(vld["id"])
                 if vnf_cp:
                     ns_cp = "member_vnf:{}.{}".format(vnfr["member-vnf-index-ref"], vnf_cp["id"])
                     if cp2target.get(ns_cp):
                         vld["target"] = cp2target[ns_cp]
                 vld["vim_info"] = [{"vim-network-name": vld.get("vim-network-name"),
-                                    "vim_account_id": vnfr["vim-account-id"]}]
+                                    "vim_account_id": vim_account_id}]
 
+            if "vdur" in vnfr:
+                target_vnf["vdur"] = [dict(vdur) for vdur in vnfr["vdur"]]
             for vdur in target_vnf.get("vdur", ()):
-                vdur["vim_info"] = [{"vim_account_id": vnfr["vim-account-id"]}]
-                vdud_index, vdud = next(k for k in enumerate(vnfd["vdu"]) if k[1]["id"] == vdur["vdu-id-ref"])
+                vdud_index, vdud = vdu_index[vdur["vdu-id-ref"]]
                 # vdur["additionalParams"] = vnfr.get("additionalParamsForVnf")  # TODO additional params for VDU
 
                 if ssh_keys:
                     if deep_get(vdud, ("vdu-configuration", "config-access", "ssh-access", "required")):
                         vdur["ssh-keys"] = ssh_keys
                         vdur["ssh-access-required"] = True
-                    elif deep_get(vnfd, ("vnf-configuration", "config-access", "ssh-access", "required")) and \
-                            any(iface.get("mgmt-vnf") for iface in vdur["interfaces"]):
+                    elif vnf_ssh_required and any(iface.get("mgmt-vnf") for iface in vdur["interfaces"]):
                         vdur["ssh-keys"] = ssh_keys
                         vdur["ssh-access-required"] = True
 
@@ -893,22 +1161,29 @@ class NsLcm(LcmBase):
                     vdur["cloud-init"] = "{}:vdu:{}".format(vnfd["_id"], vdud_index)
 
                 # flavor
-                ns_flavor = target["flavor"][int(vdur["ns-flavor-id"])]
-                if not next((vi for vi in ns_flavor["vim_info"] if
-                             vi and vi.get("vim_account_id") == vnfr["vim-account-id"]), None):
-                    ns_flavor["vim_info"].append({"vim_account_id": vnfr["vim-account-id"]})
+                flavor_index = int(vdur["ns-flavor-id"])
+                if vim_account_id not in flavor_vims[flavor_index]:
+                    flavor_vims[flavor_index].add(vim_account_id)
+                    target["flavor"][flavor_index]["vim_info"].append({"vim_account_id": vim_account_id})
                 # image
-                ns_image = target["image"][int(vdur["ns-image-id"])]
-                if not next((vi for vi in ns_image["vim_info"] if
-                             vi and vi.get("vim_account_id") == vnfr["vim-account-id"]), None):
-                    ns_image["vim_info"].append({"vim_account_id": vnfr["vim-account-id"]})
+                image_index = int(vdur["ns-image-id"])
+                if vim_account_id not in image_vims[image_index]:
+                    image_vims[image_index].add(vim_account_id)
+                    target["image"][image_index]["vim_info"].append({"vim_account_id": vim_account_id})
 
-                vdur["vim_info"] = [{"vim_account_id": vnfr["vim-account-id"]}]
+                vdur["vim_info"] = [{"vim_account_id": vim_account_id}]
             target["vnf"].append(target_vnf)
+        return target
 
+    async def _instantiate_ng_ro(self, logging_text, nsr_id, nsd, db_nsr, db_nslcmop, db_vnfrs, db_vnfds_ref,
+                                 n2vc_key_list, stage, start_deploy, timeout_ns_deploy):
+        nslcmop_id = db_nslcmop["_id"]
+        ns_params = db_nslcmop.get("operationParams")
+        target = self._get_ng_ro_target(nsr_id, nsd, db_nsr, db_nslcmop, db_vnfrs, db_vnfds_ref, n2vc_key_list)
         desc = await self.RO.deploy(nsr_id, target)
         action_id = desc["action_id"]
-        await self._wait_ng_ro(self, nsr_id, action_id, nslcmop_id, start_deploy, timeout_ns_deploy, stage)
+        await self._wait_ng_ro(nsr_id, action_id, nslcmop_id, start_deploy, timeout_ns_deploy, stage,
+                               ns_params["vimAccountId"])
 
         # Updating NSR
         db_nsr_update = {
@@ -921,9 +1196,22 @@ class NsLcm(LcmBase):
         self.logger.debug(logging_text + "ns deployed at RO. RO_id={}".format(action_id))
         return
 
-    async def _wait_ng_ro(self, nsr_id, action_id, nslcmop_id, start_time, timeout, stage):
+    async def _get_poll_backoff(self, vim_account_id):
+        """
+        Obtains the polling strategy for an operation at RO, with the overrides of the VIM type
+        :param vim_account_id: VIM account _id where the operation is done. None for the default polling
+        :return: PollBackoff
+        """
+        vim_type = None
+        if vim_account_id and self.polling_config.get("vim_type"):
+            db_vim = await self.db_async.get_one("vim_accounts", {"_id": vim_account_id}, fail_on_empty=False)
+            vim_type = db_vim.get("vim_type") if db_vim else None
+        return PollBackoff(self.polling_config, vim_type, loop=self.loop)
+
+    async def _wait_ng_ro(self, nsr_id, action_id, nslcmop_id, start_time, timeout, stage, vim_account_id=None):
         detailed_status_old = None
         db_nsr_update = {}
+        poll_backoff = await self._get_poll_backoff(vim_account_id)
         while time() <= start_time + timeout:
             desc_status = await self.RO.status(nsr_id, action_id)
             if desc_status["status"] == "FAILED":
@@ -932,6 +1220,8 @@ class NsLcm(LcmBase):
                 stage[2] = "VIM: ({})".format(desc_status["details"])
             elif desc_status["status"] == "DONE":
                 stage[2] = "Deployed at VIM"
+                # NG-RO has written the vnfrs
+                self._publish_vnfr_readiness(nsr_id)
                 break
             else:
                 assert False, "ROclient.check_ns_status returns unknown {}".format(desc_status["status"])
@@ -940,11 +1230,14 @@ class NsLcm(LcmBase):
                 db_nsr_update["detailed-status"] = " ".join(stage)
                 self.update_db_2("nsrs", nsr_id, db_nsr_update)
                 self._write_op_status(nslcmop_id, stage)
-            await asyncio.sleep(5, loop=self.loop)
+                # progress at NG-RO, that can have written vdur status and ip addresses at vnfrs
+                self._publish_vnfr_readiness(nsr_id)
+                poll_backoff.progress()
+            await poll_backoff.wait()
         else:  # timeout_ns_deploy
             raise NgRoException("Timeout waiting ns to deploy")
 
-    async def _terminate_ng_ro(self, logging_text, nsr_deployed, nsr_id, nslcmop_id, stage):
+    async def _terminate_ng_ro(self, logging_text, nsr_deployed, nsr_id, nslcmop_id, stage, vim_account_id=None):
         db_nsr_update = {}
         failed_detail = []
         action_id = None
@@ -964,7 +1257,8 @@ class NsLcm(LcmBase):
 
             # wait until done
             delete_timeout = 20 * 60  # 20 minutes
-            await self._wait_ng_ro(self, nsr_id, action_id, nslcmop_id, start_deploy, delete_timeout, stage)
+            await self._wait_ng_ro(nsr_id, action_id, nslcmop_id, start_deploy, delete_timeout, stage,
+                                   vim_account_id)
 
             db_nsr_update["_admin.deployed.RO.nsr_delete_action_id"] = None
             db_nsr_update["_admin.deployed.RO.nsr_status"] = "DELETED"
@@ -1049,7 +1343,13 @@ class NsLcm(LcmBase):
                 self._write_op_status(nslcmop_id, stage)
 
                 # self.logger.debug(logging_text + stage[2])
-                vnfd_id_RO = "{}.{}.{}".format(nsr_id, RO_descriptor_number, member_vnf_index[:23])
+                vnfd_RO = None
+                if self.ro_shared_descriptors:
+                    vnfd_RO = self.vnfd2RO(vnfd, None, db_vnfrs[member_vnf_index].get("additionalParamsForVnf"),
+                                           nsr_id)
+                    vnfd_id_RO = vnfd_RO["id"] = self._get_RO_shared_id("vnfd", vnfd_RO)
+                else:
+                    vnfd_id_RO = "{}.{}.{}".format(nsr_id, RO_descriptor_number, member_vnf_index[:23])
                 vnf_index_2_RO_id[member_vnf_index] = vnfd_id_RO
                 RO_descriptor_number += 1
 
@@ -1063,18 +1363,34 @@ class NsLcm(LcmBase):
 
                 # look if present
                 RO_update = {"member-vnf-index": member_vnf_index}
-                vnfd_list = await self.RO.get_list("vnfd", filter_by={"osm_id": vnfd_id_RO})
-                if vnfd_list:
-                    RO_update["id"] = vnfd_list[0]["uuid"]
-                    self.logger.debug(logging_text + "vnfd='{}'  member_vnf_index='{}' exists at RO. Using RO_id={}".
-                                      format(vnfd_ref, member_vnf_index, vnfd_list[0]["uuid"]))
-                else:
-                    vnfd_RO = self.vnfd2RO(vnfd, vnfd_id_RO, db_vnfrs[c_vnf["member-vnf-index"]].
-                                           get("additionalParamsForVnf"), nsr_id)
-                    desc = await self.RO.create("vnfd", descriptor=vnfd_RO)
-                    RO_update["id"] = desc["uuid"]
-                    self.logger.debug(logging_text + "vnfd='{}' member_vnf_index='{}' created at RO. RO_id={}".format(
-                        vnfd_ref, member_vnf_index, desc["uuid"]))
+                if self.ro_shared_descriptors:
+                    RO_update["shared_id"] = vnfd_id_RO
+                    await self._lock_RO_shared(vnfd_id_RO, nsr_id)
+                try:
+                    if self.ro_shared_descriptors:
+                        await self._acquire_RO_shared(vnfd_id_RO, nsr_id)
+                    vnfd_list = await self.RO.get_list("vnfd", filter_by={"osm_id": vnfd_id_RO})
+                    if vnfd_list:
+                        RO_update["id"] = vnfd_list[0]["uuid"]
+                        self.logger.debug(logging_text + "vnfd='{}'  member_vnf_index='{}' exists at RO. Using "
+                                          "RO_id={}".format(vnfd_ref, member_vnf_index, vnfd_list[0]["uuid"]))
+                    else:
+                        if not vnfd_RO:
+                            vnfd_RO = self.vnfd2RO(vnfd, vnfd_id_RO, db_vnfrs[c_vnf["member-vnf-index"]].
+                                                   get("additionalParamsForVnf"), nsr_id)
+                        desc = await self.RO.create("vnfd", descriptor=vnfd_RO)
+                        RO_update["id"] = desc["uuid"]
+                        self.logger.debug(logging_text + "vnfd='{}' member_vnf_index='{}' created at RO. RO_id={}".
+                                          format(vnfd_ref, member_vnf_index, desc["uuid"]))
+                except Exception:
+                    if self.ro_shared_descriptors:
+                        # do not leave the descriptor at RO without users
+                        await self._release_RO_shared_on_error(logging_text, "vnfd", RO_update.get("id"), vnfd_id_RO,
+                                                               nsr_id)
+                    raise
+                finally:
+                    if self.ro_shared_descriptors:
+                        await self._unlock_RO_shared(vnfd_id_RO, nsr_id)
                 db_nsr_update["_admin.deployed.RO.vnfd.{}".format(index)] = RO_update
                 db_nsr["_admin"]["deployed"]["RO"]["vnfd"][index] = RO_update
 
@@ -1087,30 +1403,47 @@ class NsLcm(LcmBase):
             self._write_op_status(nslcmop_id, stage)
 
             # self.logger.debug(logging_text + stage[2])
-            RO_osm_nsd_id = "{}.{}.{}".format(nsr_id, RO_descriptor_number, nsd_ref[:23])
-            RO_descriptor_number += 1
-            nsd_list = await self.RO.get_list("nsd", filter_by={"osm_id": RO_osm_nsd_id})
-            if nsd_list:
-                db_nsr_update["_admin.deployed.RO.nsd_id"] = RO_nsd_uuid = nsd_list[0]["uuid"]
-                self.logger.debug(logging_text + "nsd={} exists at RO. Using RO_id={}".format(
-                    nsd_ref, RO_nsd_uuid))
+            nsd_RO = deepcopy(nsd)
+            nsd_RO.pop("_id", None)
+            nsd_RO.pop("_admin", None)
+            for c_vnf in nsd_RO.get("constituent-vnfd", ()):
+                member_vnf_index = c_vnf["member-vnf-index"]
+                c_vnf["vnfd-id-ref"] = vnf_index_2_RO_id[member_vnf_index]
+            for c_vld in nsd_RO.get("vld", ()):
+                for cp in c_vld.get("vnfd-connection-point-ref", ()):
+                    member_vnf_index = cp["member-vnf-index-ref"]
+                    cp["vnfd-id-ref"] = vnf_index_2_RO_id[member_vnf_index]
+            if self.ro_shared_descriptors:
+                # vnfd-id-ref are already fingerprints of the shared vnfds
+                RO_osm_nsd_id = self._get_RO_shared_id("nsd", nsd_RO)
+                db_nsr_update["_admin.deployed.RO.nsd_shared_id"] = RO_osm_nsd_id
+                await self._lock_RO_shared(RO_osm_nsd_id, nsr_id)
             else:
-                nsd_RO = deepcopy(nsd)
-                nsd_RO["id"] = RO_osm_nsd_id
-                nsd_RO.pop("_id", None)
-                nsd_RO.pop("_admin", None)
-                for c_vnf in nsd_RO.get("constituent-vnfd", ()):
-                    member_vnf_index = c_vnf["member-vnf-index"]
-                    c_vnf["vnfd-id-ref"] = vnf_index_2_RO_id[member_vnf_index]
-                for c_vld in nsd_RO.get("vld", ()):
-                    for cp in c_vld.get("vnfd-connection-point-ref", ()):
-                        member_vnf_index = cp["member-vnf-index-ref"]
-                        cp["vnfd-id-ref"] = vnf_index_2_RO_id[member_vnf_index]
-
-                desc = await self.RO.create("nsd", descriptor=nsd_RO)
-                db_nsr_update["_admin.nsState"] = "INSTANTIATED"
-                db_nsr_update["_admin.deployed.RO.nsd_id"] = RO_nsd_uuid = desc["uuid"]
-                self.logger.debug(logging_text + "nsd={} created at RO. RO_id={}".format(nsd_ref, RO_nsd_uuid))
+                RO_osm_nsd_id = "{}.{}.{}".format(nsr_id, RO_descriptor_number, nsd_ref[:23])
+            nsd_RO["id"] = RO_osm_nsd_id
+            RO_descriptor_number += 1
+            try:
+                if self.ro_shared_descriptors:
+                    await self._acquire_RO_shared(RO_osm_nsd_id, nsr_id)
+                nsd_list = await self.RO.get_list("nsd", filter_by={"osm_id": RO_osm_nsd_id})
+                if nsd_list:
+                    db_nsr_update["_admin.deployed.RO.nsd_id"] = RO_nsd_uuid = nsd_list[0]["uuid"]
+                    self.logger.debug(logging_text + "nsd={} exists at RO. Using RO_id={}".format(
+                        nsd_ref, RO_nsd_uuid))
+                else:
+                    desc = await self.RO.create("nsd", descriptor=nsd_RO)
+                    db_nsr_update["_admin.nsState"] = "INSTANTIATED"
+                    db_nsr_update["_admin.deployed.RO.nsd_id"] = RO_nsd_uuid = desc["uuid"]
+                    self.logger.debug(logging_text + "nsd={} created at RO. RO_id={}".format(nsd_ref, RO_nsd_uuid))
+            except Exception:
+                if self.ro_shared_descriptors:
+                    # do not leave the descriptor at RO without users
+                    await self._release_RO_shared_on_error(logging_text, "nsd", db_nsr_update.get(
+                        "_admin.deployed.RO.nsd_id"), RO_osm_nsd_id, nsr_id)
+                raise
+            finally:
+                if self.ro_shared_descriptors:
+                    await self._unlock_RO_shared(RO_osm_nsd_id, nsr_id)
             self.update_db_2("nsrs", nsr_id, db_nsr_update)
 
             # Crate ns at RO
@@ -1187,16 +1520,19 @@ class NsLcm(LcmBase):
             self.logger.debug(logging_text + stage[2] + " RO_ns_id={}".format(RO_nsr_id))
 
             old_desc = None
+            poll_backoff = await self._get_poll_backoff(ns_params["vimAccountId"])
             while time() <= start_deploy + timeout_ns_deploy:
                 desc = await self.RO.show("ns", RO_nsr_id)
 
                 # deploymentStatus
                 if desc != old_desc:
+                    poll_backoff.progress()
                     # desc has changed => update db
                     self._on_update_ro_db(nsrs_id=nsr_id, ro_descriptor=desc)
                     old_desc = desc
 
-                    ns_status, ns_status_info = self.RO.check_ns_status(desc)
+                    ro_parsed = self.RO.parse_ns_descriptor(desc)
+                    ns_status, ns_status_info = ro_parsed["status"], ro_parsed["status_info"]
                     db_nsr_update["_admin.deployed.RO.nsr_status"] = ns_status
                     if ns_status == "ERROR":
                         raise ROclient.ROClientException(ns_status_info)
@@ -1205,7 +1541,7 @@ class NsLcm(LcmBase):
                     elif ns_status == "ACTIVE":
                         stage[2] = "Waiting for management IP address reported by the VIM. Updating VNFRs."
                         try:
-                            self.ns_update_vnfr(db_vnfrs, desc)
+                            self.ns_update_vnfr(db_vnfrs, desc, ro_parsed)
                             break
                         except LcmExceptionNoMgmtIP:
                             pass
@@ -1216,12 +1552,12 @@ class NsLcm(LcmBase):
                         db_nsr_update["detailed-status"] = " ".join(stage)
                         self.update_db_2("nsrs", nsr_id, db_nsr_update)
                         self._write_op_status(nslcmop_id, stage)
-                    await asyncio.sleep(5, loop=self.loop)
+                await poll_backoff.wait()
             else:  # timeout_ns_deploy
                 raise ROclient.ROClientException("Timeout waiting ns to be ready")
 
             # Updating NSR
-            self.ns_update_nsr(db_nsr_update, db_nsr, desc)
+            self.ns_update_nsr(db_nsr_update, db_nsr, desc, ro_parsed)
 
             db_nsr_update["_admin.deployed.RO.operational-status"] = "running"
             # db_nsr["_admin.deployed.RO.detailed-status"] = "Deployed at VIM"
@@ -1254,19 +1590,23 @@ class NsLcm(LcmBase):
         ip_address = None
         nb_tries = 0
         target_vdu_id = None
-        ro_retries = 0
+        time_limit = time() + 3600  # 1 hour
+        wait_readiness = False
 
         while True:
 
-            ro_retries += 1
-            if ro_retries >= 360:  # 1 hour
+            if time() >= time_limit:
                 raise LcmException("Not found _admin.deployed.RO.nsr_id for nsr_id: {}".format(nsr_id))
 
-            await asyncio.sleep(10, loop=self.loop)
+            # wait until vnfrs are updated from RO. Database is read every 30 seconds without updates as a fallback
+            if wait_readiness:
+                await self._wait_vnfr_readiness(nsr_id, 30)
+            wait_readiness = True
 
             # get ip address
             if not target_vdu_id:
-                db_vnfr = self.db.get_one("vnfrs", {"_id": vnfr_id})
+                db_vnfr = deep_get(self._vnfr_readiness, (nsr_id, "vnfrs", vnfr_id)) or \
+                    await self.db_async.get_one("vnfrs", {"_id": vnfr_id})
 
                 if not vdu_id:  # for the VNF case
                     if db_vnfr.get("status") == "ERROR":
@@ -1300,7 +1640,7 @@ class NsLcm(LcmBase):
             if pub_key and user:
                 # wait until NS is deployed at RO
                 if not ro_nsr_id:
-                    db_nsrs = self.db.get_one("nsrs", {"_id": nsr_id})
+                    db_nsrs = await self.db_async.get_one("nsrs", {"_id": nsr_id})
                     ro_nsr_id = deep_get(db_nsrs, ("_admin", "deployed", "RO", "nsr_id"))
                 if not ro_nsr_id:
                     continue
@@ -1316,6 +1656,7 @@ class NsLcm(LcmBase):
                                   "vnf": [{"_id": vnfr_id, "vdur": [{"id": vdu_id}]}],
                                   }
                         await self.RO.deploy(nsr_id, target)
+                        break
                     else:
                         result_dict = await self.RO.create_action(
                             item="ns",
@@ -1341,44 +1682,83 @@ class NsLcm(LcmBase):
                     nb_tries += 1
                     if nb_tries >= 20:
                         raise LcmException("Reaching max tries injecting key. Error: {}".format(e))
+                    await asyncio.sleep(10, loop=self.loop)
+                    wait_readiness = False
             else:
                 break
 
         return ip_address
 
-    async def _wait_dependent_n2vc(self, nsr_id, vca_deployed_list, vca_index):
+    @staticmethod
+    def _get_vca_dependencies(vca_deployed_list, vca_index):
         """
-        Wait until dependent VCA deployments have been finished. NS wait for VNFs and VDUs. VNFs for VDUs
+        Obtain the VCAs that must be configured before this one: a NS waits for all VNFs, VDUs and KDUs; a VNF waits
+        for its VDUs and KDUs; VDUs and KDUs have no dependencies
+        :param vca_deployed_list: content of _admin.deployed.VCA
+        :param vca_index: index of this VCA
+        :return: list of indexes of the dependent VCAs
         """
         my_vca = vca_deployed_list[vca_index]
         if my_vca.get("vdu_id") or my_vca.get("kdu_name"):
-            # vdu or kdu: no dependencies
+            return []
+        if not my_vca.get("member-vnf-index"):
+            return [index for index, vca in enumerate(vca_deployed_list) if vca.get("member-vnf-index")]
+        return [index for index, vca in enumerate(vca_deployed_list)
+                if vca.get("member-vnf-index") == my_vca["member-vnf-index"] and
+                (vca.get("vdu_id") or vca.get("kdu_name"))]
+
+    def _notify_vca_status(self, nsr_id, vca_index, status):
+        self._vca_status.setdefault(nsr_id, {})[vca_index] = status
+        relations_index = self._vca_relations.get(nsr_id)
+        if status == "BROKEN" and relations_index:
+            relations_index["broken"].update(relations_index["vca_entities"].get(vca_index, ()))
+            self._wake_vca_relations(nsr_id)
+        for waiter in self._vca_status_waiters.pop(nsr_id, ()):
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def _wait_dependent_n2vc(self, nsr_id, vca_deployed_list, vca_index):
+        """
+        Wait until dependent VCA deployments have been finished. NS wait for VNFs and VDUs. VNFs for VDUs.
+        It is woken up when a VCA of this ns configured by this worker changes its status. Database is checked at
+        start and, as a fallback in case a dependency is configured by other worker, every 10 seconds without changes
+        """
+        dependencies = self._get_vca_dependencies(vca_deployed_list, vca_index)
+        if not dependencies:
             return
-        timeout = 300
-        while timeout >= 0:
-            db_nsr = self.db.get_one("nsrs", {"_id": nsr_id})
-            vca_deployed_list = db_nsr["_admin"]["deployed"]["VCA"]
-            configuration_status_list = db_nsr["configurationStatus"]
-            for index, vca_deployed in enumerate(configuration_status_list):
-                if index == vca_index:
-                    # myself
-                    continue
-                if not my_vca.get("member-vnf-index") or \
-                        (vca_deployed.get("member-vnf-index") == my_vca.get("member-vnf-index")):
-                    internal_status = configuration_status_list[index].get("status")
-                    if internal_status == 'READY':
-                        continue
-                    elif internal_status == 'BROKEN':
-                        raise LcmException("Configuration aborted because dependent charm/s has failed")
-                    else:
-                        break
-            else:
-                # no dependencies, return
+        time_limit = time() + 3000
+        db_status = {}
+        check_db = True
+        while True:
+            if check_db:
+                db_nsr = await self.db_async.get_one("nsrs", {"_id": nsr_id})
+                configuration_status_list = db_nsr.get("configurationStatus") or []
+                db_status = {index: configuration_status_list[index].get("status") for index in dependencies
+                             if index < len(configuration_status_list) and configuration_status_list[index]}
+            local_status = self._vca_status.get(nsr_id, {})
+            pending = False
+            for index in dependencies:
+                internal_status = local_status.get(index) or db_status.get(index)
+                if internal_status == 'BROKEN':
+                    raise LcmException("Configuration aborted because dependent charm/s has failed")
+                elif internal_status != 'READY':
+                    pending = True
+            if not pending:
                 return
-            await asyncio.sleep(10)
-            timeout -= 1
-
-        raise LcmException("Configuration aborted because dependent charm/s timeout")
+            if time() > time_limit:
+                raise LcmException("Configuration aborted because dependent charm/s timeout")
+            waiter = self.loop.create_future()
+            self._vca_status_waiters.setdefault(nsr_id, []).append(waiter)
+            try:
+                await asyncio.wait_for(waiter, 10)
+                check_db = False
+            except asyncio.TimeoutError:
+                check_db = True
+            finally:
+                if waiter in self._vca_status_waiters.get(nsr_id, ()):
+                    self._vca_status_waiters[nsr_id].remove(waiter)
+                    if not self._vca_status_waiters[nsr_id]:
+                        del self._vca_status_waiters[nsr_id]
 
     async def instantiate_N2VC(self, logging_text, vca_index, nsi_id, db_nsr, db_vnfr, vdu_id, kdu_name, vdu_index,
                                config_descriptor, deploy_params, base_folder, nslcmop_id, stage, vca_type, vca_name,
@@ -1723,7 +2103,12 @@ class NsLcm(LcmBase):
             if operation_state is not None:
                 db_dict['operationState'] = operation_state
                 db_dict["statusEnteredTime"] = time()
-            self.update_db_2("nslcmops", op_id, db_dict)
+            if self.metrics and (isinstance(stage, list) or operation_state is not None):
+                self.metrics.operation_stage(op_id, stage[0] if isinstance(stage, list) else None,
+                                             finished=operation_state is not None)
+            # stage progress is buffered; state changes, errors and other updates are written at once
+            buffered = operation_state is None and error_message is None and not other_update
+            self.update_db_2("nslcmops", op_id, db_dict, buffered=buffered)
         except DbException as e:
             self.logger.warn('Error writing OPERATION status for op_id: {} -> {}'.format(op_id, e))
 
@@ -1757,11 +2142,30 @@ class NsLcm(LcmBase):
                 db_dict[db_path + 'elementUnderConfiguration'] = element_under_configuration
             if element_type:
                 db_dict[db_path + 'elementType'] = element_type
-            self.update_db_2("nsrs", nsr_id, db_dict)
+            if status:
+                self._notify_vca_status(nsr_id, vca_index, status)
+            # READY and BROKEN are checked by the dependent VCAs, so they are written at once
+            buffered = status not in ("READY", "BROKEN") and not other_update
+            self.update_db_2("nsrs", nsr_id, db_dict, buffered=buffered)
         except DbException as e:
             self.logger.warn('Error writing configuration status={}, ns={}, vca_index={}: {}'
                              .format(status, nsr_id, vca_index, e))
 
+    async def _get_vnfds(self, db_vnfrs_list):
+        """
+        Reads the vnfds of a list of vnfrs with a single database query (or from cache)
+        :param db_vnfrs_list: list of vnfrs database content
+        :return: tuple with three dictionaries of vnfds: indexed by vnfd _id, by vnfd id (name), and by
+            member-vnf-index. The same vnfd content is shared by the three dictionaries
+        """
+        db_vnfds = await self.descriptor_cache.get_list("vnfds", (vnfr["vnfd-id"] for vnfr in db_vnfrs_list))
+        db_vnfds_ref = {}
+        db_vnfds_index = {}
+        for vnfr in db_vnfrs_list:
+            db_vnfds_ref[vnfr["vnfd-ref"]] = db_vnfds[vnfr["vnfd-id"]]
+            db_vnfds_index[vnfr["member-vnf-index-ref"]] = db_vnfds[vnfr["vnfd-id"]]
+        return db_vnfds, db_vnfds_ref, db_vnfds_index
+
     async def _do_placement(self, logging_text, db_nslcmop, db_vnfrs):
         """
         Check and computes the placement, (vim account where to deploy). If it is decided by an external tool, it
@@ -1785,7 +2189,7 @@ class NsLcm(LcmBase):
             while not pla_result and wait >= 0:
                 await asyncio.sleep(db_poll_interval)
                 wait -= db_poll_interval
-                db_nslcmop = self.db.get_one("nslcmops", {"_id": nslcmop_id})
+                db_nslcmop = await self.db_async.get_one("nslcmops", {"_id": nslcmop_id})
                 pla_result = deep_get(db_nslcmop, ('_admin', 'pla'))
 
             if not pla_result:
@@ -1796,7 +2200,7 @@ class NsLcm(LcmBase):
                 if not pla_vnf.get('vimAccountId') or not vnfr:
                     continue
                 modified = True
-                self.db.set_one("vnfrs", {"_id": vnfr["_id"]}, {"vim-account-id": pla_vnf['vimAccountId']})
+                await self.db_async.set_one("vnfrs", {"_id": vnfr["_id"]}, {"vim-account-id": pla_vnf['vimAccountId']})
                 # Modifies db_vnfrs
                 vnfr["vim-account-id"] = pla_vnf['vimAccountId']
         return modified
@@ -1844,15 +2248,13 @@ class NsLcm(LcmBase):
         tasks_dict_info = {}  # from task to info text
         exc = None
         error_list = []
+        package_folders = None
         stage = ['Stage 1/5: preparation of the environment.', "Waiting for previous operations to terminate.", ""]
         # ^ stage, step, VIM progress
         try:
             # wait for any previous tasks in process
             await self.lcm_tasks.waitfor_related_HA('ns', 'nslcmops', nslcmop_id)
 
-            stage[1] = "Sync filesystem from database."
-            self.fs.sync()  # TODO, make use of partial sync, only for the needed packages
-
             # STEP 0: Reading database (nslcmops, nsrs, nsds, vnfrs, vnfds)
             stage[1] = "Reading from database."
             # nsState="BUILDING", currentOperation="INSTANTIATING", currentOperationID=nslcmop_id
@@ -1873,7 +2275,7 @@ class NsLcm(LcmBase):
 
             # read from db: operation
             stage[1] = "Getting nslcmop={} from db.".format(nslcmop_id)
-            db_nslcmop = self.db.get_one("nslcmops", {"_id": nslcmop_id})
+            db_nslcmop = await self.db_async.get_one("nslcmops", {"_id": nslcmop_id})
             ns_params = db_nslcmop.get("operationParams")
             if ns_params and ns_params.get("timeout_ns_deploy"):
                 timeout_ns_deploy = ns_params["timeout_ns_deploy"]
@@ -1882,39 +2284,28 @@ class NsLcm(LcmBase):
 
             # read from db: ns
             stage[1] = "Getting nsr={} from db.".format(nsr_id)
-            db_nsr = self.db.get_one("nsrs", {"_id": nsr_id})
+            db_nsr = await self.db_async.get_one("nsrs", {"_id": nsr_id})
             stage[1] = "Getting nsd={} from db.".format(db_nsr["nsd-id"])
-            nsd = self.db.get_one("nsds", {"_id": db_nsr["nsd-id"]})
+            nsd = await self.descriptor_cache.get("nsds", db_nsr["nsd-id"])
             db_nsr["nsd"] = nsd
             # nsr_name = db_nsr["name"]   # TODO short-name??
 
             # read from db: vnf's of this ns
             stage[1] = "Getting vnfrs from db."
             self.logger.debug(logging_text + stage[1])
-            db_vnfrs_list = self.db.get_list("vnfrs", {"nsr-id-ref": nsr_id})
+            db_vnfrs_list = await self.db_async.get_list("vnfrs", {"nsr-id-ref": nsr_id})
 
             # read from db: vnfd's for every vnf
-            db_vnfds_ref = {}     # every vnfd data indexed by vnf name
-            db_vnfds = {}         # every vnfd data indexed by vnf id
-            db_vnfds_index = {}   # every vnfd data indexed by vnf member-index
-
-            # for each vnf in ns, read vnfd
             for vnfr in db_vnfrs_list:
                 db_vnfrs[vnfr["member-vnf-index-ref"]] = vnfr   # vnf's dict indexed by member-index: '1', '2', etc
-                vnfd_id = vnfr["vnfd-id"]                       # vnfd uuid for this vnf
-                vnfd_ref = vnfr["vnfd-ref"]                     # vnfd name for this vnf
-
-                # if we haven't this vnfd, read it from db
-                if vnfd_id not in db_vnfds:
-                    # read from db
-                    stage[1] = "Getting vnfd={} id='{}' from db.".format(vnfd_id, vnfd_ref)
-                    self.logger.debug(logging_text + stage[1])
-                    vnfd = self.db.get_one("vnfds", {"_id": vnfd_id})
+            stage[1] = "Getting vnfds from db."
+            self.logger.debug(logging_text + stage[1])
+            db_vnfds, db_vnfds_ref, db_vnfds_index = await self._get_vnfds(db_vnfrs_list)
 
-                    # store vnfd
-                    db_vnfds_ref[vnfd_ref] = vnfd     # vnfd's indexed by name
-                    db_vnfds[vnfd_id] = vnfd          # vnfd's indexed by id
-                db_vnfds_index[vnfr["member-vnf-index-ref"]] = db_vnfds[vnfd_id]  # vnfd's indexed by member-index
+            # sync only the packages of this ns from storage
+            stage[1] = "Sync filesystem from database."
+            self.logger.debug(logging_text + stage[1])
+            package_folders = await self.package_cache.acquire([nsd] + list(db_vnfds.values()))
 
             # Get or generates the _admin.deployed.VCA list
             vca_deployed_list = None
@@ -1940,7 +2331,7 @@ class NsLcm(LcmBase):
             # set state to INSTANTIATED. When instantiated NBI will not delete directly
             db_nsr_update["_admin.nsState"] = "INSTANTIATED"
             self.update_db_2("nsrs", nsr_id, db_nsr_update)
-            self.db.set_list("vnfrs", {"nsr-id-ref": nsr_id}, {"_admin.nsState": "INSTANTIATED"})
+            await self.db_async.set_list("vnfrs", {"nsr-id-ref": nsr_id}, {"_admin.nsState": "INSTANTIATED"})
 
             # n2vc_redesign STEP 2 Deploy Network Scenario
             stage[0] = 'Stage 2/5: deployment of KDUs, VMs and execution environments.'
@@ -2172,6 +2563,11 @@ class NsLcm(LcmBase):
                 # TODO cancel all tasks
             except Exception as exc:
                 error_list.append(str(exc))
+            self.package_cache.release(package_folders)
+            self._vca_status.pop(nsr_id, None)
+            self._vca_relations.pop(nsr_id, None)
+            self._vnfr_readiness.pop(nsr_id, None)
+            self._ro_deployment_status.pop(nsr_id, None)
 
             # update operation-status
             db_nsr_update["operational-status"] = "running"
@@ -2234,13 +2630,96 @@ class NsLcm(LcmBase):
             self.logger.debug(logging_text + "Exit")
             self.lcm_tasks.remove("ns", nsr_id, nslcmop_id, "ns_instantiate")
 
+    @staticmethod
+    def _get_vca_entities(vca):
+        """
+        Obtain the relation entities that a VCA represents: its member-vnf-index for the ns-configuration relations
+        and its vdu_id for the vnf-configuration relations
+        """
+        entities = []
+        if vca.get("member-vnf-index"):
+            entities.append(("member-vnf-index", vca["member-vnf-index"]))
+        if vca.get("vdu_id"):
+            entities.append(("vdu_id", vca["vdu_id"]))
+        return entities
+
+    async def _get_vca_relations_index(self, nsr_id, db_nsr):
+        """
+        Obtain the relations of the ns-configuration and vnf-configuration of a ns, indexed by entity. It is built
+        once per ns and kept until the instantiation or scale ends
+        :param nsr_id: ns instance id
+        :param db_nsr: nsr database content
+        :return: dictionary with:
+            by_entity: relations indexed by entity, as ("member-vnf-index", "1") or ("vdu_id", "mgmtVM")
+            ee_ids: ee_id of the entities with the configuration software installed, one per entity
+            broken: entities with a broken configuration
+            vca_entities: entities of each VCA, indexed by vca_index
+            waiters: futures to wake up when any of above changes
+        """
+        relations_index = self._vca_relations.get(nsr_id)
+        if relations_index:
+            return relations_index
+        by_entity = {}
+
+        def add_relation(relation, entity_key):
+            entities = relation.get("entities")
+            r = {"entities": ((entity_key, entities[0].get("id")), (entity_key, entities[1].get("id"))),
+                 "endpoints": (entities[0].get("endpoint"), entities[1].get("endpoint")),
+                 "status": {}}  # (ee_id_1, ee_id_2): "adding", "added" or "failed"
+            for entity in set(r["entities"]):
+                by_entity.setdefault(entity, []).append(r)
+
+        nsd = await self.descriptor_cache.get("nsds", db_nsr["nsd-id"])
+        for relation in deep_get(nsd, ('ns-configuration', 'relation')) or ():
+            add_relation(relation, "member-vnf-index")
+        if db_nsr.get('vnfd-id'):
+            for db_vnfd in (await self.descriptor_cache.get_list("vnfds", db_nsr['vnfd-id'])).values():
+                for relation in deep_get(db_vnfd, ('vnf-configuration', 'relation')) or ():
+                    add_relation(relation, "vdu_id")
+        relations_index = {"by_entity": by_entity, "ee_ids": {}, "broken": set(), "vca_entities": {}, "waiters": []}
+        # another VCA of the same ns can have built it meanwhile
+        return self._vca_relations.setdefault(nsr_id, relations_index)
+
+    def _seed_vca_relations_index(self, relations_index, db_nsr):
+        """
+        Updates the relations index with the database content, for the peers installed by other worker or by a previous
+        operation, e.g. when scaling out
+        :param relations_index: relations index, see _get_vca_relations_index
+        :param db_nsr: nsr database content
+        :return: None
+        """
+        vca_list = deep_get(db_nsr, ('_admin', 'deployed', 'VCA')) or []
+        configuration_status_list = db_nsr.get("configurationStatus") or []
+        for index, vca in enumerate(vca_list):
+            if not vca:
+                continue
+            entities = self._get_vca_entities(vca)
+            relations_index["vca_entities"][index] = entities
+            if vca.get("config_sw_installed") and vca.get("ee_id"):
+                for entity in entities:
+                    relations_index["ee_ids"].setdefault(entity, vca["ee_id"])
+            if index < len(configuration_status_list) and configuration_status_list[index] and \
+                    configuration_status_list[index].get("status") == "BROKEN":
+                relations_index["broken"].update(entities)
+
+    def _wake_vca_relations(self, nsr_id):
+        relations_index = self._vca_relations.get(nsr_id)
+        if not relations_index:
+            return
+        for waiter in relations_index["waiters"]:
+            if not waiter.done():
+                waiter.set_result(None)
+        relations_index["waiters"].clear()
+
     async def _add_vca_relations(self, logging_text, nsr_id, vca_index: int,
                                  timeout: int = 3600, vca_type: str = None) -> bool:
 
         # steps:
         # 1. find all relations for this VCA
-        # 2. wait for other peers related
-        # 3. add relations
+        # 2. wait for other peers related. They are notified in-process when installed or broken, and database is
+        #    checked at start and periodically for the ones installed by other worker or by a previous operation
+        # 3. add relations. Each relation between two execution environments is added once, by the last of them
+        #    being installed
 
         try:
             vca_type = vca_type or "lxc_proxy_charm"
@@ -2248,150 +2727,93 @@ class NsLcm(LcmBase):
             # STEP 1: find all relations for this VCA
 
             # read nsr record
-            db_nsr = self.db.get_one("nsrs", {"_id": nsr_id})
-            nsd = self.db.get_one("nsds", {"_id": db_nsr["nsd-id"]})
+            db_nsr = await self.db_async.get_one("nsrs", {"_id": nsr_id})
+            vca_list = deep_get(db_nsr, ('_admin', 'deployed', 'VCA'))
+            relations_index = await self._get_vca_relations_index(nsr_id, db_nsr)
+            self._seed_vca_relations_index(relations_index, db_nsr)
 
             # this VCA data
-            my_vca = deep_get(db_nsr, ('_admin', 'deployed', 'VCA'))[vca_index]
-
-            # read all ns-configuration relations
-            ns_relations = list()
-            db_ns_relations = deep_get(nsd, ('ns-configuration', 'relation'))
-            if db_ns_relations:
-                for r in db_ns_relations:
-                    # check if this VCA is in the relation
-                    if my_vca.get('member-vnf-index') in\
-                            (r.get('entities')[0].get('id'), r.get('entities')[1].get('id')):
-                        ns_relations.append(r)
-
-            # read all vnf-configuration relations
-            vnf_relations = list()
-            db_vnfd_list = db_nsr.get('vnfd-id')
-            if db_vnfd_list:
-                for vnfd in db_vnfd_list:
-                    db_vnfd = self.db.get_one("vnfds", {"_id": vnfd})
-                    db_vnf_relations = deep_get(db_vnfd, ('vnf-configuration', 'relation'))
-                    if db_vnf_relations:
-                        for r in db_vnf_relations:
-                            # check if this VCA is in the relation
-                            if my_vca.get('vdu_id') in (r.get('entities')[0].get('id'), r.get('entities')[1].get('id')):
-                                vnf_relations.append(r)
+            my_vca = vca_list[vca_index]
+            my_ee_id = my_vca.get('ee_id')
+            my_entities = self._get_vca_entities(my_vca)
+            relations_index["vca_entities"][vca_index] = my_entities
+            my_relations = []
+            for entity in my_entities:
+                for r in relations_index["by_entity"].get(entity, ()):
+                    if r not in my_relations:
+                        my_relations.append(r)
 
             # if no relations, terminate
-            if not ns_relations and not vnf_relations:
+            if not my_relations:
                 self.logger.debug(logging_text + ' No relations')
                 return True
 
-            self.logger.debug(logging_text + ' adding relations\n    {}\n    {}'.format(ns_relations, vnf_relations))
+            self.logger.debug(logging_text + ' adding relations\n    {}'.format(
+                [(r["entities"], r["endpoints"]) for r in my_relations]))
+
+            # this VCA has the configuration software installed: it is the peer of its entities. Other instances of
+            # the same entity (e.g. scaled vdus) keep using their own ee_id for their relations
+            for entity in my_entities:
+                relations_index["ee_ids"].setdefault(entity, my_ee_id)
+            self._wake_vca_relations(nsr_id)
 
             # add all relations
-            start = time()
+            time_limit = time() + timeout
+            dropped = set()  # index of my_relations with a broken peer
             while True:
-                # check timeout
-                now = time()
-                if now - start >= timeout:
-                    self.logger.error(logging_text + ' : timeout adding relations')
-                    return False
-
-                # reload nsr from database (we need to update record: _admin.deloyed.VCA)
-                db_nsr = self.db.get_one("nsrs", {"_id": nsr_id})
-
-                # for each defined NS relation, find the VCA's related
-                for r in ns_relations:
-                    from_vca_ee_id = None
-                    to_vca_ee_id = None
-                    from_vca_endpoint = None
-                    to_vca_endpoint = None
-                    vca_list = deep_get(db_nsr, ('_admin', 'deployed', 'VCA'))
-                    for vca in vca_list:
-                        if vca.get('member-vnf-index') == r.get('entities')[0].get('id') \
-                                and vca.get('config_sw_installed'):
-                            from_vca_ee_id = vca.get('ee_id')
-                            from_vca_endpoint = r.get('entities')[0].get('endpoint')
-                        if vca.get('member-vnf-index') == r.get('entities')[1].get('id') \
-                                and vca.get('config_sw_installed'):
-                            to_vca_ee_id = vca.get('ee_id')
-                            to_vca_endpoint = r.get('entities')[1].get('endpoint')
-                    if from_vca_ee_id and to_vca_ee_id:
-                        # add relation
-                        await self.vca_map[vca_type].add_relation(
-                            ee_id_1=from_vca_ee_id,
-                            ee_id_2=to_vca_ee_id,
-                            endpoint_1=from_vca_endpoint,
-                            endpoint_2=to_vca_endpoint)
-                        # remove entry from relations list
-                        ns_relations.remove(r)
-                    else:
-                        # check failed peers
-                        try:
-                            vca_status_list = db_nsr.get('configurationStatus')
-                            if vca_status_list:
-                                for i in range(len(vca_list)):
-                                    vca = vca_list[i]
-                                    vca_status = vca_status_list[i]
-                                    if vca.get('member-vnf-index') == r.get('entities')[0].get('id'):
-                                        if vca_status.get('status') == 'BROKEN':
-                                            # peer broken: remove relation from list
-                                            ns_relations.remove(r)
-                                    if vca.get('member-vnf-index') == r.get('entities')[1].get('id'):
-                                        if vca_status.get('status') == 'BROKEN':
-                                            # peer broken: remove relation from list
-                                            ns_relations.remove(r)
-                        except Exception:
-                            # ignore
-                            pass
-
-                # for each defined VNF relation, find the VCA's related
-                for r in vnf_relations:
-                    from_vca_ee_id = None
-                    to_vca_ee_id = None
-                    from_vca_endpoint = None
-                    to_vca_endpoint = None
-                    vca_list = deep_get(db_nsr, ('_admin', 'deployed', 'VCA'))
-                    for vca in vca_list:
-                        if vca.get('vdu_id') == r.get('entities')[0].get('id') and vca.get('config_sw_installed'):
-                            from_vca_ee_id = vca.get('ee_id')
-                            from_vca_endpoint = r.get('entities')[0].get('endpoint')
-                        if vca.get('vdu_id') == r.get('entities')[1].get('id') and vca.get('config_sw_installed'):
-                            to_vca_ee_id = vca.get('ee_id')
-                            to_vca_endpoint = r.get('entities')[1].get('endpoint')
-                    if from_vca_ee_id and to_vca_ee_id:
-                        # add relation
-                        await self.vca_map[vca_type].add_relation(
-                            ee_id_1=from_vca_ee_id,
-                            ee_id_2=to_vca_ee_id,
-                            endpoint_1=from_vca_endpoint,
-                            endpoint_2=to_vca_endpoint)
-                        # remove entry from relations list
-                        vnf_relations.remove(r)
-                    else:
-                        # check failed peers
+                pending = False
+                for relation_index, r in enumerate(my_relations):
+                    if relation_index in dropped:
+                        continue
+                    ee_ids = tuple(my_ee_id if entity in my_entities else relations_index["ee_ids"].get(entity)
+                                   for entity in r["entities"])
+                    if not all(ee_ids):
+                        if any(entity in relations_index["broken"] for entity in r["entities"]):
+                            # peer broken: remove relation from list
+                            dropped.add(relation_index)
+                        else:
+                            pending = True
+                        continue
+                    if ee_ids not in r["status"]:
+                        r["status"][ee_ids] = "adding"
                         try:
-                            vca_status_list = db_nsr.get('configurationStatus')
-                            if vca_status_list:
-                                for i in range(len(vca_list)):
-                                    vca = vca_list[i]
-                                    vca_status = vca_status_list[i]
-                                    if vca.get('vdu_id') == r.get('entities')[0].get('id'):
-                                        if vca_status.get('status') == 'BROKEN':
-                                            # peer broken: remove relation from list
-                                            ns_relations.remove(r)
-                                    if vca.get('vdu_id') == r.get('entities')[1].get('id'):
-                                        if vca_status.get('status') == 'BROKEN':
-                                            # peer broken: remove relation from list
-                                            ns_relations.remove(r)
+                            await self.vca_map[vca_type].add_relation(
+                                ee_id_1=ee_ids[0],
+                                ee_id_2=ee_ids[1],
+                                endpoint_1=r["endpoints"][0],
+                                endpoint_2=r["endpoints"][1])
+                            r["status"][ee_ids] = "added"
                         except Exception:
-                            # ignore
-                            pass
-
-                # wait for next try
-                await asyncio.sleep(5.0)
-
-                if not ns_relations and not vnf_relations:
+                            r["status"][ee_ids] = "failed"
+                            raise
+                        finally:
+                            self._wake_vca_relations(nsr_id)
+                    if r["status"][ee_ids] == "failed":
+                        self.logger.warn(logging_text + ' ERROR adding relations: failed relation {}'.format(
+                            r["entities"]))
+                        return False
+                    if r["status"][ee_ids] == "adding":
+                        pending = True
+
+                if not pending:
                     self.logger.debug('Relations added')
-                    break
+                    return True
 
-            return True
+                # wait for a peer being installed, broken, or a relation being added
+                time_left = time_limit - time()
+                if time_left <= 0:
+                    self.logger.error(logging_text + ' : timeout adding relations')
+                    return False
+                waiter = self.loop.create_future()
+                relations_index["waiters"].append(waiter)
+                try:
+                    await asyncio.wait_for(waiter, min(time_left, 10))
+                except asyncio.TimeoutError:
+                    if waiter in relations_index["waiters"]:
+                        relations_index["waiters"].remove(waiter)
+                    # no changes in-process, check peers installed by other worker
+                    db_nsr = await self.db_async.get_one("nsrs", {"_id": nsr_id})
+                    self._seed_vca_relations_index(relations_index, db_nsr)
 
         except Exception as e:
             self.logger.warn(logging_text + ' ERROR adding relations: {}'.format(e))
@@ -2479,7 +2901,7 @@ class NsLcm(LcmBase):
                 self.logger.debug(logging_text + text)
                 await asyncio.wait(task_dependency, timeout=3600)
 
-            db_k8scluster = self.db.get_one("k8sclusters", {"_id": cluster_id}, fail_on_empty=False)
+            db_k8scluster = await self.db_async.get_one("k8sclusters", {"_id": cluster_id}, fail_on_empty=False)
             if not db_k8scluster:
                 raise LcmException("K8s cluster {} cannot be found".format(cluster_id))
 
@@ -2545,7 +2967,7 @@ class NsLcm(LcmBase):
                             self.logger.debug(logging_text + "repos synchronized on k8s cluster '{}' to_delete: {}, "
                                                              "to_add: {}".format(k8s_cluster_id, del_repo_list,
                                                                                  added_repo_dict))
-                            self.db.set_one("k8sclusters", {"_id": k8s_cluster_id}, updated, unset=unset)
+                            await self.db_async.set_one("k8sclusters", {"_id": k8s_cluster_id}, updated, unset=unset)
                         updated_cluster_list.append(cluster_uuid)
 
                     # Instantiate kdu
@@ -2789,6 +3211,7 @@ class NsLcm(LcmBase):
         q_filter = {'_id': db_nslcmop['_id']}
         update_dict = {'_admin.operations.{}.operationState'.format(op_index): operationState,
                        '_admin.operations.{}.detailed-status'.format(op_index): detailed_status}
+        self.flush_db_2("nslcmops", db_nslcmop['_id'])
         self.db.set_one("nslcmops",
                         q_filter=q_filter,
                         update_dict=update_dict,
@@ -2987,7 +3410,55 @@ class NsLcm(LcmBase):
             pass
         self._write_all_config_status(db_nsr=db_nsr, status='DELETED')
 
-    async def _terminate_RO(self, logging_text, nsr_deployed, nsr_id, nslcmop_id, stage):
+    async def _release_delete_RO_shared(self, logging_text, item, ro_id, shared_id, nsr_id):
+        """
+        Releases a shared RO descriptor, deleting it from RO only when this ns is the last one using it. If RO deletion
+        fails the ns is registered again as user, so that the deletion is retried on next terminate. It must be called
+        with the shared descriptor locked
+        :param item: "vnfd" or "nsd"
+        :param ro_id: RO uuid of the descriptor. None if not known, e.g. its creation has failed; it is looked up at RO
+        :param shared_id: osm_id of the shared descriptor
+        :param nsr_id: ns that does not use it anymore
+        :return: None. Raise ROClientException on RO error
+        """
+        if not await self._release_RO_shared(shared_id, nsr_id):
+            self.logger.debug(logging_text + "ro_{}_id={} in use by other ns, not deleted".format(item, ro_id))
+            return
+        try:
+            if not ro_id:
+                ro_list = await self.RO.get_list(item, filter_by={"osm_id": shared_id})
+                if not ro_list:
+                    return
+                ro_id = ro_list[0]["uuid"]
+            await self.RO.delete(item, ro_id)
+            self.logger.debug(logging_text + "ro_{}_id={} deleted".format(item, ro_id))
+        except Exception as e:
+            if not isinstance(e, ROclient.ROClientException) or e.http_code != 404:
+                await self._acquire_RO_shared(shared_id, nsr_id)
+            raise
+
+    async def _release_RO_shared_on_error(self, logging_text, item, ro_id, shared_id, nsr_id):
+        """
+        Releases a shared RO descriptor after an instantiation error, with _release_delete_RO_shared. Errors are only
+        logged, so that the instantiation error is the one reported
+        """
+        try:
+            await self._release_delete_RO_shared(logging_text, item, ro_id, shared_id, nsr_id)
+        except Exception as e:
+            self.logger.error(logging_text + "Cannot release shared ro_{} {}: {}".format(item, shared_id, e))
+
+    async def _delete_RO_shared(self, logging_text, item, ro_id, shared_id, nsr_id):
+        """
+        Locks a shared RO descriptor and releases it with _release_delete_RO_shared
+        :return: None. Raise ROClientException on RO error, LcmException if it cannot be locked
+        """
+        await self._lock_RO_shared(shared_id, nsr_id)
+        try:
+            await self._release_delete_RO_shared(logging_text, item, ro_id, shared_id, nsr_id)
+        finally:
+            await self._unlock_RO_shared(shared_id, nsr_id)
+
+    async def _terminate_RO(self, logging_text, nsr_deployed, nsr_id, nslcmop_id, stage, vim_account_id=None):
         """
         Terminates a deployment from RO
         :param logging_text:
@@ -2996,6 +3467,7 @@ class NsLcm(LcmBase):
         :param nslcmop_id:
         :param stage: list of string with the content to write on db_nslcmop.detailed-status.
             this method will update only the index 2, but it will write on database the concatenated content of the list
+        :param vim_account_id: default VIM account of the ns, used to select the polling interval
         :return:
         """
         db_nsr_update = {}
@@ -3027,6 +3499,7 @@ class NsLcm(LcmBase):
                 self._write_op_status(nslcmop_id, stage)
 
                 delete_timeout = 20 * 60  # 20 minutes
+                poll_backoff = await self._get_poll_backoff(vim_account_id)
                 while delete_timeout > 0:
                     desc = await self.RO.show(
                         "ns",
@@ -3053,8 +3526,8 @@ class NsLcm(LcmBase):
                         db_nsr_update["detailed-status"] = " ".join(stage)
                         self._write_op_status(nslcmop_id, stage)
                         self.update_db_2("nsrs", nsr_id, db_nsr_update)
-                    await asyncio.sleep(5, loop=self.loop)
-                    delete_timeout -= 5
+                        poll_backoff.progress()
+                    delete_timeout -= await poll_backoff.wait()
                 else:  # delete_timeout <= 0:
                     raise ROclient.ROClientException("Timeout waiting ns deleted from VIM")
 
@@ -3075,13 +3548,17 @@ class NsLcm(LcmBase):
         # Delete nsd
         if not failed_detail and deep_get(nsr_deployed, ("RO", "nsd_id")):
             ro_nsd_id = nsr_deployed["RO"]["nsd_id"]
+            shared_id = nsr_deployed["RO"].get("nsd_shared_id")
             try:
                 stage[2] = "Deleting nsd from RO."
                 db_nsr_update["detailed-status"] = " ".join(stage)
                 self.update_db_2("nsrs", nsr_id, db_nsr_update)
                 self._write_op_status(nslcmop_id, stage)
-                await self.RO.delete("nsd", ro_nsd_id)
-                self.logger.debug(logging_text + "ro_nsd_id={} deleted".format(ro_nsd_id))
+                if shared_id:
+                    await self._delete_RO_shared(logging_text, "nsd", ro_nsd_id, shared_id, nsr_id)
+                else:
+                    await self.RO.delete("nsd", ro_nsd_id)
+                    self.logger.debug(logging_text + "ro_nsd_id={} deleted".format(ro_nsd_id))
                 db_nsr_update["_admin.deployed.RO.nsd_id"] = None
             except Exception as e:
                 if isinstance(e, ROclient.ROClientException) and e.http_code == 404:  # not found
@@ -3105,8 +3582,12 @@ class NsLcm(LcmBase):
                     db_nsr_update["detailed-status"] = " ".join(stage)
                     self.update_db_2("nsrs", nsr_id, db_nsr_update)
                     self._write_op_status(nslcmop_id, stage)
-                    await self.RO.delete("vnfd", ro_vnfd_id)
-                    self.logger.debug(logging_text + "ro_vnfd_id={} deleted".format(ro_vnfd_id))
+                    if vnf_deployed.get("shared_id"):
+                        await self._delete_RO_shared(logging_text, "vnfd", ro_vnfd_id, vnf_deployed["shared_id"],
+                                                     nsr_id)
+                    else:
+                        await self.RO.delete("vnfd", ro_vnfd_id)
+                        self.logger.debug(logging_text + "ro_vnfd_id={} deleted".format(ro_vnfd_id))
                     db_nsr_update["_admin.deployed.RO.vnfd.{}.id".format(index)] = None
                 except Exception as e:
                     if isinstance(e, ROclient.ROClientException) and e.http_code == 404:  # not found
@@ -3155,12 +3636,12 @@ class NsLcm(LcmBase):
             await self.lcm_tasks.waitfor_related_HA("ns", 'nslcmops', nslcmop_id)
 
             stage[1] = "Getting nslcmop={} from db.".format(nslcmop_id)
-            db_nslcmop = self.db.get_one("nslcmops", {"_id": nslcmop_id})
+            db_nslcmop = await self.db_async.get_one("nslcmops", {"_id": nslcmop_id})
             operation_params = db_nslcmop.get("operationParams") or {}
             if operation_params.get("timeout_ns_terminate"):
                 timeout_ns_terminate = operation_params["timeout_ns_terminate"]
             stage[1] = "Getting nsr={} from db.".format(nsr_id)
-            db_nsr = self.db.get_one("nsrs", {"_id": nsr_id})
+            db_nsr = await self.db_async.get_one("nsrs", {"_id": nsr_id})
 
             db_nsr_update["operational-status"] = "terminating"
             db_nsr_update["config-status"] = "terminating"
@@ -3181,16 +3662,8 @@ class NsLcm(LcmBase):
                 return
 
             stage[1] = "Getting vnf descriptors from db."
-            db_vnfrs_list = self.db.get_list("vnfrs", {"nsr-id-ref": nsr_id})
-            db_vnfds_from_id = {}
-            db_vnfds_from_member_index = {}
-            # Loop over VNFRs
-            for vnfr in db_vnfrs_list:
-                vnfd_id = vnfr["vnfd-id"]
-                if vnfd_id not in db_vnfds_from_id:
-                    vnfd = self.db.get_one("vnfds", {"_id": vnfd_id})
-                    db_vnfds_from_id[vnfd_id] = vnfd
-                db_vnfds_from_member_index[vnfr["member-vnf-index-ref"]] = db_vnfds_from_id[vnfd_id]
+            db_vnfrs_list = await self.db_async.get_list("vnfrs", {"nsr-id-ref": nsr_id})
+            _, _, db_vnfds_from_member_index = await self._get_vnfds(db_vnfrs_list)
 
             # Destroy individual execution environments when there are terminating primitives.
             # Rest of EE will be deleted at once
@@ -3275,12 +3748,13 @@ class NsLcm(LcmBase):
 
             # remove from RO
             stage[1] = "Deleting ns from VIM."
+            vim_account_id = deep_get(db_nsr, ("instantiate_params", "vimAccountId"))
             if self.ng_ro:
                 task_delete_ro = asyncio.ensure_future(
-                    self._terminate_ng_ro(logging_text, nsr_deployed, nsr_id, nslcmop_id, stage))
+                    self._terminate_ng_ro(logging_text, nsr_deployed, nsr_id, nslcmop_id, stage, vim_account_id))
             else:
                 task_delete_ro = asyncio.ensure_future(
-                    self._terminate_RO(logging_text, nsr_deployed, nsr_id, nslcmop_id, stage))
+                    self._terminate_RO(logging_text, nsr_deployed, nsr_id, nslcmop_id, stage, vim_account_id))
             tasks_dict_info[task_delete_ro] = "Removing deployment from VIM"
 
             # rest of staff will be done at finally
@@ -3351,7 +3825,8 @@ class NsLcm(LcmBase):
             )
             if ns_state == "NOT_INSTANTIATED":
                 try:
-                    self.db.set_list("vnfrs", {"nsr-id-ref": nsr_id}, {"_admin.nsState": "NOT_INSTANTIATED"})
+                    await self.db_async.set_list("vnfrs", {"nsr-id-ref": nsr_id},
+                                                 {"_admin.nsState": "NOT_INSTANTIATED"})
                 except DbException as e:
                     self.logger.warn(logging_text + 'Error writing VNFR status for nsr-id-ref: {} -> {}'.
                                      format(nsr_id, e))
@@ -3368,6 +3843,11 @@ class NsLcm(LcmBase):
 
             self.logger.debug(logging_text + "Exit")
             self.lcm_tasks.remove("ns", nsr_id, nslcmop_id, "ns_terminate")
+            self._vca_status.pop(nsr_id, None)
+            self._vnfr_readiness.pop(nsr_id, None)
+            self._vca_status_written.pop(nsr_id, None)
+            self._vca_status_locks.pop(nsr_id, None)
+            self._ro_deployment_status.pop(nsr_id, None)
 
     async def _wait_for_tasks(self, logging_text, created_tasks_info, timeout, stage, nslcmop_id, nsr_id=None):
         time_start = time()
@@ -3493,38 +3973,44 @@ class NsLcm(LcmBase):
 
     async def _ns_execute_primitive(self, ee_id, primitive, primitive_params, retries=0,
                                     retries_interval=30, timeout=None,
-                                    vca_type=None, db_dict=None) -> (str, str):
+                                    vca_type=None, db_dict=None, retry_policy=None) -> (str, str):
+        """
+        Executes a primitive at a VCA, retrying on failure
+        :param retries: number of retries when retry_policy is not provided
+        :param retries_interval: seconds between retries when retry_policy is not provided
+        :param retry_policy: RetryPolicy to use instead of retries and retries_interval, e.g. with backoff or deadline
+        :return: tuple with operation state, as 'COMPLETED' or 'FAILED', and detail
+        """
         try:
             if primitive == "config":
                 primitive_params = {"params": primitive_params}
 
             vca_type = vca_type or "lxc_proxy_charm"
+            if not retry_policy:
+                retry_policy = RetryPolicy({"initial": retries_interval, "max": retries_interval, "jitter": 0},
+                                           max_attempts=retries + 1, loop=self.loop)
+
+            def execute():
+                return asyncio.wait_for(
+                    self.vca_map[vca_type].exec_primitive(
+                        ee_id=ee_id,
+                        primitive_name=primitive,
+                        params_dict=primitive_params,
+                        progress_timeout=self.timeout_progress_primitive,
+                        total_timeout=self.timeout_primitive,
+                        db_dict=db_dict),
+                    timeout=timeout or self.timeout_primitive)
+
+            def on_error(e):
+                self.logger.debug('Error executing action {} on {} -> {}'.format(
+                    primitive, ee_id, "Timeout" if isinstance(e, asyncio.TimeoutError) else e))
 
-            while retries >= 0:
-                try:
-                    output = await asyncio.wait_for(
-                        self.vca_map[vca_type].exec_primitive(
-                            ee_id=ee_id,
-                            primitive_name=primitive,
-                            params_dict=primitive_params,
-                            progress_timeout=self.timeout_progress_primitive,
-                            total_timeout=self.timeout_primitive,
-                            db_dict=db_dict),
-                        timeout=timeout or self.timeout_primitive)
-                    # execution was OK
-                    break
-                except asyncio.CancelledError:
-                    raise
-                except Exception as e:  # asyncio.TimeoutError
-                    if isinstance(e, asyncio.TimeoutError):
-                        e = "Timeout"
-                    retries -= 1
-                    if retries >= 0:
-                        self.logger.debug('Error executing action {} on {} -> {}'.format(primitive, ee_id, e))
-                        # wait and retry
-                        await asyncio.sleep(retries_interval, loop=self.loop)
-                    else:
-                        return 'FAILED', str(e)
+            try:
+                output = await retry_policy.run(execute, on_error=on_error)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                return 'FAILED', "Timeout" if isinstance(e, asyncio.TimeoutError) else str(e)
 
             return 'COMPLETED', output
 
@@ -3563,8 +4049,8 @@ class NsLcm(LcmBase):
             )
 
             step = "Getting information from database"
-            db_nslcmop = self.db.get_one("nslcmops", {"_id": nslcmop_id})
-            db_nsr = self.db.get_one("nsrs", {"_id": nsr_id})
+            db_nslcmop = await self.db_async.get_one("nslcmops", {"_id": nslcmop_id})
+            db_nsr = await self.db_async.get_one("nsrs", {"_id": nsr_id})
 
             nsr_deployed = db_nsr["_admin"].get("deployed")
             vnf_index = db_nslcmop["operationParams"].get("member_vnf_index")
@@ -3577,12 +4063,13 @@ class NsLcm(LcmBase):
 
             if vnf_index:
                 step = "Getting vnfr from database"
-                db_vnfr = self.db.get_one("vnfrs", {"member-vnf-index-ref": vnf_index, "nsr-id-ref": nsr_id})
+                db_vnfr = await self.db_async.get_one("vnfrs", {"member-vnf-index-ref": vnf_index,
+                                                                "nsr-id-ref": nsr_id})
                 step = "Getting vnfd from database"
-                db_vnfd = self.db.get_one("vnfds", {"_id": db_vnfr["vnfd-id"]})
+                db_vnfd = await self.descriptor_cache.get("vnfds", db_vnfr["vnfd-id"])
             else:
                 step = "Getting nsd from database"
-                db_nsd = self.db.get_one("nsds", {"_id": db_nsr["nsd-id"]})
+                db_nsd = await self.descriptor_cache.get("nsds", db_nsr["nsd-id"])
 
             # for backward compatibility
             if nsr_deployed and isinstance(nsr_deployed.get("VCA"), dict):
@@ -3800,6 +4287,7 @@ class NsLcm(LcmBase):
         old_operational_status = ""
         old_config_status = ""
         vnfr_scaled = False
+        package_folders = None
         try:
             # wait for any previous tasks in process
             step = "Waiting for previous operations to terminate"
@@ -3814,9 +4302,9 @@ class NsLcm(LcmBase):
 
             step = "Getting nslcmop from database"
             self.logger.debug(step + " after having waited for previous tasks to be completed")
-            db_nslcmop = self.db.get_one("nslcmops", {"_id": nslcmop_id})
+            db_nslcmop = await self.db_async.get_one("nslcmops", {"_id": nslcmop_id})
             step = "Getting nsr from database"
-            db_nsr = self.db.get_one("nsrs", {"_id": nsr_id})
+            db_nsr = await self.db_async.get_one("nsrs", {"_id": nsr_id})
 
             old_operational_status = db_nsr["operational-status"]
             old_config_status = db_nsr["config-status"]
@@ -3847,9 +4335,12 @@ class NsLcm(LcmBase):
                 self.update_db_2("nsrs", nsr_id, db_nsr_update)
 
             step = "Getting vnfr from database"
-            db_vnfr = self.db.get_one("vnfrs", {"member-vnf-index-ref": vnf_index, "nsr-id-ref": nsr_id})
+            db_vnfr = await self.db_async.get_one("vnfrs", {"member-vnf-index-ref": vnf_index, "nsr-id-ref": nsr_id})
             step = "Getting vnfd from database"
-            db_vnfd = self.db.get_one("vnfds", {"_id": db_vnfr["vnfd-id"]})
+            db_vnfd = await self.descriptor_cache.get("vnfds", db_vnfr["vnfd-id"])
+            # charm artifacts of the package are needed at scale out
+            step = "Syncing vnfd package from storage"
+            package_folders = await self.package_cache.acquire([db_vnfd])
 
             step = "Getting scaling-group-descriptor"
             for scaling_descriptor in db_vnfd["scaling-group-descriptor"]:
@@ -3996,7 +4487,7 @@ class NsLcm(LcmBase):
                                                                           vdu_count_index=None,
                                                                           ee_descriptor_id=ee_descriptor_id)
                             result, result_detail = await self._ns_execute_primitive(
-                                ee_id, primitive_name, primitive_params, vca_type)
+                                ee_id, primitive_name, primitive_params, vca_type=vca_type)
                             self.logger.debug(logging_text + "vnf_config_primitive={} Done with result {} {}".format(
                                 vnf_config_primitive, result, result_detail))
                             # Update operationState = COMPLETED | FAILED
@@ -4044,11 +4535,13 @@ class NsLcm(LcmBase):
                     db_nslcmop_update["_admin.deploy.RO"] = RO_nslcmop_id
 
                     RO_task_done = False
+                    old_desc = None
                     step = detailed_status = "Waiting RO_task_id={} to complete the scale action.".format(RO_nslcmop_id)
                     detailed_status_old = None
                     self.logger.debug(logging_text + step)
 
                     deployment_timeout = 1 * 3600   # One hour
+                    poll_backoff = await self._get_poll_backoff(db_vnfr.get("vim-account-id"))
                     while deployment_timeout > 0:
                         if not RO_task_done:
                             desc = await self.RO.show("ns", item_id_name=RO_nsr_id, extra_item="action",
@@ -4082,13 +4575,17 @@ class NsLcm(LcmBase):
                                     vnfr_scaled = True
                                 try:
                                     desc = await self.RO.show("ns", RO_nsr_id)
+                                    # nothing to do if RO ns has not changed since last poll
+                                    if desc != old_desc:
+                                        old_desc = desc
+                                        poll_backoff.progress()
 
-                                    # deploymentStatus
-                                    self._on_update_ro_db(nsrs_id=nsr_id, ro_descriptor=desc)
+                                        # deploymentStatus
+                                        self._on_update_ro_db(nsrs_id=nsr_id, ro_descriptor=desc)
 
-                                    # nsr_deployed["nsr_ip"] = RO.get_ns_vnf_info(desc)
-                                    self.ns_update_vnfr({db_vnfr["member-vnf-index-ref"]: db_vnfr}, desc)
-                                    break
+                                        # nsr_deployed["nsr_ip"] = RO.get_ns_vnf_info(desc)
+                                        self.ns_update_vnfr({db_vnfr["member-vnf-index-ref"]: db_vnfr}, desc)
+                                        break
                                 except LcmExceptionNoMgmtIP:
                                     pass
                             else:
@@ -4098,9 +4595,9 @@ class NsLcm(LcmBase):
                                 db_nslcmop, op_index, 'COMPLETED', detailed_status)
                             detailed_status_old = db_nslcmop_update["detailed-status"] = detailed_status
                             self.update_db_2("nslcmops", nslcmop_id, db_nslcmop_update)
+                            poll_backoff.progress()
 
-                        await asyncio.sleep(5, loop=self.loop)
-                        deployment_timeout -= 5
+                        deployment_timeout -= await poll_backoff.wait()
                     if deployment_timeout <= 0:
                         self._update_suboperation_status(
                             db_nslcmop, nslcmop_id, op_index, 'FAILED', "Timeout when waiting for ns to get ready")
@@ -4193,7 +4690,7 @@ class NsLcm(LcmBase):
                                                                           vdu_count_index=None,
                                                                           ee_descriptor_id=ee_descriptor_id)
                             result, result_detail = await self._ns_execute_primitive(
-                                ee_id, primitive_name, primitive_params, vca_type)
+                                ee_id, primitive_name, primitive_params, vca_type=vca_type)
                             self.logger.debug(logging_text + "vnf_config_primitive={} Done with result {} {}".format(
                                 vnf_config_primitive, result, result_detail))
                             # Update operationState = COMPLETED | FAILED
@@ -4221,6 +4718,11 @@ class NsLcm(LcmBase):
             exc = traceback.format_exc()
             self.logger.critical(logging_text + "Exit Exception {} {}".format(type(e).__name__, e), exc_info=True)
         finally:
+            self.package_cache.release(package_folders)
+            self._vca_status.pop(nsr_id, None)
+            self._vca_relations.pop(nsr_id, None)
+            self._vnfr_readiness.pop(nsr_id, None)
+            self._ro_deployment_status.pop(nsr_id, None)
             self._write_ns_status(
                 nsr_id=nsr_id,
                 ns_state=None,
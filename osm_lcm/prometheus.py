@@ -22,9 +22,10 @@ import logging
 import aiohttp
 import yaml
 import os
-from osm_lcm.lcm_utils import LcmException
+import tempfile
+from osm_lcm.lcm_utils import LcmException, TemplateCache
 from osm_common.dbbase import DbException
-from jinja2 import Template, TemplateError, TemplateNotFound, TemplateSyntaxError
+from jinja2 import TemplateError, TemplateNotFound, TemplateSyntaxError
 
 __author__ = "Alfonso Tierno <alfonso.tiernosepulveda@telefonica.com>"
 
@@ -48,12 +49,14 @@ initial_prometheus_data = {
 
 class Prometheus:
     """
-    Implements a class to update Prometheus
+    Implements a class to update Prometheus. Two modes are available:
+    'reload' (default): jobs are stored at database and the whole prometheus.yml is written and reloaded on changes
+    'file_sd': every job is written as a file of targets at file_sd_path, that prometheus reads without reloading
     """
 
     PROMETHEUS_LOCKED_TIME = 120
 
-    def __init__(self, config, worker_id, db, loop, logger=None):
+    def __init__(self, config, worker_id, db, loop, logger=None, template_cache=None):
         self.worker_id = worker_id
         self.db = db
         self.loop = loop
@@ -64,11 +67,22 @@ class Prometheus:
             self.path += "/"
         self.cfg_file = self.path + "prometheus.yml"
         self.cfg_file_backup = self.path + "prometheus.yml-backup"
+        self.batch_window = float(config.get("batch_window", 1))  # seconds to merge the updates of several callers
+        self.reload_timeout = float(config.get("reload_timeout", 20))  # seconds waiting prometheus to load config
+        self.reload_poll_interval = 0.5
+        self._batch = None  # updates waiting to be applied: list of (add_jobs, remove_jobs, future)
+        self._batch_task = None
+        self.mode = config.get("mode") or "reload"
+        if self.mode not in ("reload", "file_sd"):
+            raise LcmException("Invalid tsdb mode '{}'. Must be 'reload' or 'file_sd'".format(self.mode))
+        self.file_sd_path = config.get("file_sd_path") or self.path + "file_sd/"
+        if not self.file_sd_path.endswith("/"):
+            self.file_sd_path += "/"
+        self.template_cache = template_cache or TemplateCache()  # compiled prometheus*.j2 jobs
 
-    @staticmethod
-    def parse_job(job_data: str, variables: dict) -> dict:
+    def parse_job(self, job_data: str, variables: dict) -> dict:
         try:
-            template = Template(job_data)
+            template, _ = self.template_cache.get(job_data)
             job_parsed = template.render(variables or {})
             return yaml.safe_load(job_parsed)
         except (TemplateError, TemplateNotFound, TemplateSyntaxError) as e:
@@ -87,7 +101,16 @@ class Prometheus:
                     self.db.create("admin", initial_prometheus_data)
                 # send database config file to prometheus. Ignore loading errors, as prometheus may be starting
                 # but at least an initial configuration file is set
-                await self.update()
+                if self.mode == "file_sd":
+                    # a single job that reads the targets of all the jobs from the files at file_sd_path
+                    os.makedirs(self.file_sd_path, exist_ok=True)
+                    file_sd_job = {
+                        "job_name": "osm_file_sd",
+                        "file_sd_configs": [{"files": [self.file_sd_path + "*.yml"]}],
+                    }
+                    await self._update_reload(add_jobs={"osm_file_sd": file_sd_job})
+                else:
+                    await self.update()
                 return
             except DbException as e:
                 if retry == 3:
@@ -96,15 +119,91 @@ class Prometheus:
 
     async def update(self, add_jobs: dict = None, remove_jobs: list = None) -> bool:
         """
-
+        Updates prometheus configuration. The updates requested within batch_window seconds are merged and applied
+        together, with a single prometheus reload
         :param add_jobs: dictionary with {job_id_1: job_content, job_id_2: job_content}
         :param remove_jobs: list with jobs to remove [job_id_1, job_id_2]
-        :return: result. If false prometheus denies this configuration. Exception on error
+        :return: result of the batch. False if prometheus denies this configuration, None if it cannot be updated.
+            Exception on error
         """
-        for retry in range(4):
+        if self.mode == "file_sd":
+            return self._update_file_sd(add_jobs, remove_jobs)
+        return await self._update_reload(add_jobs, remove_jobs)
+
+    async def _update_reload(self, add_jobs: dict = None, remove_jobs: list = None) -> bool:
+        if self._batch is None:
+            self._batch = []
+        future = self.loop.create_future()
+        self._batch.append((add_jobs, remove_jobs, future))
+        if not self._batch_task or self._batch_task.done():
+            self._batch_task = asyncio.ensure_future(self._apply_batches(), loop=self.loop)
+        return await future
+
+    async def _apply_batches(self):
+        """
+        Applies the queued updates, one batch at a time. Updates requested while a batch is being applied are merged
+        into the next one
+        """
+        while self._batch:
+            await asyncio.sleep(self.batch_window, loop=self.loop)
+            batch, self._batch = self._batch, None
+            await self._apply_batch(batch)
+
+    @staticmethod
+    def _merge_batch(batch):
+        """
+        Merges the updates of a batch. A later request over the same job overrides the previous one
+        :param batch: list of (add_jobs, remove_jobs, future)
+        :return: add_jobs dictionary, remove_jobs list
+        """
+        add_jobs = {}
+        remove_jobs = set()
+        for batch_add_jobs, batch_remove_jobs, _ in batch:
+            for job_id, job_data in (batch_add_jobs or {}).items():
+                remove_jobs.discard(job_id)
+                add_jobs[job_id] = job_data
+            for job_id in batch_remove_jobs or ():
+                add_jobs.pop(job_id, None)
+                remove_jobs.add(job_id)
+        return add_jobs, list(remove_jobs)
+
+    async def _apply_batch(self, batch):
+        """
+        Applies the merged updates of a batch, setting the result of each caller. If prometheus denies the merged
+        configuration, the batch is split in halves that are applied separately, so that the callers whose jobs are
+        valid are not affected by an invalid job of other caller. Other failures, e.g. prometheus not reachable, are
+        not split, as they affect the whole batch
+        :param batch: list of (add_jobs, remove_jobs, future), in request order
+        :return: None
+        """
+        try:
+            result = await self._update(*self._merge_batch(batch))
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        if result is False and len(batch) > 1:
+            half = len(batch) // 2
+            await self._apply_batch(batch[:half])
+            await self._apply_batch(batch[half:])
+            return
+        for _, _, future in batch:
+            if not future.done():
+                future.set_result(result)
+
+    async def _update(self, add_jobs: dict = None, remove_jobs: list = None) -> bool:
+        """
+        Updates database and prometheus configuration file, locking the database content
+        :param add_jobs: dictionary with {job_id_1: job_content, job_id_2: job_content}
+        :param remove_jobs: list with jobs to remove [job_id_1, job_id_2]. They must not be at add_jobs
+        :return: result. False if prometheus denies this configuration, None if it cannot be updated for other reasons.
+            Exception on database error
+        """
+        for retry in range(8):
             result = True
-            if retry:  # first time do not wait
-                await asyncio.sleep(self.PROMETHEUS_LOCKED_TIME / 2, loop=self.loop)
+            if retry:  # first time do not wait. Wait longer on every retry, until lock of other worker expires
+                await asyncio.sleep(min(2 ** retry, self.PROMETHEUS_LOCKED_TIME / 2), loop=self.loop)
 
             # lock database
             now = time()
@@ -127,17 +226,18 @@ class Prometheus:
                     log_text_list.append("adding jobs: {}".format(list(add_jobs.keys())))
                     prometheus_data["scrape_configs"].update(add_jobs)
                     push_dict = {"scrape_configs." + job_id: job_data for job_id, job_data in add_jobs.items()}
-                elif remove_jobs:
+                if remove_jobs:
                     log_text_list.append("removing jobs: {}".format(list(remove_jobs)))
                     for job_id in remove_jobs:
                         prometheus_data["scrape_configs"].pop(job_id, None)
                     pull_dict = {"scrape_configs." + job_id: None for job_id in remove_jobs}
                 self.logger.debug("Updating. " + ". ".join(log_text_list))
 
-            if not await self.send_data(prometheus_data):
+            sent = await self.send_data(prometheus_data)
+            if not sent:
                 self.logger.error("Cannot update add_jobs: {}. remove_jobs: {}".format(add_jobs, remove_jobs))
                 push_dict = pull_dict = None
-                result = False
+                result = sent
 
             # unblock database
             if push_dict:
@@ -151,7 +251,111 @@ class Prometheus:
             return result
         raise LcmException("Cannot update prometheus database. Reached max retries")
 
+    # job settings that file_sd mode cannot apply per job, as they are the ones of the single file_sd job
+    file_sd_ignored_settings = ("scrape_interval", "scrape_timeout")  # targets are scraped at the global interval
+    file_sd_default_settings = {"metrics_path": "/metrics", "scheme": "http"}  # other values cannot be honoured
+
+    def _check_file_sd_job(self, job_id, job_data):
+        """
+        Checks that a job can be converted to file_sd targets without changing how they are scraped. Timing settings
+        are ignored with a warning
+        :return: None if valid, or the error text
+        """
+        for key, value in job_data.items():
+            if key in ("job_name", "nsr_id", "static_configs"):
+                continue
+            if key in self.file_sd_ignored_settings:
+                self.logger.warning("Job {}: '{}' is ignored at file_sd mode. The global one is used".format(
+                    job_id, key))
+            elif key not in self.file_sd_default_settings or value != self.file_sd_default_settings[key]:
+                return "'{}' is not allowed at file_sd mode".format(key)
+        if not self._get_file_sd_targets(job_id, job_data):
+            return "only jobs with static_configs targets are allowed at file_sd mode"
+        return None
+
+    @staticmethod
+    def _get_file_sd_targets(job_id, job_data):
+        """
+        Converts a scrape job into the content of a file_sd_configs file. Only the static_configs targets and labels
+        are kept, adding the job name and the nsr_id as labels. Other job settings are the ones of the file_sd job
+        :return: list of target groups
+        """
+        target_groups = []
+        for static_config in job_data.get("static_configs") or ():
+            labels = dict(static_config.get("labels") or {})
+            labels["job"] = job_data.get("job_name") or job_id
+            if job_data.get("nsr_id"):
+                labels["nsr_id"] = job_data["nsr_id"]
+            target_groups.append({"targets": static_config.get("targets") or [], "labels": labels})
+        return target_groups
+
+    def _update_file_sd(self, add_jobs: dict = None, remove_jobs: list = None) -> bool:
+        """
+        Writes a file of targets at file_sd_path for every added job, and deletes the files of the removed jobs.
+        Files are replaced atomically, so that prometheus never reads a partial file
+        :return: False if any job cannot be written or deleted
+        """
+        result = True
+        for job_id, job_data in (add_jobs or {}).items():
+            file_name = self.file_sd_path + job_id.replace("/", "_") + ".yml"
+            error_text = self._check_file_sd_job(job_id, job_data)
+            if error_text:
+                self.logger.error("Cannot add job {}: {}".format(job_id, error_text))
+                result = False
+                continue
+            target_groups = self._get_file_sd_targets(job_id, job_data)
+            try:
+                fd, tmp_file_name = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=self.file_sd_path)
+                try:
+                    with os.fdopen(fd, "w") as f:
+                        yaml.safe_dump(target_groups, f, indent=4, default_flow_style=False)
+                    os.chmod(tmp_file_name, 0o644)
+                    os.replace(tmp_file_name, file_name)
+                except Exception:
+                    os.unlink(tmp_file_name)
+                    raise
+            except Exception as e:
+                self.logger.error("Cannot add job {} at {}: {}".format(job_id, file_name, e))
+                result = False
+        for job_id in remove_jobs or ():
+            file_name = self.file_sd_path + job_id.replace("/", "_") + ".yml"
+            try:
+                os.remove(file_name)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                self.logger.error("Cannot remove job {} at {}: {}".format(job_id, file_name, e))
+                result = False
+        if add_jobs or remove_jobs:
+            self.logger.debug("Updated file_sd. Added jobs: {}. Removed jobs: {}".format(
+                list(add_jobs or ()), list(remove_jobs or ())))
+        return result
+
+    async def _get_reload_successful(self, session):
+        """
+        Reads the result of the last configuration reload from the prometheus_config_last_reload_successful metric
+        :param session: aiohttp.ClientSession
+        :return: True or False. None if it cannot be obtained
+        """
+        try:
+            async with session.get(self.server + "metrics") as resp:
+                if resp.status > 204:
+                    return None
+                metrics_text = await resp.text()
+            for line in metrics_text.splitlines():
+                if line.startswith("prometheus_config_last_reload_successful "):
+                    return float(line.split()[1]) == 1
+        except Exception as e:
+            self.logger.debug("Cannot read the last reload result of prometheus: {}".format(e))
+        return None
+
     async def send_data(self, new_config):
+        """
+        Writes the configuration file and reloads prometheus, restoring the previous file if it is not loaded
+        :param new_config: configuration content, as stored at database
+        :return: True if loaded. False if prometheus denies this configuration. None if it cannot be updated for
+            other reasons, e.g. prometheus is not reachable
+        """
         restore_backup = False
         del new_config["_id"]
         del new_config["_admin"]
@@ -174,25 +378,37 @@ class Prometheus:
             # self.logger.debug("new configuration: {}".format(yaml.safe_dump(new_config, indent=4,
             #                                                                 default_flow_style=False)))
             async with aiohttp.ClientSession() as session:
+                reload_successful = await self._get_reload_successful(session)
                 async with session.post(self.server + "-/reload") as resp:
+                    if resp.status == 500:
+                        # prometheus >= 2 reloads synchronously, and answers an error if configuration is not valid
+                        self.logger.error("Configuration denied by prometheus: {}".format(await resp.text()))
+                        return False
                     if resp.status > 204:
                         raise LcmException(await resp.text())
-                await asyncio.sleep(5, loop=self.loop)
                 # If prometheus does not admit this configuration, remains with the old one
                 # Then, to check if the configuration has been accepted, get the configuration from prometheus
-                # and compares with the inserted one
-                async with session.get(self.server + "api/v1/status/config") as resp:
-                    if resp.status > 204:
-                        raise LcmException(await resp.text())
-                    current_config = await resp.json()
-                    if not self._check_configuration_equal(current_config, new_config):
-                        return False
-                    else:
+                # and compares with the inserted one, until it is loaded, the reload fails or reload_timeout
+                time_limit = time() + self.reload_timeout
+                while True:
+                    last_check = time() >= time_limit
+                    async with session.get(self.server + "api/v1/status/config") as resp:
+                        if resp.status > 204:
+                            raise LcmException(await resp.text())
+                        current_config = await resp.json()
+                    if self._check_configuration_equal(current_config, new_config, log_error=last_check):
                         restore_backup = False
+                        break
+                    if reload_successful and await self._get_reload_successful(session) is False:
+                        self.logger.error("Configuration denied by prometheus")
+                        return False
+                    if last_check:
+                        return None
+                    await asyncio.sleep(self.reload_poll_interval, loop=self.loop)
             return True
         except Exception as e:
             self.logger.error("Error updating configuration url={}: {}".format(self.server, e))
-            return False
+            return None
         finally:
             if restore_backup:
                 try:
@@ -200,7 +416,7 @@ class Prometheus:
                 except Exception as e:
                     self.logger.critical("Exception while rolling back: {}".format(e))
 
-    def _check_configuration_equal(self, current_config, expected_config):
+    def _check_configuration_equal(self, current_config, expected_config, log_error=True):
         try:
             # self.logger.debug("Comparing current_config='{}' with expected_config='{}'".format(current_config,
             #                                                                                    expected_config))
@@ -210,8 +426,9 @@ class Prometheus:
             if current_jobs == expected_jobs:
                 return True
             else:
-                self.logger.error("Not all jobs have been loaded. Target jobs: {} Loaded jobs: {}".format(
-                    expected_jobs, current_jobs))
+                if log_error:
+                    self.logger.error("Not all jobs have been loaded. Target jobs: {} Loaded jobs: {}".format(
+                        expected_jobs, current_jobs))
                 return False
         except Exception as e:
             self.logger.error("Invalid obtained status from server. Error: '{}'. Obtained data: '{}'".format(
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+##
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+
+"""
+Benchmark of the NG-RO deploy target builder with a synthetic ns of many vdus.
+It compares NsLcm._get_ng_ro_target with the previous builder (linear scans of the vnfd vdus and of the image/flavor
+vim_info, and deep copies of the records), and checks that both targets are equal.
+Usage: python3 -m osm_lcm.tests.benchmark_ng_ro_target [number_of_vdus] [vdus_per_vnf] [number_of_vims]
+"""
+
+import sys
+from copy import deepcopy
+from time import time
+from osm_lcm.lcm_utils import deep_get
+from osm_lcm.ns import NsLcm
+
+
+def build_ns(number_vdus, vdus_per_vnf, number_vims):
+    """
+    Generates a ns with number_vdus vdurs, grouped in vnfs of vdus_per_vnf different vdus, each one with its own
+    image and flavor, deployed round robin over number_vims vim accounts
+    :return: nsr_id, nsd, db_nsr, db_nslcmop, db_vnfrs, db_vnfds_ref, n2vc_key_list
+    """
+    nsr_id = "nsr-0"
+    vnfd = {
+        "_id": "vnfd-0",
+        "id": "bench_vnfd",
+        "vnf-configuration": {"config-access": {"ssh-access": {"required": True}}},
+        "connection-point": [{"id": "mgmt", "internal-vld-ref": "internal"}],
+        "vdu": [{"id": "vdu-{}".format(vdu_index), "cloud-init": "#cloud-config"} for vdu_index in range(vdus_per_vnf)],
+    }
+    nsd = {
+        "vld": [{"id": "mgmtnet", "name": "mgmtnet", "mgmt-network": True, "vnfd-connection-point-ref": []}],
+    }
+    db_nsr = {
+        "name": "bench",
+        "image": [{"id": str(index), "image": "image-{}".format(index)} for index in range(vdus_per_vnf)],
+        "flavor": [{"id": str(index), "vcpu-count": 1, "memory-mb": 1024} for index in range(vdus_per_vnf)],
+    }
+    db_nslcmop = {"_id": "nslcmop-0", "operationParams": {"vimAccountId": "vim-0", "ssh_keys": ["ssh-rsa AAA"]}}
+    db_vnfrs = {}
+    for vnf_index in range((number_vdus + vdus_per_vnf - 1) // vdus_per_vnf):
+        member_vnf_index = str(vnf_index + 1)
+        nsd["vld"][0]["vnfd-connection-point-ref"].append(
+            {"member-vnf-index-ref": member_vnf_index, "vnfd-connection-point-ref": "mgmt"})
+        vdurs = []
+        for vdu_index in range(min(vdus_per_vnf, number_vdus - vnf_index * vdus_per_vnf)):
+            vdurs.append({
+                "vdu-id-ref": "vdu-{}".format(vdu_index),
+                "ns-image-id": str(vdu_index),
+                "ns-flavor-id": str(vdu_index),
+                "interfaces": [{"name": "eth0", "mgmt-vnf": True, "ns-vld-id": "mgmtnet"}],
+            })
+        db_vnfrs[member_vnf_index] = {
+            "_id": "vnfr-{}".format(vnf_index),
+            "member-vnf-index-ref": member_vnf_index,
+            "vnfd-ref": vnfd["id"],
+            "vim-account-id": "vim-{}".format(vnf_index % number_vims),
+            "vld": [{"id": "internal"}],
+            "vdur": vdurs,
+        }
+    return nsr_id, nsd, db_nsr, db_nslcmop, db_vnfrs, {vnfd["id"]: vnfd}, ["ssh-rsa BBB"]
+
+
+def legacy_target(nsr_id, nsd, db_nsr, db_nslcmop, db_vnfrs, db_vnfds_ref, n2vc_key_list):
+    """Previous implementation of the target building at NsLcm._instantiate_ng_ro, kept for comparison"""
+    target = {
+        "name": db_nsr["name"],
+        "ns": {"vld": []},
+        "vnf": [],
+        "image": deepcopy(db_nsr["image"]),
+        "flavor": deepcopy(db_nsr["flavor"]),
+        "action_id": db_nslcmop["_id"],
+    }
+    for image in target["image"]:
+        image["vim_info"] = []
+    for flavor in target["flavor"]:
+        flavor["vim_info"] = []
+    ns_params = db_nslcmop.get("operationParams")
+    ssh_keys = []
+    if ns_params.get("ssh_keys"):
+        ssh_keys += ns_params.get("ssh_keys")
+    if n2vc_key_list:
+        ssh_keys += n2vc_key_list
+    cp2target = {}
+    for vld_index, vld in enumerate(nsd.get("vld")):
+        target_vld = {"id": vld["id"],
+                      "name": vld["name"],
+                      "mgmt-network": vld.get("mgmt-network", False),
+                      "type": vld.get("type"),
+                      "vim_info": [{"vim-network-name": vld.get("vim-network-name"),
+                                    "vim_account_id": ns_params["vimAccountId"]}],
+                      }
+        for cp in vld["vnfd-connection-point-ref"]:
+            cp2target["member_vnf:{}.{}".format(cp["member-vnf-index-ref"], cp["vnfd-connection-point-ref"])] = \
+                "nsrs:{}:vld.{}".format(nsr_id, vld_index)
+        target["ns"]["vld"].append(target_vld)
+    for vnfr in db_vnfrs.values():
+        vnfd = db_vnfds_ref[vnfr["vnfd-ref"]]
+        target_vnf = deepcopy(vnfr)
+        for vld in target_vnf.get("vld", ()):
+            vnf_cp = next((cp for cp in vnfd.get("connection-point", ()) if
+                           cp.get("internal-vld-ref") == vld["id"]), None)
+            if vnf_cp:
+                ns_cp = "member_vnf:{}.{}".format(vnfr["member-vnf-index-ref"], vnf_cp["id"])
+                if cp2target.get(ns_cp):
+                    vld["target"] = cp2target[ns_cp]
+            vld["vim_info"] = [{"vim-network-name": vld.get("vim-network-name"),
+                                "vim_account_id": vnfr["vim-account-id"]}]
+        for vdur in target_vnf.get("vdur", ()):
+            vdur["vim_info"] = [{"vim_account_id": vnfr["vim-account-id"]}]
+            vdud_index, vdud = next(k for k in enumerate(vnfd["vdu"]) if k[1]["id"] == vdur["vdu-id-ref"])
+            if ssh_keys:
+                if deep_get(vdud, ("vdu-configuration", "config-access", "ssh-access", "required")):
+                    vdur["ssh-keys"] = ssh_keys
+                    vdur["ssh-access-required"] = True
+                elif deep_get(vnfd, ("vnf-configuration", "config-access", "ssh-access", "required")) and \
+                        any(iface.get("mgmt-vnf") for iface in vdur["interfaces"]):
+                    vdur["ssh-keys"] = ssh_keys
+                    vdur["ssh-access-required"] = True
+            if vdud.get("cloud-init-file"):
+                vdur["cloud-init"] = "{}:file:{}".format(vnfd["_id"], vdud.get("cloud-init-file"))
+            elif vdud.get("cloud-init"):
+                vdur["cloud-init"] = "{}:vdu:{}".format(vnfd["_id"], vdud_index)
+            ns_flavor = target["flavor"][int(vdur["ns-flavor-id"])]
+            if not next((vi for vi in ns_flavor["vim_info"] if
+                         vi and vi.get("vim_account_id") == vnfr["vim-account-id"]), None):
+                ns_flavor["vim_info"].append({"vim_account_id": vnfr["vim-account-id"]})
+            ns_image = target["image"][int(vdur["ns-image-id"])]
+            if not next((vi for vi in ns_image["vim_info"] if
+                         vi and vi.get("vim_account_id") == vnfr["vim-account-id"]), None):
+                ns_image["vim_info"].append({"vim_account_id": vnfr["vim-account-id"]})
+            vdur["vim_info"] = [{"vim_account_id": vnfr["vim-account-id"]}]
+        target["vnf"].append(target_vnf)
+    return target
+
+
+def main(number_vdus, vdus_per_vnf, number_vims):
+    ns = build_ns(number_vdus, vdus_per_vnf, number_vims)
+    db_vnfrs_copy = deepcopy(ns[4])
+    print("{} vdus, {} vdus per vnf, {} vims".format(number_vdus, vdus_per_vnf, number_vims))
+    print("{:<10} {:>10}".format("builder", "time(s)"))
+    targets = []
+    for name, builder in (("legacy", legacy_target), ("indexed", NsLcm._get_ng_ro_target)):
+        time_start = time()
+        targets.append(builder(*ns))
+        print("{:<10} {:>10.3f}".format(name, time() - time_start))
+    assert targets[0] == targets[1], "targets differ"
+    assert ns[4] == db_vnfrs_copy, "vnfrs have been modified"
+    print("targets are equal")
+
+
+if __name__ == "__main__":
+    _number_vdus = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    _vdus_per_vnf = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    _number_vims = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    main(_number_vdus, _vdus_per_vnf, _number_vims)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+##
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+
+"""
+Benchmark of the RO clients http session against a local stand-in RO server.
+It compares the persistent pooled session with the previous behaviour of opening a new session per call (emulated
+with a new client per call), counting the tcp connections accepted by the server.
+Usage: python3 -m osm_lcm.tests.benchmark_ro_client [number_of_ns] [polls_per_ns]
+"""
+
+import asyncio
+import sys
+from time import time
+from aiohttp import web
+from osm_lcm.ROclient import ROClient
+from osm_lcm.ng_ro import NgRoClient
+
+ns_status = "instance:\n  scenario_status: ACTIVE\n  vnfs: []\n  nets: []\n"
+ng_ro_status = "status: DONE\ndetails: done\n"
+
+
+class StandInRO:
+    """Minimal http server answering the RO calls used by LCM wait loops. Counts the accepted connections"""
+
+    def __init__(self):
+        self.peers = set()
+        self.requests = 0
+        self.runner = None
+        self.port = None
+
+    def _count(self, request):
+        self.requests += 1
+        self.peers.add(request.transport.get_extra_info("peername"))
+
+    async def ro_show(self, request):
+        self._count(request)
+        return web.Response(text=ns_status, content_type="application/yaml")
+
+    async def ng_ro_status(self, request):
+        self._count(request)
+        return web.Response(text=ng_ro_status, content_type="application/yaml")
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/openmano/{tenant}/instances/{ns_id}", self.ro_show)
+        # NgRoClient endpoint_url ends with '/', so urls contain a double slash
+        app.router.add_get("/ro//ns/v1/deploy/{nsr_id}/{action_id}", self.ng_ro_status)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    def reset(self):
+        self.peers = set()
+        self.requests = 0
+
+
+async def run(client_call, new_client, number_ns, polls, close_each_call):
+    shared_client = new_client()
+
+    async def ns_wait_loop(ns_index):
+        for _ in range(polls):
+            if close_each_call:
+                client = new_client()
+                await client_call(client, ns_index)
+                await client.close()
+            else:
+                await client_call(shared_client, ns_index)
+
+    await asyncio.gather(*(ns_wait_loop(ns_index) for ns_index in range(number_ns)))
+    await shared_client.close()
+
+
+async def main(number_ns, polls):
+    server = StandInRO()
+    await server.start()
+    loop = asyncio.get_event_loop()
+    ro_uri = "http://127.0.0.1:{}/openmano".format(server.port)
+    ng_ro_uri = "http://127.0.0.1:{}/ro".format(server.port)
+
+    async def ro_show(client, ns_index):
+        # a uuid avoids the name to uuid lookup
+        await client.show("ns", "00000000-0000-0000-0000-{:012d}".format(ns_index))
+
+    async def ng_ro_poll(client, ns_index):
+        await client.status("nsr-{}".format(ns_index), "action")
+
+    tenant_id = "00000000-0000-0000-0000-000000000000"
+    print("{} ns x {} polls".format(number_ns, polls))
+    print("{:<12} {:<12} {:>10} {:>12} {:>10}".format("client", "session", "requests", "connections", "time(s)"))
+    for name, client_class, uri, client_call in (("ROClient", ROClient, ro_uri, ro_show),
+                                                 ("NgRoClient", NgRoClient, ng_ro_uri, ng_ro_poll)):
+        def new_client():
+            client = client_class(loop, uri, tenant=tenant_id, pool_limit=number_ns)
+            client.tenant = tenant_id
+            return client
+
+        for close_each_call in (True, False):
+            server.reset()
+            time_start = time()
+            await run(client_call, new_client, number_ns, polls, close_each_call)
+            print("{:<12} {:<12} {:>10} {:>12} {:>10.3f}".format(
+                name, "per-call" if close_each_call else "persistent", server.requests, len(server.peers),
+                time() - time_start))
+    await server.stop()
+
+
+if __name__ == "__main__":
+    _number_ns = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    _polls = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    asyncio.get_event_loop().run_until_complete(main(_number_ns, _polls))
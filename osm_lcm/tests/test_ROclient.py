@@ -0,0 +1,140 @@
+##
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+
+import asynctest
+import yaml
+from osm_lcm.ROclient import ROClient, ROClientException
+
+
+def ns_descriptor(vm_status="ACTIVE", net_status="ACTIVE"):
+    return {
+        "nets": [
+            {"status": "ACTIVE", "ns_net_osm_id": "mgmt", "sce_net_id": "sce-mgmt", "vim_net_id": "net-1"},
+            {"status": "ACTIVE", "ns_net_osm_id": "mgmt", "vim_net_id": "net-2"},
+            {"status": net_status, "vnf_net_osm_id": "internal", "vim_net_id": "net-3", "error_msg": "net fail"},
+        ],
+        "sdn_nets": [],
+        "vnfs": [
+            {"member_vnf_index": "1", "vms": [
+                {"status": "ACTIVE", "vdu_osm_id": "vdu-a", "vim_vm_id": "vm-1"},
+                {"status": vm_status, "vdu_osm_id": "vdu-a", "vim_vm_id": "vm-2", "error_msg": "vm fail"},
+                {"status": "ACTIVE", "vdu_osm_id": "vdu-b", "vim_vm_id": "vm-3"},
+            ]},
+            {"member_vnf_index": "2", "vms": []},
+        ],
+    }
+
+
+class TestParseNsDescriptor(asynctest.TestCase):
+
+    def test_lookup_maps(self):
+        parsed = ROClient.parse_ns_descriptor(ns_descriptor())
+        self.assertEqual(parsed["status"], "ACTIVE")
+        self.assertEqual(parsed["status_info"], str({"VMs": 3, "networks": 3}))
+        self.assertEqual(list(parsed["vnfs"]), ["1", "2"])
+        # first network wins
+        self.assertEqual(parsed["ns_nets"]["mgmt"]["vim_net_id"], "net-1")
+        self.assertEqual(parsed["vnf_nets"]["internal"]["vim_net_id"], "net-3")
+        # vms of each vdu in order
+        self.assertEqual([vm["vim_vm_id"] for vm in parsed["vms"][("1", "vdu-a")]], ["vm-1", "vm-2"])
+        self.assertEqual([vm["vim_vm_id"] for vm in parsed["vms"][("1", "vdu-b")]], ["vm-3"])
+
+    def test_status(self):
+        parsed = ROClient.parse_ns_descriptor(ns_descriptor(vm_status="BUILD"))
+        self.assertEqual(parsed["status"], "BUILD")
+        self.assertEqual(parsed["status_info"], str({"VMs": "2/3", "networks": "3/3"}))
+        parsed = ROClient.parse_ns_descriptor(ns_descriptor(vm_status="VIM_ERROR", net_status="ERROR"))
+        self.assertEqual(parsed["status"], "ERROR")
+        self.assertEqual(parsed["status_info"], "Error at VIM network 'vim-id=net-3': net fail; "
+                                                "Error at VIM VM 'vim-id=vm-2': vm fail")
+        # same result as check_ns_status
+        self.assertEqual(ROClient.check_ns_status(ns_descriptor(vm_status="BUILD")), ("BUILD", str(
+            {"VMs": "2/3", "networks": "3/3"})))
+
+    def test_wrong_descriptor(self):
+        with self.assertRaises(ROClientException):
+            ROClient.parse_ns_descriptor({"nets": []})
+
+
+class Response:
+
+    def __init__(self, status, content):
+        self.status = status
+        self.content = content
+
+    async def read(self):
+        return yaml.safe_dump(self.content)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+
+class StandInRO:
+    """Session that answers from a dictionary of RO items, as if they were at a RO server"""
+
+    def __init__(self, uri, items):
+        self.uri = uri
+        self.items = items  # uuid: name
+        self.requests = []
+
+    def _item(self, method, url):
+        self.requests.append((method, url))
+        uuid = url.rsplit("/", 1)[-1]
+        if uuid in self.items:
+            return Response(200, {"instance": {"uuid": uuid, "name": self.items[uuid]}})
+        return Response(404, {"error": {"description": "not found"}})
+
+    def get(self, url, headers=None):
+        if url.endswith("/instances"):
+            self.requests.append(("GET", url))
+            return Response(200, {"instances": [{"uuid": uuid, "name": name} for uuid, name in self.items.items()]})
+        return self._item("GET", url)
+
+    def delete(self, url, headers=None):
+        response = self._item("DELETE", url)
+        self.items.pop(url.rsplit("/", 1)[-1], None)
+        return response
+
+
+class TestUuidCache(asynctest.TestCase):
+
+    async def setUp(self):
+        self.ro = ROClient(self.loop, "http://ro/openmano", tenant="osm", uuid_cache_ttl=300)
+        self.ro.tenant = "tenant-id"
+        self.ro._session = self.session = StandInRO(self.ro.uri, {"uuid-1": "ns1"})
+        self.session.closed = False
+
+    async def tearDown(self):
+        ROClient._uuid_cache.clear()
+
+    def test_default_disabled(self):
+        self.assertEqual(ROClient(self.loop, "http://ro/openmano").uuid_cache_ttl, 0)
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_outdated_uuid(self):
+        self.assertEqual((await self.ro.show("ns", "ns1"))["uuid"], "uuid-1")
+        # ns1 is deleted and created again by other worker
+        self.session.items = {"uuid-2": "ns1"}
+        self.assertEqual((await self.ro.show("ns", "ns1"))["uuid"], "uuid-2")
+        self.session.items = {"uuid-3": "ns1"}
+        await self.ro.delete("ns", "ns1")
+        self.assertEqual(self.session.requests[-1], ("DELETE", "http://ro/openmano/tenant-id/instances/uuid-3"))
+        self.assertEqual(self.session.items, {})
+        self.assertEqual(ROClient._uuid_cache, {})
+        with self.assertRaises(ROClientException) as e:
+            await self.ro.delete("ns", "ns1")
+        self.assertEqual(e.exception.http_code, 404)
@@ -15,13 +15,14 @@
 # contact: alfonso.tiernosepulveda@telefonica.com
 ##
 
+import asyncio
 import asynctest
 import logging
 
 from osm_lcm import lcm_helm_conn
 from osm_lcm.lcm_helm_conn import LCMHelmConn
 from osm_common.fslocal import FsLocal
-from asynctest.mock import Mock
+from asynctest.mock import Mock, patch
 from osm_common.dbmemory import DbMemory
 
 __author__ = "Isabel Lloret <illoret@indra.es>"
@@ -78,6 +79,19 @@ class TestLcmHelmConn(asynctest.TestCase):
         message = await self.helm_conn.exec_primitive(ee_id, primitive_name, params)
         self.assertEqual(message, "test-ok")
 
+    @asynctest.fail_on(active_handles=True)
+    async def test_execute_primitive_retry(self):
+        lcm_helm_conn.socket.gethostbyname = asynctest.Mock()
+        ee_id = "osm.helm_sample_charm_0001"
+        self.helm_conn._retry_policy.backoff = {"initial": 0.01}
+        self.helm_conn._is_ee_ready = asynctest.CoroutineMock(side_effect=[False, True])
+        self.helm_conn._execute_primitive_internal = asynctest.CoroutineMock(
+            side_effect=[ConnectionRefusedError(), ("OK", "test-ok")])
+        message = await self.helm_conn.exec_primitive(ee_id, "sleep", {})
+        self.assertEqual(message, "test-ok")
+        self.assertEqual(self.helm_conn._execute_primitive_internal.call_count, 2)
+        self.assertEqual(self.helm_conn._is_ee_ready.call_count, 2, "must retry once the ee is ready")
+
     @asynctest.fail_on(active_handles=True)
     async def test_execute_config_primitive(self):
         self.logger.debug("Execute config primitive")
@@ -98,6 +112,56 @@ class TestLcmHelmConn(asynctest.TestCase):
         await self.helm_conn.delete_execution_environment(ee_id)
         self.helm_conn._k8sclusterhelm.uninstall.assert_called_once_with("myk8s_id", "helm_sample_charm_0001")
 
+    @asynctest.fail_on(active_handles=True)
+    async def test_get_ee_address(self):
+        lcm_helm_conn.socket.gethostbyname = Mock(return_value="10.0.0.1")
+        for _ in range(2):
+            ip_addr = await self.helm_conn._get_ee_address("helm_sample_charm_0001")
+            self.assertEqual(ip_addr, "10.0.0.1")
+        lcm_helm_conn.socket.gethostbyname.assert_called_once_with("helm_sample_charm_0001")
+        # deleting the ee removes the cached address
+        self.db.get_one.return_value = {"_admin": {"helm-chart": {"id": "myk8s_id"}}}
+        self.helm_conn._k8sclusterhelm.uninstall = asynctest.CoroutineMock()
+        await self.helm_conn.delete_execution_environment("osm.helm_sample_charm_0001")
+        await self.helm_conn._get_ee_address("helm_sample_charm_0001")
+        self.assertEqual(lcm_helm_conn.socket.gethostbyname.call_count, 2)
+
+    def test_channel_pool(self):
+        with patch.object(lcm_helm_conn, "Channel", Mock(side_effect=lambda *args: Mock())):
+            pool = lcm_helm_conn.EEChannelPool(50050, idle_timeout=300)
+            entry1 = pool.acquire("ee1", "10.0.0.1")
+            entry2 = pool.acquire("ee1", "10.0.0.1")
+            self.assertIs(entry1, entry2, "channel must be reused by the requests to the same ee")
+            pool.release(entry1)
+            pool.release(entry2, failed=True)
+            entry2["channel"].close.assert_called_once_with()
+            entry3 = pool.acquire("ee1", "10.0.0.1")
+            self.assertIsNot(entry1, entry3, "a failed channel must be replaced")
+            entry4 = pool.acquire("ee1", "10.0.0.2")
+            self.assertEqual(list(pool.channels), [("ee1", "10.0.0.2")], "old address must be discarded")
+            entry3["channel"].close.assert_not_called()  # in use
+            pool.release(entry3)
+            entry3["channel"].close.assert_called_once_with()
+            pool.release(entry4)
+            pool.discard("ee1")
+            self.assertEqual(pool.channels, {})
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_channel_pool_idle(self):
+        with patch.object(lcm_helm_conn, "Channel", Mock(side_effect=lambda *args: Mock())):
+            pool = lcm_helm_conn.EEChannelPool(50050, idle_timeout=0.1, loop=self.loop)
+            entry1 = pool.acquire("ee1", "10.0.0.1")
+            pool.release(entry1)
+            entry2 = pool.acquire("ee2", "10.0.0.2")
+            # idle channels are closed without waiting for a new request
+            await asyncio.sleep(0.2)
+            entry1["channel"].close.assert_called_once_with()
+            self.assertEqual(list(pool.channels), [("ee2", "10.0.0.2")])
+            pool.release(entry2)
+            pool.close()
+            entry2["channel"].close.assert_called_once_with()
+            self.assertEqual(pool.channels, {})
+
 
 if __name__ == '__main__':
     asynctest.main()
@@ -0,0 +1,81 @@
+##
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+
+import asynctest
+from time import time
+from osm_lcm.lcm_metrics import LcmMetrics
+
+
+class Target:
+
+    def __init__(self):
+        self.value = 1
+
+    def get(self, key):
+        return key
+
+    async def get_async(self, key):
+        return key
+
+
+class TestLcmMetrics(asynctest.TestCase):
+
+    async def setUp(self):
+        self.metrics = LcmMetrics({}, self.loop)
+
+    def test_defaults(self):
+        # the http endpoint is opt-in and local
+        self.assertEqual(self.metrics.port, 0)
+        self.assertEqual(self.metrics.host, "127.0.0.1")
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_start_disabled(self):
+        # without endpoint there is neither server nor event loop lag probe
+        await self.metrics.start()
+        self.assertIsNone(self.metrics._server)
+        self.assertIsNone(self.metrics._loop_lag_task)
+        await self.metrics.stop()
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_instrument(self):
+        proxy = self.metrics.instrument(Target(), "db")
+        self.assertEqual(proxy.get("a"), "a")
+        self.assertEqual(await proxy.get_async("b"), "b")
+        self.assertEqual(proxy.value, 1)
+        # wrappers are reused
+        self.assertIs(proxy.get, proxy.get)
+        histograms = self.metrics.histograms["lcm_call_duration_seconds"]
+        self.assertEqual(histograms[(("component", "db"), ("method", "get"))].count, 1)
+        self.assertEqual(histograms[(("component", "db"), ("method", "get_async"))].count, 1)
+
+    def test_render_escape(self):
+        self.metrics.set_gauge("lcm_tasks_in_flight", {"topic": 'a"b\\c\nd'}, 1)
+        text = self.metrics.render()
+        self.assertIn('lcm_tasks_in_flight{topic="a\\"b\\\\c\\nd"} 1', text)
+
+    def test_operations(self):
+        self.metrics.message_received("ns", "instantiate", {"_id": "op1", "startTime": time()})
+        # notifications are not operations
+        self.metrics.message_received("ns", "deleted", {"_id": "ns1"})
+        self.metrics.message_received("ns", "instantiated", {"_id": "ns1", "nsr_id": "ns1"})
+        self.metrics.message_received("nsi", "instantiate", {"_id": "op2", "startTime": time()})
+        self.assertEqual(list(self.metrics.operations), ["op1", "op2"])
+        self.metrics.operation_stage("op1", "Stage 1/3")
+        self.metrics.operation_stage("op1", "Stage 2/3")
+        self.metrics.operation_stage("op1", None, finished=True)
+        histograms = self.metrics.histograms["lcm_operation_stage_duration_seconds"]
+        self.assertEqual(len(histograms), 2)
+        # op2 is not running, e.g. locked by other worker
+        self.metrics.forget_operations(set())
+        self.assertEqual(len(self.metrics.operations), 0)
@@ -0,0 +1,531 @@
+##
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+##
+
+import asyncio
+import os
+import asynctest
+import tempfile
+import threading
+from copy import deepcopy
+from unittest.mock import Mock, ANY
+from jinja2 import TemplateSyntaxError
+from osm_lcm.lcm_utils import AdmissionControl, DescriptorCache, DbAsync, LcmBase, PackageCache, PollBackoff, \
+    ReadCoalescer, RetryPolicy, TemplateCache, get_update_delta
+
+
+class TestAdmissionControl(asynctest.TestCase):
+
+    async def setUp(self):
+        self.admission = AdmissionControl({"max_pending": 2, "topic": {"ns": 1}}, loop=self.loop)
+        self.events = []
+
+    async def _operation(self, name, finish):
+        self.events.append(name + " start")
+        try:
+            await finish.wait()
+            self.events.append(name + " end")
+        except asyncio.CancelledError:
+            self.events.append(name + " cancelled")
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_limits_and_order(self):
+        finish = asyncio.Event()
+        task1 = self.admission.admit("ns", "ns_instantiate", "ns1", self._operation("ns1", finish))
+        task2 = self.admission.admit("ns", "ns_instantiate", "ns2", self._operation("ns2", finish))
+        # other topics are not limited
+        task3 = self.admission.admit("vim_account", "vim_create", "vim1", self._operation("vim1", finish))
+        self.assertEqual(len(self.admission.pending), 1, "second ns operation must be queued at admission")
+        await asyncio.sleep(0)
+        self.assertEqual(self.events, ["ns1 start", "vim1 start"])
+        finish.set()
+        await asyncio.wait([task1, task2, task3])
+        self.assertEqual(self.events, ["ns1 start", "vim1 start", "ns1 end", "vim1 end", "ns2 start", "ns2 end"])
+        self.assertEqual(self.admission.running, {})
+        status = self.admission.get_status()
+        self.assertEqual(status["admitted"], 3)
+        self.assertEqual(status["queued"], 1)
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_instance_order(self):
+        # an operation of an instance is not started before an older pending one of the same instance
+        self.admission = AdmissionControl({"command": {"ns_instantiate": 1}}, loop=self.loop)
+        finish = asyncio.Event()
+        task1 = self.admission.admit("ns", "ns_instantiate", "ns1", self._operation("instantiate1", finish))
+        task2 = self.admission.admit("ns", "ns_instantiate", "ns2", self._operation("instantiate2", finish))
+        task3 = self.admission.admit("ns", "ns_terminate", "ns2", self._operation("terminate2", finish))
+        await asyncio.sleep(0)
+        self.assertEqual(self.events, ["instantiate1 start"])
+        finish.set()
+        await asyncio.wait([task1, task2, task3])
+        self.assertLess(self.events.index("instantiate2 start"), self.events.index("terminate2 start"))
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_wait_pending_room(self):
+        finish = asyncio.Event()
+        tasks = [self.admission.admit("ns", "ns_action", "ns1", self._operation("action1", finish))]
+        # the pending queue is not full
+        await asyncio.wait_for(self.admission.wait_pending_room(), 1)
+        tasks.append(self.admission.admit("ns", "ns_action", "ns2", self._operation("action2", finish)))
+        await asyncio.wait_for(self.admission.wait_pending_room(), 1)
+        tasks.append(self.admission.admit("ns", "ns_action", "ns3", self._operation("action3", finish)))
+        # the pending queue is full with the last admitted operation
+        self.assertEqual(len(self.admission.pending), 2)
+        room = asyncio.ensure_future(self.admission.wait_pending_room())
+        await asyncio.sleep(0)
+        self.assertFalse(room.done())
+        finish.set()
+        await asyncio.wait_for(room, 1)
+        await asyncio.wait(tasks)
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_cancel_pending(self):
+        finish = asyncio.Event()
+        task1 = self.admission.admit("ns", "ns_instantiate", "ns1", self._operation("ns1", finish))
+        task2 = self.admission.admit("ns", "ns_instantiate", "ns2", self._operation("ns2", finish))
+        await asyncio.sleep(0)
+        # cancelled while pending
+        task2.cancel()
+        # cancelled before the task is started
+        task3 = self.admission.admit("ns", "ns_instantiate", "ns3", self._operation("ns3", finish))
+        task3.cancel()
+        await asyncio.wait([task2, task3])
+        for _ in range(3):
+            await asyncio.sleep(0)
+        # the operations run their own cancellation handling
+        self.assertEqual(sorted(self.events), ["ns1 start", "ns2 cancelled", "ns2 start", "ns3 cancelled", "ns3 start"])
+        self.assertEqual(self.admission.pending, [])
+        finish.set()
+        await task1
+        self.assertEqual(self.admission.running, {})
+
+
+class TestDescriptorCache(asynctest.TestCase):
+
+    async def setUp(self):
+        self.descriptors = {"nsd1": {"_id": "nsd1", "id": "ns", "_admin": {"modified": 1}}}
+        self.db = Mock()
+        self.db.get_one.side_effect = lambda table, q: self.descriptors[q["_id"]]
+        self.cache = DescriptorCache(self.db, ttl=300)
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_get(self):
+        nsd = await self.cache.get("nsds", "nsd1")
+        self.assertEqual(nsd["id"], "ns")
+        nsd = await self.cache.get("nsds", "nsd1")
+        self.assertEqual(nsd["id"], "ns")
+        self.assertEqual(self.db.get_one.call_count, 1, "second get must not read database")
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        # hits are shared with the cache, unless a copy is requested
+        self.assertIs(await self.cache.get("nsds", "nsd1"), nsd)
+        nsd_copy = await self.cache.get("nsds", "nsd1", copy=True)
+        nsd_copy["id"] = "modified"
+        self.assertEqual((await self.cache.get("nsds", "nsd1"))["id"], "ns")
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_invalidate(self):
+        await self.cache.get("nsds", "nsd1")
+        self.descriptors["nsd1"] = {"_id": "nsd1", "id": "ns-edited", "_admin": {"modified": 2}}
+        self.cache.invalidate("nsds", "nsd1")
+        self.assertEqual(self.cache.size, 0)
+        nsd = await self.cache.get("nsds", "nsd1")
+        self.assertEqual(nsd["id"], "ns-edited")
+        self.assertEqual(self.db.get_one.call_count, 2)
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_ttl(self):
+        self.cache.ttl = -1
+        await self.cache.get("nsds", "nsd1")
+        # not modified, cached content is used
+        await self.cache.get("nsds", "nsd1")
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        # modified at database
+        self.descriptors["nsd1"] = {"_id": "nsd1", "id": "ns-edited", "_admin": {"modified": 2}}
+        nsd = await self.cache.get("nsds", "nsd1")
+        self.assertEqual(nsd["id"], "ns-edited")
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_get_list(self):
+        self.descriptors["vnfd1"] = {"_id": "vnfd1", "id": "vnf1", "_admin": {"modified": 1}}
+        self.descriptors["vnfd2"] = {"_id": "vnfd2", "id": "vnf2", "_admin": {"modified": 1}}
+        self.db.get_list.side_effect = lambda table, q: [self.descriptors[_id] for _id in q["_id"]
+                                                         if _id in self.descriptors]
+        vnfds = await self.cache.get_list("vnfds", ["vnfd1", "vnfd2", "vnfd1"])
+        self.assertEqual(sorted(vnfds), ["vnfd1", "vnfd2"])
+        # a single query for all of them
+        self.db.get_list.assert_called_once_with("vnfds", {"_id": ["vnfd1", "vnfd2"]})
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+        # only the invalidated one is read again
+        self.cache.invalidate("vnfds", "vnfd2")
+        vnfds = await self.cache.get_list("vnfds", ["vnfd1", "vnfd2"])
+        self.assertEqual(vnfds["vnfd2"]["id"], "vnf2")
+        self.db.get_list.assert_called_with("vnfds", {"_id": ["vnfd2"]})
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 3))
+        # not found
+        with self.assertRaises(KeyError):
+            await self.cache.get_list("vnfds", ["vnfd1", "vnfd3"])
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_disabled(self):
+        cache = DescriptorCache(self.db, max_size=0)
+        await cache.get("nsds", "nsd1")
+        await cache.get("nsds", "nsd1")
+        self.assertEqual(self.db.get_one.call_count, 2)
+        self.assertFalse(cache.entries)
+
+
+class TestGetUpdateDelta(asynctest.TestCase):
+
+    def test_changed_leaves(self):
+        old = {"a": {"b": 1, "c": 2}, "l": [{"x": 1}, {"x": 2}]}
+        self.assertEqual(get_update_delta(old, deepcopy(old), "k"), {})
+        new = {"a": {"b": 1, "c": 3, "d": 4}, "l": [{"x": 1}, {"x": 5}]}
+        self.assertEqual(get_update_delta(old, new, "k"), {"k.a.c": 3, "k.a.d": 4, "k.l.1.x": 5})
+
+    def test_whole_parent(self):
+        # removed key
+        self.assertEqual(get_update_delta({"a": {"b": 1, "c": 2}}, {"a": {"b": 1}}, "k"), {"k.a": {"b": 1}})
+        # list with different length
+        self.assertEqual(get_update_delta({"l": [1]}, {"l": [1, 2]}, "k"), {"k.l": [1, 2]})
+        # changed type
+        self.assertEqual(get_update_delta({"a": [1]}, {"a": {"b": 1}}, "k"), {"k.a": {"b": 1}})
+        # keys that cannot be used in a dot separated path
+        self.assertEqual(get_update_delta({"a": {}}, {"a": {"b.c": 1}}, "k"), {"k.a": {"b.c": 1}})
+        self.assertEqual(get_update_delta({"a": {}}, {"a": {"$b": 1}}, "k"), {"k.a": {"$b": 1}})
+
+
+class TestDbAsync(asynctest.TestCase):
+
+    async def setUp(self):
+        self.threads = []
+        self.db = Mock()
+
+        def get_one(table, q_filter, fail_on_empty=True):
+            self.threads.append(threading.current_thread())
+            if not fail_on_empty:
+                return None
+            raise ValueError("not found")
+
+        self.db.get_one.side_effect = get_one
+        self.db_async = DbAsync(self.db)
+
+    async def tearDown(self):
+        DbAsync.configure(0)
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_inline(self):
+        DbAsync.configure(0)
+        self.assertIsNone(await self.db_async.get_one("nsrs", {"_id": "1"}, fail_on_empty=False))
+        self.assertEqual(self.threads, [threading.current_thread()])
+        self.db.get_one.assert_called_once_with("nsrs", {"_id": "1"}, fail_on_empty=False)
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_thread_pool(self):
+        DbAsync.configure(2)
+        self.assertIsNone(await self.db_async.get_one("nsrs", {"_id": "1"}, fail_on_empty=False))
+        self.assertNotEqual(self.threads, [threading.current_thread()])
+        # exceptions are raised to the caller
+        with self.assertRaises(ValueError):
+            await self.db_async.get_one("nsrs", {"_id": "1"})
+
+
+class TestWriteBuffer(asynctest.TestCase):
+
+    async def setUp(self):
+        self.db = Mock()
+        self.writes = []  # copy of the written content, as update_db_2 clears it after writing
+        self.db.set_one.side_effect = lambda table, q_filter, update_dict: self.writes.append(
+            (table, q_filter, deepcopy(update_dict)))
+        self.lcm = LcmBase(self.db, None, None, Mock())
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_buffered(self):
+        self.lcm.update_db_2("nslcmops", "op1", {"detailed-status": "1"}, buffered=True)
+        self.lcm.update_db_2("nslcmops", "op1", {"detailed-status": "2"}, buffered=True)
+        self.assertEqual(self.writes, [])
+        # a not buffered update writes the pending ones at once
+        self.lcm.update_db_2("nslcmops", "op1", {"operationState": "COMPLETED"})
+        self.assertEqual(self.writes, [("nslcmops", {"_id": "op1"}, {"detailed-status": "2",
+                                                                     "operationState": "COMPLETED",
+                                                                     "_admin.modified": ANY})])
+        self.assertEqual(self.lcm._write_buffer, {})
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_direct_write_after_buffered(self):
+        self.lcm.update_db_2("nsrs", "ns1", {"detailed-status": "deploying"}, buffered=True)
+        self.lcm.update_db_2("nslcmops", "op1", {"detailed-status": "deploying"}, buffered=True)
+        await self.lcm.db_async.set_one("nsrs", {"_id": "ns1"}, {"detailed-status": "done"})
+        self.assertEqual(self.writes, [
+            ("nsrs", {"_id": "ns1"}, {"detailed-status": "deploying", "_admin.modified": ANY}),
+            ("nsrs", {"_id": "ns1"}, {"detailed-status": "done"}),
+        ])
+        # other records are kept buffered
+        self.assertEqual(list(self.lcm._write_buffer), [("nslcmops", "op1")])
+        # a filter that does not select an _id writes the buffered records of the table
+        await self.lcm.db_async.set_list("nslcmops", {"nsInstanceId": "ns1"}, {"isCancelPending": False})
+        self.assertEqual(self.lcm._write_buffer, {})
+        self.lcm.flush_db_2()
+
+
+class FakeStorage:
+    """
+    Storage that writes a file of 100 bytes per synced package folder
+    """
+    def __init__(self, local_path):
+        self.path = local_path
+        self.synced = []
+
+    def sync(self, from_path=None):
+        self.synced.append(from_path)
+        folder = os.path.join(self.path, from_path)
+        if not os.path.isdir(folder):
+            os.mkdir(folder)
+        with open(os.path.join(folder, "package.yaml"), "w") as f:
+            f.write("x" * 100)
+
+
+class TestTemplateCache(asynctest.TestCase):
+
+    def setUp(self):
+        self.cache = TemplateCache(max_entries=3)
+
+    def test_get(self):
+        template, variables = self.cache.get("name: {{ name }} {{ count }}")
+        self.assertEqual(template.render(name="vdu", count=2), "name: vdu 2")
+        self.assertEqual(variables, frozenset(("name", "count")))
+        # same content is compiled once
+        self.assertIs(self.cache.get("name: {{ name }} {{ count }}")[0], template)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_key(self):
+        read_content = Mock(return_value="{{ a }}")
+        template, _ = self.cache.get(key=("cloud_init", "rev1"), read_content=read_content)
+        self.assertIs(self.cache.get(key=("cloud_init", "rev1"), read_content=read_content)[0], template)
+        read_content.assert_called_once_with()
+        # other key with same content shares the compiled template
+        self.assertIs(self.cache.get(key=("cloud_init", "rev2"), read_content=read_content)[0], template)
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_evict(self):
+        for index in range(4):
+            self.cache.get("{{ a }} " + str(index))
+        self.assertEqual(len(self.cache.entries), 3)
+        self.cache.get("{{ a }} 0")
+        self.assertEqual(self.cache.misses, 5)
+
+    def test_disabled(self):
+        cache = TemplateCache(max_entries=0)
+        self.assertEqual(cache.get("{{ a }}")[0].render(a=1), "1")
+        self.assertEqual(cache.entries, {})
+
+    def test_syntax_error(self):
+        with self.assertRaises(TemplateSyntaxError):
+            self.cache.get("{{ a ")
+        self.assertEqual(self.cache.entries, {})
+
+
+class TestPackageCache(asynctest.TestCase):
+
+    async def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.fs = FakeStorage(self.tmp_dir.name)
+        self.cache = PackageCache(self.fs, self.loop, max_size=250, evict=True, logger=Mock())
+
+    async def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    @staticmethod
+    def _descriptor(folder, modified=1):
+        return {"_id": folder, "_admin": {"modified": modified, "storage": {"folder": folder}}}
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_acquire(self):
+        folders = await self.cache.acquire([self._descriptor("vnfd1"), self._descriptor("vnfd1")])
+        self.assertEqual(folders, ["vnfd1"])
+        self.assertEqual(self.cache.entries["vnfd1"]["in_use"], 1)
+        self.cache.release(folders)
+        # not modified, it is not copied again
+        folders = await self.cache.acquire([self._descriptor("vnfd1")])
+        self.cache.release(folders)
+        self.assertEqual(self.fs.synced, ["vnfd1"])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        # modified
+        folders = await self.cache.acquire([self._descriptor("vnfd1", modified=2)])
+        self.cache.release(folders)
+        self.assertEqual(self.fs.synced, ["vnfd1", "vnfd1"])
+        self.assertEqual(self.cache.size, 100)
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_evict(self):
+        in_use = await self.cache.acquire([self._descriptor("vnfd1")])
+        self.cache.release(await self.cache.acquire([self._descriptor("vnfd2")]))
+        self.cache.release(await self.cache.acquire([self._descriptor("vnfd3")]))
+        # vnfd1 is the least recently used, but it is in use
+        self.assertEqual(list(self.cache.entries), ["vnfd1", "vnfd3"])
+        self.assertFalse(os.path.isdir(os.path.join(self.fs.path, "vnfd2")))
+        self.assertTrue(os.path.isdir(os.path.join(self.fs.path, "vnfd1")))
+        self.cache.release(in_use)
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_invalidate(self):
+        self.cache.release(await self.cache.acquire([self._descriptor("vnfd1")]))
+        self.cache.invalidate("vnfd1")
+        self.assertEqual(self.cache.entries, {})
+        self.assertEqual(self.cache.size, 0)
+        self.assertFalse(os.path.isdir(os.path.join(self.fs.path, "vnfd1")))
+        # invalidated while being copied
+        acquire = asyncio.ensure_future(self.cache.acquire([self._descriptor("vnfd2")]))
+        await asyncio.sleep(0)
+        self.assertIn("vnfd2", self.cache.syncing)
+        self.cache.invalidate("vnfd2")
+        self.cache.release(await acquire)
+        self.assertIsNone(self.cache.entries["vnfd2"]["revision"])
+        self.cache.release(await self.cache.acquire([self._descriptor("vnfd2")]))
+        self.assertEqual(self.fs.synced, ["vnfd1", "vnfd2", "vnfd2"])
+
+
+class TestReadCoalescer(asynctest.TestCase):
+
+    async def setUp(self):
+        self.coalescer = ReadCoalescer(ttl=10, loop=self.loop)
+        self.content = "v1"
+        self.reads = 0
+        self.release = asyncio.Event()
+
+    async def _read(self):
+        self.reads += 1
+        content = self.content
+        await self.release.wait()
+        return content
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_coalesce(self):
+        reads = [asyncio.ensure_future(self.coalescer.get("url", self._read)) for _ in range(3)]
+        await asyncio.sleep(0)
+        self.release.set()
+        self.assertEqual(await asyncio.gather(*reads), ["v1", "v1", "v1"])
+        self.assertEqual(self.reads, 1)
+        # reused from cache
+        self.assertEqual(await self.coalescer.get("url", self._read), "v1")
+        self.assertEqual(self.reads, 1)
+        self.coalescer.invalidate()
+        self.content = "v2"
+        self.assertEqual(await self.coalescer.get("url", self._read), "v2")
+        self.assertEqual(self.reads, 2)
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_invalidate_in_progress(self):
+        before_write = asyncio.ensure_future(self.coalescer.get("url", self._read))
+        while not self.reads:
+            await asyncio.sleep(0)
+        # a write is done while the read is in progress
+        self.coalescer.invalidate()
+        self.content = "v2"
+        after_write = asyncio.ensure_future(self.coalescer.get("url", self._read))
+        while self.reads < 2:
+            await asyncio.sleep(0)
+        self.release.set()
+        self.assertEqual(await before_write, "v1")
+        self.assertEqual(await after_write, "v2")
+        self.assertEqual(self.reads, 2)
+        # the outdated result is not cached
+        self.assertEqual(await self.coalescer.get("url", self._read), "v2")
+        self.assertEqual(self.reads, 2)
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_read_while_writing(self):
+        with self.coalescer.writing():
+            # a read started while the write is in progress gets the content previous to the write
+            while_writing = asyncio.ensure_future(self.coalescer.get("url", self._read))
+            while not self.reads:
+                await asyncio.sleep(0)
+            self.content = "v2"
+        after_write = asyncio.ensure_future(self.coalescer.get("url", self._read))
+        while self.reads < 2:
+            await asyncio.sleep(0)
+        self.release.set()
+        self.assertEqual(await while_writing, "v1")
+        self.assertEqual(await after_write, "v2")
+        # the outdated result is not cached
+        self.assertEqual(await self.coalescer.get("url", self._read), "v2")
+        self.assertEqual(self.reads, 2)
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_not_cacheable(self):
+        self.release.set()
+        await self.coalescer.get("url", self._read, cacheable=lambda result: result != "v1")
+        await self.coalescer.get("url", self._read, cacheable=lambda result: result != "v1")
+        self.assertEqual(self.reads, 2)
+
+
+class TestPollBackoff(asynctest.TestCase):
+
+    def test_growth(self):
+        backoff = PollBackoff({"initial": 1, "max": 4, "factor": 2, "jitter": 0})
+        self.assertEqual([backoff.next_delay() for _ in range(4)], [1, 2, 4, 4])
+        backoff.progress()
+        self.assertEqual(backoff.next_delay(), 1)
+
+    def test_vim_type(self):
+        config = {"initial": 2, "jitter": 0, "vim_type": {"openstack": {"initial": 5}}}
+        self.assertEqual(PollBackoff(config, vim_type="openstack").next_delay(), 5)
+        self.assertEqual(PollBackoff(config, vim_type="vmware").next_delay(), 2)
+
+    def test_min_interval(self):
+        # a zero interval would poll in a loop without pause
+        backoff = PollBackoff({"initial": 0, "max": 0, "jitter": 0})
+        self.assertEqual(backoff.next_delay(), PollBackoff.min_interval)
+        self.assertEqual(backoff.next_delay(), PollBackoff.min_interval)
+
+
+class TestRetryPolicy(asynctest.TestCase):
+
+    async def setUp(self):
+        self.backoff = {"initial": 0.01, "max": 0.01, "jitter": 0}
+        self.calls = 0
+
+    async def _fail(self, times):
+        self.calls += 1
+        if self.calls <= times:
+            raise ConnectionRefusedError()
+        return "ok"
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_retry(self):
+        policy = RetryPolicy(self.backoff, max_attempts=3, retry_exceptions=ConnectionRefusedError, loop=self.loop)
+        self.assertEqual(await policy.run(lambda: self._fail(2)), "ok")
+        self.calls = 0
+        with self.assertRaises(ConnectionRefusedError):
+            await policy.run(lambda: self._fail(3))
+        self.assertEqual(self.calls, 3)
+        # not retriable exceptions are raised at once
+        policy = RetryPolicy(self.backoff, retry_exceptions=KeyError, loop=self.loop)
+        self.calls = 0
+        with self.assertRaises(ConnectionRefusedError):
+            await policy.run(lambda: self._fail(1))
+        self.assertEqual(self.calls, 1)
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_readiness_deadline(self):
+        readiness = asynctest.CoroutineMock(return_value=False)
+        policy = RetryPolicy(self.backoff, max_attempts=3, retry_exceptions=ConnectionRefusedError, loop=self.loop)
+        # a probe that never succeeds is polled until the default deadline
+        policy.readiness_deadline = 0.1
+        with self.assertRaises(ConnectionRefusedError):
+            await policy.run(lambda: self._fail(1), readiness=readiness)
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(readiness.called)
+        readiness.return_value = True
+        self.calls = 0
+        self.assertEqual(await policy.run(lambda: self._fail(1), readiness=readiness), "ok")
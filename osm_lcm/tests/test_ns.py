@@ -19,13 +19,14 @@
 import asynctest   # pip3 install asynctest --user
 import asyncio
 import yaml
+from copy import deepcopy
 from os import getenv
 from osm_lcm import ns
 from osm_common.dbmemory import DbMemory
 from osm_common.msgkafka import MsgKafka
 from osm_common.fslocal import FsLocal
 from osm_lcm.lcm_utils import TaskRegistry
-from osm_lcm.ROclient import ROClient
+from osm_lcm.ROclient import ROClient, ROClientException
 from uuid import uuid4
 # from asynctest.mock import patch
 
@@ -593,6 +594,128 @@ class TestMyNS(asynctest.TestCase):
         self.assertEqual(db_nsr.get("errorDescription "), None, "errorDescription different than None")
         self.assertEqual(db_nsr.get("errorDetail"), None, "errorDetail different than None")
 
+    @asynctest.fail_on(active_handles=True)   # all async tasks must be completed
+    async def test_get_vnfds(self):
+        nsr_id = descriptors.test_ids["TEST-A"]["ns"]
+        db_vnfrs_list = self.db.get_list("vnfrs", {"nsr-id-ref": nsr_id})
+        db_vnfds, db_vnfds_ref, db_vnfds_index = await self.my_ns._get_vnfds(db_vnfrs_list)
+        for vnfr in db_vnfrs_list:
+            self.assertEqual(db_vnfds[vnfr["vnfd-id"]]["_id"], vnfr["vnfd-id"])
+            self.assertIs(db_vnfds_ref[vnfr["vnfd-ref"]], db_vnfds[vnfr["vnfd-id"]])
+            self.assertIs(db_vnfds_index[vnfr["member-vnf-index-ref"]], db_vnfds[vnfr["vnfd-id"]])
+        # second time they are got from cache
+        misses = self.my_ns.descriptor_cache.misses
+        await self.my_ns._get_vnfds(db_vnfrs_list)
+        self.assertEqual(self.my_ns.descriptor_cache.misses, misses)
+
+    @asynctest.fail_on(active_handles=True)   # all async tasks must be completed
+    async def test_RO_shared(self):
+        shared_id = "shared.vnfd.test"
+        for nsr_id in ("ns1", "ns2"):
+            await self.my_ns._lock_RO_shared(shared_id, nsr_id)
+            await self.my_ns._acquire_RO_shared(shared_id, nsr_id)
+            await self.my_ns._unlock_RO_shared(shared_id, nsr_id)
+        db_shared = self.db.get_one("admin", {"_id": "RO_shared:" + shared_id})
+        self.assertEqual(set(db_shared["users"]), {"ns1", "ns2"})
+        self.assertIsNone(db_shared["locked_by"])
+        # deleted from RO only by the last user
+        await self.my_ns._delete_RO_shared("", "vnfd", "ro-vnfd", shared_id, "ns1")
+        self.my_ns.RO.delete.assert_not_called()
+        await self.my_ns._delete_RO_shared("", "vnfd", "ro-vnfd", shared_id, "ns2")
+        self.my_ns.RO.delete.assert_called_once_with("vnfd", "ro-vnfd")
+        self.assertIsNone(self.db.get_one("admin", {"_id": "RO_shared:" + shared_id}, fail_on_empty=False))
+
+    @asynctest.fail_on(active_handles=True)   # all async tasks must be completed
+    async def test_RO_shared_lock(self):
+        shared_id = "shared.vnfd.test"
+        await self.my_ns._lock_RO_shared(shared_id, "ns1")
+        # other ns, e.g. at other worker, waits until it is unlocked
+        lock_task = asyncio.ensure_future(self.my_ns._lock_RO_shared(shared_id, "ns2"), loop=self.loop)
+        await asyncio.sleep(0.1, loop=self.loop)
+        self.assertFalse(lock_task.done())
+        await self.my_ns._acquire_RO_shared(shared_id, "ns1")
+        await self.my_ns._unlock_RO_shared(shared_id, "ns1")
+        await lock_task
+        self.assertEqual(self.db.get_one("admin", {"_id": "RO_shared:" + shared_id})["locked_by"], "ns2")
+        # an expired lock is taken
+        self.my_ns.RO_SHARED_LOCKED_TIME = 0
+        await self.my_ns._lock_RO_shared(shared_id, "ns3")
+        self.assertEqual(self.db.get_one("admin", {"_id": "RO_shared:" + shared_id})["locked_by"], "ns3")
+
+    @asynctest.fail_on(active_handles=True)   # all async tasks must be completed
+    async def test_RO_shared_instantiate_error(self):
+        # the last user fails creating the descriptor, that is deleted from RO
+        shared_id = "shared.vnfd.test"
+        self.my_ns.RO.get_list.return_value = [{"uuid": "ro-vnfd"}]
+        await self.my_ns._lock_RO_shared(shared_id, "ns1")
+        await self.my_ns._acquire_RO_shared(shared_id, "ns1")
+        await self.my_ns._release_RO_shared_on_error("", "vnfd", None, shared_id, "ns1")
+        await self.my_ns._unlock_RO_shared(shared_id, "ns1")
+        self.my_ns.RO.get_list.assert_called_once_with("vnfd", filter_by={"osm_id": shared_id})
+        self.my_ns.RO.delete.assert_called_once_with("vnfd", "ro-vnfd")
+        self.assertIsNone(self.db.get_one("admin", {"_id": "RO_shared:" + shared_id}, fail_on_empty=False))
+        # if RO deletion fails, the ns remains as user, so that deletion is retried on terminate
+        self.my_ns.RO.delete.side_effect = ROClientException("error", http_code=500)
+        await self.my_ns._lock_RO_shared(shared_id, "ns1")
+        await self.my_ns._acquire_RO_shared(shared_id, "ns1")
+        await self.my_ns._release_RO_shared_on_error("", "vnfd", "ro-vnfd", shared_id, "ns1")
+        await self.my_ns._unlock_RO_shared(shared_id, "ns1")
+        self.assertEqual(list(self.db.get_one("admin", {"_id": "RO_shared:" + shared_id})["users"]), ["ns1"])
+
+    def test_update_if_changed(self):
+        record = {"a": 1, "b": {"c": 2}}
+        self.assertFalse(ns.NsLcm._update_if_changed(record, {"a": 1, "b": {"c": 2}}))
+        self.assertTrue(ns.NsLcm._update_if_changed(record, {"a": 1, "d": None}))
+        self.assertEqual(record, {"a": 1, "b": {"c": 2}, "d": None})
+        self.assertTrue(ns.NsLcm._update_if_changed(record, {"b": {"c": 3}}))
+        self.assertEqual(record["b"], {"c": 3})
+
+    def test_get_ng_ro_target(self):
+        vnfd = {
+            "_id": "vnfd-0",
+            "id": "vnfd",
+            "vnf-configuration": {"config-access": {"ssh-access": {"required": True}}},
+            "connection-point": [{"id": "mgmt", "internal-vld-ref": "internal"}],
+            "vdu": [{"id": "vdu-0", "cloud-init": "#cloud-config"}, {"id": "vdu-1", "cloud-init-file": "init"}],
+        }
+        nsd = {"vld": [{"id": "mgmtnet", "name": "mgmtnet", "mgmt-network": True, "vnfd-connection-point-ref": [
+            {"member-vnf-index-ref": "1", "vnfd-connection-point-ref": "mgmt"},
+            {"member-vnf-index-ref": "2", "vnfd-connection-point-ref": "mgmt"}]}]}
+        db_nsr = {"name": "ns", "image": [{"id": "0", "image": "image"}], "flavor": [{"id": "0", "vcpu-count": 1}]}
+        db_nslcmop = {"_id": "nslcmop-0", "operationParams": {"vimAccountId": "vim-0", "ssh_keys": ["ssh-rsa A"]}}
+        db_vnfrs = {}
+        for vnf_index, vim_account_id in (("1", "vim-0"), ("2", "vim-1")):
+            db_vnfrs[vnf_index] = {
+                "member-vnf-index-ref": vnf_index, "vnfd-ref": "vnfd", "vim-account-id": vim_account_id,
+                "vld": [{"id": "internal"}],
+                "vdur": [{"vdu-id-ref": vdu_id, "ns-image-id": "0", "ns-flavor-id": "0",
+                          "interfaces": [{"name": "eth0", "mgmt-vnf": vdu_id == "vdu-0"}]}
+                         for vdu_id in ("vdu-0", "vdu-1")],
+            }
+        db_vnfrs_copy = deepcopy(db_vnfrs)
+        target = ns.NsLcm._get_ng_ro_target("nsr-0", nsd, db_nsr, db_nslcmop, db_vnfrs, {"vnfd": vnfd},
+                                            ["ssh-rsa B"])
+        # records are not modified
+        self.assertEqual(db_vnfrs, db_vnfrs_copy)
+        self.assertNotIn("vim_info", db_nsr["image"][0])
+        self.assertEqual(target["action_id"], "nslcmop-0")
+        self.assertEqual(target["ns"]["vld"][0]["vim_info"],
+                         [{"vim-network-name": None, "vim_account_id": "vim-0"}])
+        # image and flavor are added once per vim
+        self.assertEqual(target["image"][0]["vim_info"], [{"vim_account_id": "vim-0"}, {"vim_account_id": "vim-1"}])
+        self.assertEqual(target["flavor"][0]["vim_info"], [{"vim_account_id": "vim-0"}, {"vim_account_id": "vim-1"}])
+        target_vnf = target["vnf"][1]
+        self.assertEqual(target_vnf["vld"][0]["target"], "nsrs:nsr-0:vld.0")
+        self.assertEqual(target_vnf["vld"][0]["vim_info"], [{"vim-network-name": None, "vim_account_id": "vim-1"}])
+        vdur_0, vdur_1 = target_vnf["vdur"]
+        # ssh keys only at the management vdu
+        self.assertEqual(vdur_0["ssh-keys"], ["ssh-rsa A", "ssh-rsa B"])
+        self.assertTrue(vdur_0["ssh-access-required"])
+        self.assertNotIn("ssh-keys", vdur_1)
+        self.assertEqual(vdur_0["cloud-init"], "vnfd-0:vdu:0")
+        self.assertEqual(vdur_1["cloud-init"], "vnfd-0:file:init")
+        self.assertEqual(vdur_1["vim_info"], [{"vim_account_id": "vim-1"}])
+
     @asynctest.fail_on(active_handles=True)   # all async tasks must be completed
     async def test_terminate_without_configuration(self):
         nsr_id = descriptors.test_ids["TEST-A"]["ns"]
@@ -15,7 +15,11 @@
 # contact: alfonso.tiernosepulveda@telefonica.com
 ##
 
+import asyncio
 import asynctest
+import tempfile
+import yaml
+from os import listdir
 from osm_lcm.prometheus import Prometheus, initial_prometheus_data
 from asynctest.mock import Mock
 from osm_common.dbmemory import DbMemory
@@ -111,6 +115,92 @@ class TestPrometheus(asynctest.TestCase):
         self.assertEqual(update_dict, expected_final_set, 'invalid set and unlock values')
         self.assertEqual(unset_dict, {'scrape_configs.job1': None}, 'invalid unset and unlock values')
 
+    @asynctest.fail_on(active_handles=True)
+    async def test_update_batch(self):
+        # concurrent updates are merged and applied with a single configuration change
+        self.p.batch_window = 0.1
+        self.db.get_one.return_value = {"_id": "prometheus", "_admin": {}, "scrape_configs": {}}
+        self.db.set_one.return_value = {'update': 1}
+        self.p.send_data = asynctest.CoroutineMock(return_value=True)
+        results = await asyncio.gather(self.p.update(add_jobs={'job1': {'job_name': 'job1'}}),
+                                       self.p.update(add_jobs={'job2': {'job_name': 'job2'}}),
+                                       self.p.update(remove_jobs=['job1', 'job3']),
+                                       loop=self.loop)
+        self.assertEqual(results, [True, True, True])
+        self.p.send_data.assert_called_once()
+        set_one_calls = self.db.set_one.call_args_list
+        self.assertEqual(len(set_one_calls), 2, 'db.set_one must be called twice, block and unblock')
+        update_dict = set_one_calls[1][1]['update_dict']
+        unset_dict = set_one_calls[1][1]['unset']
+        self.assertEqual(update_dict['scrape_configs.job2'], {'job_name': 'job2'})
+        self.assertNotIn('scrape_configs.job1', update_dict, 'job removed later must not be added')
+        self.assertEqual(unset_dict, {'scrape_configs.job1': None, 'scrape_configs.job3': None})
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_update_batch_invalid_job(self):
+        # an invalid job makes fail only its caller
+        self.p.batch_window = 0.1
+        self.db.get_one.side_effect = lambda *args, **kwargs: {"_id": "prometheus", "_admin": {},
+                                                               "scrape_configs": {}}
+        self.db.set_one.return_value = {'update': 1}
+
+        async def send_data(new_config):
+            return all(job['job_name'] != 'invalid' for job in new_config['scrape_configs'].values())
+
+        self.p.send_data = asynctest.CoroutineMock(side_effect=send_data)
+        results = await asyncio.gather(self.p.update(add_jobs={'job1': {'job_name': 'job1'}}),
+                                       self.p.update(add_jobs={'job2': {'job_name': 'invalid'}}),
+                                       self.p.update(add_jobs={'job3': {'job_name': 'job3'}}),
+                                       loop=self.loop)
+        self.assertEqual(results, [True, False, True])
+        # merged batch, then job1, then job2 and job3, then job2, then job3
+        self.assertEqual(self.p.send_data.call_count, 5)
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_update_batch_not_reachable(self):
+        # a failure that is not a denied configuration is not retried splitting the batch
+        self.p.batch_window = 0.1
+        self.db.get_one.side_effect = lambda *args, **kwargs: {"_id": "prometheus", "_admin": {},
+                                                               "scrape_configs": {}}
+        self.db.set_one.return_value = {'update': 1}
+        self.p.send_data = asynctest.CoroutineMock(return_value=None)
+        results = await asyncio.gather(self.p.update(add_jobs={'job1': {'job_name': 'job1'}}),
+                                       self.p.update(add_jobs={'job2': {'job_name': 'job2'}}),
+                                       loop=self.loop)
+        self.assertFalse(any(results))
+        self.p.send_data.assert_called_once()
+
+    @asynctest.fail_on(active_handles=True)
+    async def test_update_file_sd(self):
+        with tempfile.TemporaryDirectory() as file_sd_path:
+            p = Prometheus({'uri': 'http:prometheus:9090', 'path': '/etc/prometheus', 'mode': 'file_sd',
+                            'file_sd_path': file_sd_path}, worker_id='1', db=self.db, loop=self.loop)
+            p.send_data = asynctest.CoroutineMock()
+            job = {'job_name': 'job1', 'nsr_id': 'nsr1',
+                   'static_configs': [{'targets': ['1.1.1.1:9100'], 'labels': {'vnf': '1'}}]}
+            result = await p.update(add_jobs={'job1': job, 'job2': {'job_name': 'job2'}})
+            self.assertFalse(result, 'jobs without static_configs are not allowed')
+            self.assertEqual(listdir(file_sd_path), ['job1.yml'])
+            with open(file_sd_path + '/job1.yml') as f:
+                self.assertEqual(yaml.safe_load(f), [{'targets': ['1.1.1.1:9100'],
+                                                      'labels': {'vnf': '1', 'job': 'job1', 'nsr_id': 'nsr1'}}])
+            # settings of the file_sd job cannot be changed per job
+            static_configs = [{'targets': ['1.1.1.1:9100']}]
+            result = await p.update(add_jobs={'job3': {'job_name': 'job3', 'metrics_path': '/other',
+                                                       'static_configs': static_configs},
+                                              'job4': {'job_name': 'job4', 'params': {'module': ['if_mib']},
+                                                       'static_configs': static_configs}})
+            self.assertFalse(result, 'jobs with other metrics_path or params are not allowed')
+            self.assertEqual(listdir(file_sd_path), ['job1.yml'])
+            result = await p.update(add_jobs={'job5': {'job_name': 'job5', 'metrics_path': '/metrics',
+                                                       'scrape_interval': '30s', 'static_configs': static_configs}})
+            self.assertTrue(result, 'default metrics_path is allowed and scrape_interval is ignored')
+            result = await p.update(remove_jobs=['job1', 'job3', 'job5'])
+            self.assertTrue(result)
+            self.assertEqual(listdir(file_sd_path), [])
+            p.send_data.assert_not_called()
+            self.db.set_one.assert_not_called()
+
     def test_parse_job(self):
         text_to_parse = """
             # yaml format with jinja2
@@ -48,6 +48,7 @@ class VimLcm(LcmBase):
         self.loop = loop
         self.lcm_tasks = lcm_tasks
         self.ro_config = config["ro_config"]
+        self.RO = ROclient.ROClient(self.loop, **self.ro_config)
 
         super().__init__(db, msg, fs, self.logger)
 
@@ -71,10 +72,10 @@ class VimLcm(LcmBase):
         RO_sdn_id = None
         try:
             step = "Getting vim-id='{}' from db".format(vim_id)
-            db_vim = self.db.get_one("vim_accounts", {"_id": vim_id})
+            db_vim = await self.db_async.get_one("vim_accounts", {"_id": vim_id})
             if vim_content.get("config") and vim_content["config"].get("sdn-controller"):
                 step = "Getting sdn-controller-id='{}' from db".format(vim_content["config"]["sdn-controller"])
-                db_sdn = self.db.get_one("sdns", {"_id": vim_content["config"]["sdn-controller"]})
+                db_sdn = await self.db_async.get_one("sdns", {"_id": vim_content["config"]["sdn-controller"]})
 
                 # If the VIM account has an associated SDN account, also
                 # wait for any previous tasks in process for the SDN
@@ -90,7 +91,7 @@ class VimLcm(LcmBase):
             db_vim_update["_admin.deployed.RO"] = None
             db_vim_update["_admin.detailed-status"] = step
             self.update_db_2("vim_accounts", vim_id, db_vim_update)
-            RO = ROclient.ROClient(self.loop, **self.ro_config)
+            RO = self.RO
             vim_RO = deepcopy(vim_content)
             vim_RO.pop("_id", None)
             vim_RO.pop("_admin", None)
@@ -194,12 +195,12 @@ class VimLcm(LcmBase):
             # wait for any previous tasks in process
             await self.lcm_tasks.waitfor_related_HA('vim', 'edit', op_id)
 
-            db_vim = self.db.get_one("vim_accounts", {"_id": vim_id})
+            db_vim = await self.db_async.get_one("vim_accounts", {"_id": vim_id})
 
             if db_vim.get("_admin") and db_vim["_admin"].get("deployed") and db_vim["_admin"]["deployed"].get("RO"):
                 if vim_content.get("config") and vim_content["config"].get("sdn-controller"):
                     step = "Getting sdn-controller-id='{}' from db".format(vim_content["config"]["sdn-controller"])
-                    db_sdn = self.db.get_one("sdns", {"_id": vim_content["config"]["sdn-controller"]})
+                    db_sdn = await self.db_async.get_one("sdns", {"_id": vim_content["config"]["sdn-controller"]})
 
                     # If the VIM account has an associated SDN account, also
                     # wait for any previous tasks in process for the SDN
@@ -214,7 +215,7 @@ class VimLcm(LcmBase):
 
                 RO_vim_id = db_vim["_admin"]["deployed"]["RO"]
                 step = "Editing vim at RO"
-                RO = ROclient.ROClient(self.loop, **self.ro_config)
+                RO = self.RO
                 vim_RO = deepcopy(vim_content)
                 vim_RO.pop("_id", None)
                 vim_RO.pop("_admin", None)
@@ -319,10 +320,10 @@ class VimLcm(LcmBase):
             # wait for any previous tasks in process
             await self.lcm_tasks.waitfor_related_HA('vim', 'delete', op_id)
 
-            db_vim = self.db.get_one("vim_accounts", {"_id": vim_id})
+            db_vim = await self.db_async.get_one("vim_accounts", {"_id": vim_id})
             if db_vim.get("_admin") and db_vim["_admin"].get("deployed") and db_vim["_admin"]["deployed"].get("RO"):
                 RO_vim_id = db_vim["_admin"]["deployed"]["RO"]
-                RO = ROclient.ROClient(self.loop, **self.ro_config)
+                RO = self.RO
                 step = "Detaching vim from RO tenant"
                 try:
                     await RO.detach("vim_account", RO_vim_id)
@@ -343,7 +344,7 @@ class VimLcm(LcmBase):
             else:
                 # nothing to delete
                 self.logger.error(logging_text + "Nothing to remove at RO")
-            self.db.del_one("vim_accounts", {"_id": vim_id})
+            await self.db_async.del_one("vim_accounts", {"_id": vim_id})
             db_vim = None
             self.logger.debug(logging_text + "Exit Ok")
             return
@@ -390,6 +391,7 @@ class WimLcm(LcmBase):
         self.loop = loop
         self.lcm_tasks = lcm_tasks
         self.ro_config = config["ro_config"]
+        self.RO = ROclient.ROClient(self.loop, **self.ro_config)
 
         super().__init__(db, msg, fs, self.logger)
 
@@ -411,13 +413,13 @@ class WimLcm(LcmBase):
         exc = None
         try:
             step = "Getting wim-id='{}' from db".format(wim_id)
-            db_wim = self.db.get_one("wim_accounts", {"_id": wim_id})
+            db_wim = await self.db_async.get_one("wim_accounts", {"_id": wim_id})
             db_wim_update["_admin.deployed.RO"] = None
 
             step = "Creating wim at RO"
             db_wim_update["_admin.detailed-status"] = step
             self.update_db_2("wim_accounts", wim_id, db_wim_update)
-            RO = ROclient.ROClient(self.loop, **self.ro_config)
+            RO = self.RO
             wim_RO = deepcopy(wim_content)
             wim_RO.pop("_id", None)
             wim_RO.pop("_admin", None)
@@ -512,13 +514,13 @@ class WimLcm(LcmBase):
             # wait for any previous tasks in process
             await self.lcm_tasks.waitfor_related_HA('wim', 'edit', op_id)
 
-            db_wim = self.db.get_one("wim_accounts", {"_id": wim_id})
+            db_wim = await self.db_async.get_one("wim_accounts", {"_id": wim_id})
 
             if db_wim.get("_admin") and db_wim["_admin"].get("deployed") and db_wim["_admin"]["deployed"].get("RO"):
 
                 RO_wim_id = db_wim["_admin"]["deployed"]["RO"]
                 step = "Editing wim at RO"
-                RO = ROclient.ROClient(self.loop, **self.ro_config)
+                RO = self.RO
                 wim_RO = deepcopy(wim_content)
                 wim_RO.pop("_id", None)
                 wim_RO.pop("_admin", None)
@@ -616,10 +618,10 @@ class WimLcm(LcmBase):
             # wait for any previous tasks in process
             await self.lcm_tasks.waitfor_related_HA('wim', 'delete', op_id)
 
-            db_wim = self.db.get_one("wim_accounts", {"_id": wim_id})
+            db_wim = await self.db_async.get_one("wim_accounts", {"_id": wim_id})
             if db_wim.get("_admin") and db_wim["_admin"].get("deployed") and db_wim["_admin"]["deployed"].get("RO"):
                 RO_wim_id = db_wim["_admin"]["deployed"]["RO"]
-                RO = ROclient.ROClient(self.loop, **self.ro_config)
+                RO = self.RO
                 step = "Detaching wim from RO tenant"
                 try:
                     await RO.detach("wim_account", RO_wim_id)
@@ -640,7 +642,7 @@ class WimLcm(LcmBase):
             else:
                 # nothing to delete
                 self.logger.error(logging_text + "Nohing to remove at RO")
-            self.db.del_one("wim_accounts", {"_id": wim_id})
+            await self.db_async.del_one("wim_accounts", {"_id": wim_id})
             db_wim = None
             self.logger.debug(logging_text + "Exit Ok")
             return
@@ -685,6 +687,7 @@ class SdnLcm(LcmBase):
         self.loop = loop
         self.lcm_tasks = lcm_tasks
         self.ro_config = config["ro_config"]
+        self.RO = ROclient.ROClient(self.loop, **self.ro_config)
 
         super().__init__(db, msg, fs, self.logger)
 
@@ -707,14 +710,14 @@ class SdnLcm(LcmBase):
         exc = None
         try:
             step = "Getting sdn from db"
-            db_sdn = self.db.get_one("sdns", {"_id": sdn_id})
+            db_sdn = await self.db_async.get_one("sdns", {"_id": sdn_id})
             db_sdn_update["_admin.deployed.RO"] = None
 
             step = "Creating sdn at RO"
             db_sdn_update["_admin.detailed-status"] = step
             self.update_db_2("sdns", sdn_id, db_sdn_update)
 
-            RO = ROclient.ROClient(self.loop, **self.ro_config)
+            RO = self.RO
             sdn_RO = deepcopy(sdn_content)
             sdn_RO.pop("_id", None)
             sdn_RO.pop("_admin", None)
@@ -780,11 +783,11 @@ class SdnLcm(LcmBase):
             # wait for any previous tasks in process
             await self.lcm_tasks.waitfor_related_HA('sdn', 'edit', op_id)
 
-            db_sdn = self.db.get_one("sdns", {"_id": sdn_id})
+            db_sdn = await self.db_async.get_one("sdns", {"_id": sdn_id})
             RO_sdn_id = None
             if db_sdn.get("_admin") and db_sdn["_admin"].get("deployed") and db_sdn["_admin"]["deployed"].get("RO"):
                 RO_sdn_id = db_sdn["_admin"]["deployed"]["RO"]
-                RO = ROclient.ROClient(self.loop, **self.ro_config)
+                RO = self.RO
                 step = "Editing sdn at RO"
                 sdn_RO = deepcopy(sdn_content)
                 sdn_RO.pop("_id", None)
@@ -850,10 +853,10 @@ class SdnLcm(LcmBase):
             # wait for any previous tasks in process
             await self.lcm_tasks.waitfor_related_HA('sdn', 'delete', op_id)
 
-            db_sdn = self.db.get_one("sdns", {"_id": sdn_id})
+            db_sdn = await self.db_async.get_one("sdns", {"_id": sdn_id})
             if db_sdn.get("_admin") and db_sdn["_admin"].get("deployed") and db_sdn["_admin"]["deployed"].get("RO"):
                 RO_sdn_id = db_sdn["_admin"]["deployed"]["RO"]
-                RO = ROclient.ROClient(self.loop, **self.ro_config)
+                RO = self.RO
                 step = "Deleting sdn from RO"
                 try:
                     await RO.delete("sdn", RO_sdn_id)
@@ -865,7 +868,7 @@ class SdnLcm(LcmBase):
             else:
                 # nothing to delete
                 self.logger.error(logging_text + "Skipping. There is not RO information at database")
-            self.db.del_one("sdns", {"_id": sdn_id})
+            await self.db_async.del_one("sdns", {"_id": sdn_id})
             db_sdn = None
             self.logger.debug("sdn_delete task sdn_id={} Exit Ok".format(sdn_id))
             return
@@ -953,7 +956,7 @@ class K8sClusterLcm(LcmBase):
         try:
             step = "Getting k8scluster-id='{}' from db".format(k8scluster_id)
             self.logger.debug(logging_text + step)
-            db_k8scluster = self.db.get_one("k8sclusters", {"_id": k8scluster_id})
+            db_k8scluster = await self.db_async.get_one("k8sclusters", {"_id": k8scluster_id})
             self.db.encrypt_decrypt_fields(db_k8scluster.get("credentials"), 'decrypt', ['password', 'secret'],
                                            schema_version=db_k8scluster["schema_version"], salt=db_k8scluster["_id"])
             k8s_credentials = yaml.safe_dump(db_k8scluster.get("credentials"))
@@ -1062,7 +1065,7 @@ class K8sClusterLcm(LcmBase):
         try:
             step = "Getting k8scluster='{}' from db".format(k8scluster_id)
             self.logger.debug(logging_text + step)
-            db_k8scluster = self.db.get_one("k8sclusters", {"_id": k8scluster_id})
+            db_k8scluster = await self.db_async.get_one("k8sclusters", {"_id": k8scluster_id})
             k8s_hc_id = deep_get(db_k8scluster, ("_admin", "helm-chart", "id"))
             k8s_jb_id = deep_get(db_k8scluster, ("_admin", "juju-bundle", "id"))
 
@@ -1083,7 +1086,7 @@ class K8sClusterLcm(LcmBase):
             if k8s_hc_id and cluster_removed:
                 step = "Removing k8scluster='{}' from k8srepos".format(k8scluster_id)
                 self.logger.debug(logging_text + step)
-                db_k8srepo_list = self.db.get_list("k8srepos", {"_admin.cluster-inserted": k8s_hc_id})
+                db_k8srepo_list = await self.db_async.get_list("k8srepos", {"_admin.cluster-inserted": k8s_hc_id})
                 for k8srepo in db_k8srepo_list:
                     try:
                         cluster_list = k8srepo["_admin"]["cluster-inserted"]
@@ -1091,7 +1094,7 @@ class K8sClusterLcm(LcmBase):
                         self.update_db_2("k8srepos", k8srepo["_id"], {"_admin.cluster-inserted": cluster_list})
                     except Exception as e:
                         self.logger.error("{}: {}".format(step, e))
-            self.db.del_one("k8sclusters", {"_id": k8scluster_id})
+            await self.db_async.del_one("k8sclusters", {"_id": k8scluster_id})
             db_k8scluster_update = None
             self.logger.debug(logging_text + "Done")
 
@@ -1175,7 +1178,7 @@ class K8sRepoLcm(LcmBase):
         try:
             step = "Getting k8srepo-id='{}' from db".format(k8srepo_id)
             self.logger.debug(logging_text + step)
-            db_k8srepo = self.db.get_one("k8srepos", {"_id": k8srepo_id})
+            db_k8srepo = await self.db_async.get_one("k8srepos", {"_id": k8srepo_id})
             db_k8srepo_update["_admin.operationalState"] = "ENABLED"
         except Exception as e:
             self.logger.critical(logging_text + "Exit Exception {}".format(e), exc_info=True)
@@ -1222,7 +1225,7 @@ class K8sRepoLcm(LcmBase):
         try:
             step = "Getting k8srepo-id='{}' from db".format(k8srepo_id)
             self.logger.debug(logging_text + step)
-            db_k8srepo = self.db.get_one("k8srepos", {"_id": k8srepo_id})
+            db_k8srepo = await self.db_async.get_one("k8srepos", {"_id": k8srepo_id})
 
         except Exception as e:
             self.logger.critical(logging_text + "Exit Exception {}".format(e), exc_info=True)
@@ -1242,7 +1245,7 @@ class K8sRepoLcm(LcmBase):
                 self.lcm_tasks.unlock_HA('k8srepo', 'delete', op_id,
                                          operationState=operation_state,
                                          detailed_status=operation_details)
-                self.db.del_one("k8srepos", {"_id": k8srepo_id})
+                await self.db_async.del_one("k8srepos", {"_id": k8srepo_id})
             except DbException as e:
                 self.logger.error(logging_text + "Cannot update database: {}".format(e))
             self.lcm_tasks.remove("k8srepo", k8srepo_id, order_id)